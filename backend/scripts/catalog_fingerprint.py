@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Catalog fingerprints for skipping duplicate store scrapes
+Most stores carry the same catalog at the same prices, so a full scrape of
+each one mostly re-downloads another store's data. A fingerprint is cheap:
+one aliased POST asking every category for page 1 at a small page size,
+and a second one for the last page of every category with more than one,
+which gives each category's total_count plus a hash of its sampled
+(sku, price) pairs. Sampling both ends of the listing catches price changes
+that only show up past the first page.
+
+Stores are compared in order against the references picked so far. A store
+whose fingerprint differs from a reference in at most a third of the
+categories becomes an alias of it and only those categories are fetched;
+otherwise it becomes a new reference and is scraped in full. The outcome
+is saved to ../data/store_aliases.json:
+
+    {"references": ["31", ...],
+     "aliases": {"706": {"reference": "31", "fetched_categories": ["113"]}},
+     "fingerprints": {"31": "9f2c...", ...}}
+
+An alias's rows for the categories it did not fetch are the reference's
+rows with its own store code and the reference's code in `copied_from`
+(see AliasExpander).
+"""
+import hashlib
+import json
+import os
+
+from graphql_batch import fetch_batched
+
+ALIASES_FILE = "../data/store_aliases.json"
+SAMPLE_PAGE_SIZE = 15
+MAX_DIFFERING = 1 / 3
+
+
+def _price(item):
+    price = item.get('retail_price')
+    if not price:
+        try:
+            price = item['price_range']['minimum_price']['final_price']['value']
+        except (KeyError, TypeError):
+            price = ''
+    return str(price)
+
+
+def sample_hash(items):
+    """Hash of the sorted (sku, price) pairs of sampled items"""
+    pairs = sorted((str(item.get('sku', '')), _price(item)) for item in items)
+    return hashlib.sha256(json.dumps(pairs).encode('utf-8')).hexdigest()[:16]
+
+
+class CatalogFingerprint:
+    """Per-category total_count and sample hash of one store"""
+
+    def __init__(self, counts, samples):
+        self.counts = counts
+        self.samples = samples
+
+    @property
+    def digest(self):
+        canonical = json.dumps([self.counts, self.samples], sort_keys=True)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+    def differing(self, other):
+        """Category ids whose count or sample differs from `other`'s"""
+        return [cid for cid in self.counts
+                if self.counts[cid] != other.counts.get(cid) or self.samples[cid] != other.samples.get(cid)]
+
+
+async def fingerprint_store(transport, store_code, category_ids, limiter, batch_size=None, retry=None):
+    """CatalogFingerprint of one store, or None if any category could not be sampled"""
+    selections = [(store_code, cid, 1) for cid in category_ids]
+    results = await fetch_batched(transport, selections, SAMPLE_PAGE_SIZE, limiter,
+                                  batch_size or len(selections), retry)
+    if any(results.get(selection) is None for selection in selections):
+        return None
+    
+    last_pages = []
+    for selection in selections:
+        total_pages = (results[selection].get('pageInfo') or {}).get('totalPages', 1) or 1
+        if total_pages > 1:
+            last_pages.append((store_code, selection[1], total_pages))
+    if last_pages:
+        results.update(await fetch_batched(transport, last_pages, SAMPLE_PAGE_SIZE, limiter,
+                                           batch_size or len(last_pages), retry))
+        if any(results.get(selection) is None for selection in last_pages):
+            return None
+    
+    counts, samples = {}, {}
+    for selection in selections:
+        cid = selection[1]
+        items = list(results[selection].get('items') or [])
+        for last in last_pages:
+            if last[1] == cid:
+                items += results[last].get('items') or []
+        counts[cid] = results[selection].get('total_count', 0) or 0
+        samples[cid] = sample_hash(items)
+    return CatalogFingerprint(counts, samples)
+
+
+def plan_scrape(fingerprints, category_ids, max_differing=MAX_DIFFERING):
+    """Which categories to fetch per store, from {store_code: fingerprint or None} in scrape order
+
+    Returns (plan, aliases): plan maps every store to the category ids to
+    fetch; aliases maps each alias store to its reference and the
+    categories fetched for it. Stores without a fingerprint are scraped in
+    full and never used as references.
+    """
+    plan, aliases, references = {}, {}, []
+    for store_code, fingerprint in fingerprints.items():
+        if fingerprint is None:
+            plan[store_code] = list(category_ids)
+            continue
+        best = None
+        for reference in references:
+            differs = fingerprint.differing(fingerprints[reference])
+            if best is None or len(differs) < len(best[1]):
+                best = (reference, differs)
+        if best is not None and len(best[1]) <= max_differing * len(category_ids):
+            reference, differs = best
+            plan[store_code] = [cid for cid in category_ids if cid in differs]
+            aliases[store_code] = {'reference': reference, 'fetched_categories': plan[store_code]}
+        else:
+            references.append(store_code)
+            plan[store_code] = list(category_ids)
+    return plan, aliases
+
+
+class AliasExpander:
+    """Fills alias stores' skipped categories with their reference's rows
+
+    Reference rows are kept only for the (reference, category) pairs some
+    alias skipped, as they are written. References always come before their
+    aliases in scrape order, so the rows are there when the alias is written.
+    """
+
+    def __init__(self, aliases, category_ids):
+        self.aliases = aliases
+        self.needed = {(alias['reference'], cid) for alias in aliases.values()
+                       for cid in category_ids if cid not in alias['fetched_categories']}
+        self.rows = {}
+
+    def skipped(self, store_code, category_id):
+        alias = self.aliases.get(store_code)
+        return alias is not None and category_id not in alias['fetched_categories']
+
+    def keep(self, store_code, category_id, rows):
+        if (store_code, category_id) in self.needed:
+            self.rows[(store_code, category_id)] = rows
+
+    def copies(self, store_code, category_id, timestamp):
+        """The reference's rows for the category, under `store_code`"""
+        reference = self.aliases[store_code]['reference']
+        return [dict(row, store_code=store_code, inserted_at=timestamp, copied_from=reference)
+                for row in self.rows.get((reference, category_id), [])]
+
+
+def save_aliases(path, fingerprints, aliases):
+    """Write the alias map atomically"""
+    out = {
+        'references': [code for code, fp in fingerprints.items() if fp is not None and code not in aliases],
+        'aliases': aliases,
+        'fingerprints': {code: fp.digest for code, fp in fingerprints.items() if fp is not None},
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(out, f, indent=2)
+    os.replace(tmp_path, path)
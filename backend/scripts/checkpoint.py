@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Page-level checkpoint journal for resumable scrape runs
+
+An append-only JSONL file. Every completed (store_code, category_id, page)
+unit is written, together with its raw products data, the moment it
+arrives, so a crashed run can be resumed and only the missing units are
+fetched again. Record types:
+
+    {"type": "run",     "label": "2025-11-01"}
+    {"type": "store",   "store": "701", "timestamp": "2025-11-01 02:00:05"}
+    {"type": "page",    "store": "701", "category": "8", "page": 1,
+     "page_size": 100, "data": {...products...}}
+    {"type": "merging", "file": "traderjoes_inflation_tracker.csv", "offset": 1234}
+    {"type": "merged",  "file": "traderjoes_inflation_tracker.csv"}
+
+The merging/merged pair makes the final append to the historical file
+happen exactly once: a run that died mid-append truncates back to
+`offset` and appends again. The run label is written once, when the run
+first starts, so everything named after the run keeps that name across
+resumes on later days.
+"""
+import json
+import os
+
+from csv_sink import count_path
+
+
+class CheckpointJournal:
+    """Completed units of one scrape run, persisted as they arrive"""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.pages = {}
+        self.timestamps = {}
+        self.label = None
+        self.merging = None
+        self.merged = False
+
+        if resume and os.path.exists(path):
+            self._load()
+        elif os.path.exists(path):
+            os.remove(path)
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write; that unit is simply redone
+                    continue
+                kind = record.get('type')
+                if kind == 'page':
+                    key = (record['store'], str(record['category']), record['page'])
+                    self.pages[key] = record
+                elif kind == 'run':
+                    self.label = record['label']
+                elif kind == 'store':
+                    self.timestamps[record['store']] = record['timestamp']
+                elif kind == 'merging':
+                    self.merging = record
+                elif kind == 'merged':
+                    self.merged = True
+
+    def _append(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def run_label(self, default):
+        """Label of the run; a resumed run keeps the one it started with"""
+        if self.label is None:
+            self.label = default
+            self._append({'type': 'run', 'label': default})
+        return self.label
+
+    def store_timestamp(self, store_code, default):
+        """Timestamp for a store's rows; a resumed store keeps its original one"""
+        store_code = str(store_code)
+        if store_code not in self.timestamps:
+            self.timestamps[store_code] = default
+            self._append({'type': 'store', 'store': store_code, 'timestamp': default})
+        return self.timestamps[store_code]
+
+    def page(self, store_code, category_id, current_page):
+        """Journal record for a finished unit, or None"""
+        return self.pages.get((str(store_code), str(category_id), current_page))
+
+    def record_page(self, store_code, category_id, current_page, page_size, data):
+        record = {
+            'type': 'page',
+            'store': str(store_code),
+            'category': str(category_id),
+            'page': current_page,
+            'page_size': page_size,
+            'data': data,
+        }
+        self.pages[(record['store'], record['category'], current_page)] = record
+        self._append(record)
+
+    def merge_once(self, target, append_rows):
+        """Run `append_rows()` against `target` exactly once across resumes
+
+        Returns False if a previous run already finished the merge.
+        """
+        if self.merged:
+            return False
+        if self.merging and os.path.exists(target):
+            # Undo the partial append of a run that died mid-merge; its
+            # row-count sidecar may already include it, so recount later
+            if self.merging['offset'] == 0:
+                os.remove(target)
+            else:
+                with open(target, 'r+b') as f:
+                    f.truncate(self.merging['offset'])
+            if os.path.exists(count_path(target)):
+                os.remove(count_path(target))
+        offset = os.path.getsize(target) if os.path.exists(target) else 0
+        self.merging = {'type': 'merging', 'file': target, 'offset': offset}
+        self._append(self.merging)
+        append_rows()
+        self._append({'type': 'merged', 'file': target})
+        self.merged = True
+        return True
+
+    def close(self):
+        self.file.close()
+
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Streaming CSV output for the scrapers
+Rows are written as each page is parsed instead of being collected for the
+whole run. Output goes to `<path>.tmp` and is fsynced and atomically renamed
+into place on finalize, so a crashed run never leaves a truncated CSV behind.
+The row count is kept in a `<path>.count` sidecar so nothing has to re-read
+the file to report how big it is.
+"""
+import csv
+import os
+import shutil
+
+FIELDNAMES = ['sku', 'retail_price', 'item_title', 'inserted_at', 'store_code',
+              'availability', 'sales_size', 'sales_uom_description', 'published']
+
+
+def count_path(path):
+    return path + '.count'
+
+
+def read_row_count(path):
+    """Data rows in `path` from its sidecar, or None if there is no sidecar"""
+    try:
+        with open(count_path(path), 'r') as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def write_row_count(path, rows):
+    tmp_path = count_path(path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(f"{rows}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, count_path(path))
+
+
+def fsync_dir(path):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class StreamingCSVWriter:
+    """CSV writer with per-store SKU dedup on the fly and atomic finalize
+
+    Only the SKUs of stores still being written are remembered; call
+    end_store() when a store is done to release its set.
+    """
+
+    def __init__(self, path, fieldnames=FIELDNAMES):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(self.tmp_path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames)
+        self.writer.writeheader()
+        self.rows = 0
+        self.seen = {}
+
+    def write_rows(self, rows):
+        """Write rows, skipping SKUs already written for the same store
+
+        Returns the rows actually written.
+        """
+        written = []
+        for row in rows:
+            seen = self.seen.setdefault(row['store_code'], set())
+            if row['sku'] in seen:
+                continue
+            seen.add(row['sku'])
+            written.append(row)
+        self.writer.writerows(written)
+        self.rows += len(written)
+        return written
+
+    def end_store(self, store_code):
+        self.seen.pop(store_code, None)
+
+    def finalize(self):
+        """fsync, rename into place and record the row count; returns the count"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        write_row_count(self.path, self.rows)
+        fsync_dir(self.path)
+        return self.rows
+
+    def abort(self):
+        """Throw the partial output away"""
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.file.closed:
+            return False
+        if exc_type is None:
+            self.finalize()
+        else:
+            self.abort()
+        return False
+
+
+def append_csv(source, target):
+    """Append the data rows of finalized CSV `source` to `target`
+
+    Copies bytes (no parsing), writes the header only if `target` is new,
+    and keeps `target`'s row-count sidecar up to date. Returns the new total.
+    """
+    added = read_row_count(source)
+    if added is None:
+        with open(source, 'rb') as f:
+            added = sum(1 for _ in f) - 1
+
+    file_exists = os.path.exists(target)
+    if file_exists:
+        total = read_row_count(target)
+        if total is None:
+            # Legacy file without a sidecar: counted once, never again
+            with open(target, 'rb') as f:
+                total = sum(1 for _ in f) - 1
+    else:
+        total = 0
+
+    with open(source, 'rb') as src, open(target, 'ab') as dst:
+        if file_exists:
+            src.readline()  # header
+        shutil.copyfileobj(src, dst)
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    total += added
+    write_row_count(target, total)
+    return total
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Store discovery prober - regenerates ../data/all_discovered_stores.json
+Probes ranges of store codes with the smallest query that answers "does
+this store sell anything": every category's total_count at pageSize 1, plus
+one store-wide total_count without a category filter, packed into one
+aliased POST per store. A code is valid when any category has products.
+"products" is the store-wide count: the categories nest (Bakery is part of
+Food, Milk & Cream of Dairy & Eggs), so adding them up would count an item
+once per category it is listed under.
+
+Codes are probed concurrently under the shared rate limit and retry policy
+of the scrapers. Every answered category is journaled, so an interrupted
+run resumes with --resume and only asks for what is missing. A category
+that comes back with an error is a failed probe, not an empty store, and a
+store that was valid before is only dropped after two empty probes in a row
+(the first marks it "zero_probes": 1).
+
+Entries keep the existing schema, {"code", "products", "valid"}; the only
+addition is "zero_probes": 1 on a previously valid store whose last probe
+came back empty. The next non-empty probe rewrites the entry without it.
+
+Usage:
+    python3 discover_stores.py                      # codes 1-700
+    python3 discover_stores.py 1-1000 1200 --concurrency 4 --rps 8
+    python3 discover_stores.py --resume
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+
+from checkpoint import CheckpointJournal
+from fetch_all_stores import CATEGORIES
+from graphql_batch import alias_for, split_batch_result
+from pager import post
+from rate_limit import DEFAULT_RPS, TokenBucket
+from retry import Retrier
+from transport import TRANSPORTS, open_transports
+
+OUTPUT_FILE = "../data/all_discovered_stores.json"
+JOURNAL_FILE = "checkpoints/discover_stores.jsonl"
+DEFAULT_RANGE = "1-700"
+# Pseudo category id for the store-wide total_count (journaled like a category)
+STORE_TOTAL = "all"
+
+# GraphQL error messages that mean "no such store" rather than a failed request
+STORE_NOT_FOUND = re.compile(r"store.*(not found|invalid|does ?n[o']t exist|unknown)|"
+                             r"(unknown|invalid) store", re.IGNORECASE)
+
+
+def parse_codes(specs):
+    """Store codes from "N" and "A-B" specs, in order, without repeats"""
+    codes = {}
+    for spec in specs:
+        start, _, end = spec.partition('-')
+        for code in range(int(start), int(end or start) + 1):
+            codes.setdefault(str(code), None)
+    return list(codes)
+
+
+def build_probe_query(store_code, category_ids):
+    """One query asking only for total_count of each category, one product per page
+
+    STORE_TOTAL in `category_ids` asks for the store-wide count, without a
+    category filter.
+    """
+    parts = []
+    for category_id in category_ids:
+        category = ("" if category_id == STORE_TOTAL else
+                    f", category_id: {{eq: {json.dumps(str(category_id))}}}")
+        parts.append(
+            f"  {alias_for(store_code, category_id, 1)}: products(\n"
+            f"    filter: {{store_code: {{eq: {json.dumps(str(store_code))}}}{category}}}\n"
+            f"    currentPage: 1\n"
+            f"    pageSize: 1\n"
+            f"  ) {{ total_count }}"
+        )
+    return "query ProbeStore {\n" + "\n".join(parts) + "\n}\n"
+
+
+def store_not_found(result):
+    """Aliases whose GraphQL error says the store does not exist"""
+    aliases = set()
+    for error in (result or {}).get('errors') or []:
+        path = error.get('path') or []
+        if path and STORE_NOT_FOUND.search(str(error.get('message', ''))):
+            aliases.add(path[0])
+    return aliases
+
+
+async def probe_store(transport, store_code, category_ids, limiter, batch_size, journal, retry=None):
+    """{category_id: total_count} for one store; categories that could not be fetched are left out
+
+    A category counts as 0 only when the endpoint answers it with a
+    total_count of 0 or says the store does not exist. Any other error
+    (including one without a path, which can't be pinned on an alias) leaves
+    the category out and unjournaled, so the code is reported as failed and
+    --resume asks again.
+    """
+    counts = {}
+    todo = []
+    for category_id in category_ids:
+        cached = journal.page(store_code, category_id, 1) if journal else None
+        if cached:
+            counts[category_id] = cached['data'].get('total_count', 0) or 0
+        else:
+            todo.append(category_id)
+
+    for start in range(0, len(todo), batch_size):
+        chunk = todo[start:start + batch_size]
+        payload = {"operationName": "ProbeStore", "variables": {},
+                   "query": build_probe_query(store_code, chunk)}
+        try:
+            result = await post(transport, payload, store_code, limiter, retry, 'probe')
+        except Exception as e:
+            print(f"    Error (store {store_code}): {e}", file=sys.stderr)
+            continue
+        split = split_batch_result(result, [(store_code, cid, 1) for cid in chunk])
+        not_found = store_not_found(result)
+        for category_id in chunk:
+            data = split[(store_code, category_id, 1)]
+            if data is None and alias_for(store_code, category_id, 1) not in not_found:
+                continue
+            counts[category_id] = (data or {}).get('total_count', 0) or 0
+            if journal:
+                journal.record_page(store_code, category_id, 1, 1, {'total_count': counts[category_id]})
+    return counts
+
+
+def load_stores(path):
+    """{code: entry} from an existing discovery file"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {entry['code']: entry for entry in json.load(f)}
+
+
+def save_stores(path, stores):
+    """Write the discovery file atomically, sorted by numeric code"""
+    entries = sorted(stores.values(), key=lambda entry: int(entry['code']))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def discover(codes, output=OUTPUT_FILE, concurrency=1, rps=DEFAULT_RPS, transport='browser',
+                   batch_size=None, resume=False, include_invalid=False):
+    """Probe `codes` and merge the results into `output`; returns {code: entry} for the probed codes"""
+    category_ids = [c['id'] for c in CATEGORIES] + [STORE_TOTAL]
+    batch_size = batch_size or len(category_ids)
+
+    print("=" * 70)
+    print("TRADER JOE'S - STORE DISCOVERY")
+    print("=" * 70)
+    print(f"Codes to probe: {len(codes)} ({codes[0]}-{codes[-1]})")
+    print(f"Requests per store: {-(-len(category_ids) // batch_size)} "
+          f"({len(category_ids) - 1} categories and the store total, pageSize 1)")
+    print(f"Transport: {transport}, concurrency: {concurrency}, rate limit: {rps if rps else 'none'} req/s")
+    print(f"Checkpoint journal: {JOURNAL_FILE}{' (resuming)' if resume else ''}\n")
+
+    journal = CheckpointJournal(JOURNAL_FILE, resume=resume)
+    limiter = TokenBucket(rps or None)
+    retry = Retrier()
+    queue = asyncio.Queue()
+    for code in codes:
+        queue.put_nowait(code)
+    found = {}
+    failed = []
+
+    async def worker(t):
+        while True:
+            try:
+                code = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            counts = await probe_store(t, code, category_ids, limiter, batch_size, journal, retry)
+            if len(counts) < len(category_ids):
+                failed.append(code)
+                continue
+            products = counts.pop(STORE_TOTAL)
+            valid = any(counts.values())
+            found[code] = {'code': code, 'products': products, 'valid': valid}
+            done = len(found) + len(failed)
+            status = f"✓ {products:5d} products" if valid else "✗ invalid"
+            print(f"[{done}/{len(codes)}] Store {code:>5s} {status}", flush=True)
+
+    try:
+        async with open_transports(transport, count=concurrency) as transports:
+            await asyncio.gather(*(worker(t) for t in transports))
+    finally:
+        journal.close()
+
+    stores = load_stores(output)
+    kept = []
+    for code, entry in found.items():
+        previous = stores.get(code)
+        if entry['valid']:
+            stores[code] = entry
+        elif previous and previous.get('valid') and not previous.get('zero_probes'):
+            # One empty answer is not enough to drop a store that sold something
+            # before; it goes on the second run in a row that finds it empty
+            stores[code] = dict(previous, zero_probes=1)
+            kept.append(code)
+        elif include_invalid:
+            stores[code] = entry
+        else:
+            stores.pop(code, None)
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    save_stores(output, stores)
+
+    valid = sum(entry['valid'] for entry in found.values())
+    print(f"\n{'=' * 70}")
+    print(f"✓ Probed {len(found)} codes: {valid} valid, {len(found) - valid} invalid")
+    print(f"Saved {len(stores)} stores to {output}")
+    if kept:
+        print(f"⚠️  {len(kept)} previously valid stores came back empty and were kept for now "
+              f"({', '.join(kept[:10])}{', ...' if len(kept) > 10 else ''}); a second empty probe "
+              f"removes them", file=sys.stderr)
+    if failed:
+        print(f"⚠️  {len(failed)} codes could not be probed ({', '.join(failed[:10])}"
+              f"{', ...' if len(failed) > 10 else ''}); rerun with --resume", file=sys.stderr)
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('codes', nargs='*', default=[DEFAULT_RANGE],
+                        help=f'store codes or ranges like 1-700 (default: {DEFAULT_RANGE})')
+    parser.add_argument('--output', default=OUTPUT_FILE, help=f'discovery file to update (default: {OUTPUT_FILE})')
+    parser.add_argument('--concurrency', type=int, default=1, help='stores probed in parallel (default: 1)')
+    parser.add_argument('--rps', type=float, default=DEFAULT_RPS,
+                        help=f'global requests-per-second limit, 0 for none (default: {DEFAULT_RPS})')
+    parser.add_argument('--transport', choices=TRANSPORTS, default='browser',
+                        help='browser: fetch() in Chromium (default); http: direct keep-alive POSTs after a browser bootstrap, opt-in until tested against the live site')
+    parser.add_argument('--batch-size', type=int,
+                        help=f'aliases per request (default: all {len(CATEGORIES) + 1} in one)')
+    parser.add_argument('--resume', action='store_true', help='reuse answers from the previous run\'s journal')
+    parser.add_argument('--include-invalid', action='store_true',
+                        help='also record invalid codes (as "valid": false) instead of dropping them')
+    args = parser.parse_args()
+
+    found = asyncio.run(discover(parse_codes(args.codes), args.output, args.concurrency, args.rps,
+                                 args.transport, args.batch_size, args.resume, args.include_invalid))
+    if len(found) < len(parse_codes(args.codes)):
+        sys.exit(1)
@@ -3,12 +3,21 @@
 Fetch products from ALL Trader Joe's stores
 Creates comprehensive multi-store dataset
 """
+import argparse
 import asyncio
 import json
-import csv
+import sys
+import time
 from datetime import datetime
-from playwright.async_api import async_playwright
-from playwright_stealth import Stealth
+
+from catalog_fingerprint import ALIASES_FILE, AliasExpander, fingerprint_store, plan_scrape, save_aliases
+from csv_sink import FIELDNAMES, StreamingCSVWriter
+from graphql_batch import DEFAULT_BATCH_SIZE, fetch_store_items_batched
+from pager import PageSizer, fetch_category_items
+from rate_limit import DEFAULT_RPS, TokenBucket
+from retry import Retrier
+import telemetry
+from transport import TRANSPORTS, open_transports
 
 # Known valid store codes (from old data)
 STORES = {
@@ -19,6 +28,9 @@ STORES = {
     "706": "Brooklyn, NY"
 }
 
+# Every store code found by discover_stores.py
+DISCOVERED_STORES_FILE = "../data/all_discovered_stores.json"
+
 # All categories
 CATEGORIES = [
     {"id": "8", "name": "Food"},
@@ -85,188 +97,329 @@ query SearchProducts($categoryId: String, $currentPage: Int, $pageSize: Int, $st
 }
 """
 
-async def fetch_store(page, store_code, store_name):
-    """Fetch all products for one store"""
+def items_to_products(items, store_code, timestamp):
+    """Convert raw GraphQL items to CSV rows, skipping items without a SKU"""
+    category_products = []
+    for item in items:
+        product = {
+            'sku': item.get('sku', ''),
+            'item_title': item.get('item_title', ''),
+            'retail_price': item.get('retail_price', ''),
+            'sales_size': item.get('sales_size', ''),
+            'sales_uom_description': item.get('sales_uom_description', ''),
+            'inserted_at': timestamp,
+            'store_code': store_code,
+            'availability': item.get('availability', ''),
+            'published': item.get('published', '')
+        }
+        
+        if not product['retail_price'] and 'price_range' in item:
+            try:
+                price_val = item['price_range']['minimum_price']['final_price']['value']
+                product['retail_price'] = str(price_val)
+            except:
+                pass
+        
+        if product['sku']:
+            category_products.append(product)
+    
+    return category_products
+
+class RunStats:
+    """Running totals for the end-of-run summary, so no rows are kept around"""
+    
+    def __init__(self):
+        self.per_store = {}
+        self.skus = set()
+        self.with_price = 0
+        self.records = 0
+    
+    def add(self, store_code, rows):
+        self.per_store[store_code] = self.per_store.get(store_code, 0) + len(rows)
+        self.records += len(rows)
+        for p in rows:
+            self.skus.add(p['sku'])
+            if p.get('retail_price'):
+                self.with_price += 1
+
+def load_discovered_stores(path=DISCOVERED_STORES_FILE):
+    """{code: name} for every valid store in the discovery file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return {entry['code']: STORES.get(entry['code'], f"Store {entry['code']}")
+                for entry in json.load(f) if entry.get('valid')}
+
+async def fetch_store(transport, store_code, store_name, limiter, sizer, sink, stats,
+                      batch_size=1, retry=None, category_ids=None, expander=None):
+    """Fetch all products for one store (or only `category_ids`), streaming each category to the sink
+
+    With an `expander`, the categories an alias store skipped are written
+    from its reference's rows instead.
+    """
     print(f"\n{'='*70}")
     print(f"FETCHING STORE: {store_name} (Code: {store_code})")
     print(f"{'='*70}\n")
     
-    all_products = []
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    fetched = [c for c in CATEGORIES if category_ids is None or c['id'] in category_ids]
+    categories = CATEGORIES if expander is not None and expander.aliases.get(store_code) else fetched
+    
+    if batch_size > 1 and fetched:
+        batched = await fetch_store_items_batched(
+            transport, GRAPHQL_QUERY, store_code, [c['id'] for c in fetched],
+            limiter, sizer, batch_size, retry=retry)
     
-    for cat_idx, category in enumerate(CATEGORIES, 1):
-        print(f"[{cat_idx}/{len(CATEGORIES)}] {category['name']:20s} ", end='', flush=True)
+    for cat_idx, category in enumerate(categories, 1):
+        print(f"[{cat_idx}/{len(categories)}] {category['name']:20s} ", end='', flush=True)
         
-        category_products = []
-        current_page = 1
-        total_pages = 1
+        if category not in fetched:
+            written = sink.write_rows(expander.copies(store_code, category['id'], timestamp))
+            stats.add(store_code, written)
+            print(f"✓ ({len(written)} products copied from {expander.aliases[store_code]['reference']})")
+            continue
         
-        while current_page <= total_pages:
-            variables = {
-                "storeCode": store_code,
-                "categoryId": int(category['id']),
-                "currentPage": current_page,
-                "pageSize": 15
-            }
-            
-            payload = {
-                "operationName": "SearchProducts",
-                "variables": variables,
-                "query": GRAPHQL_QUERY
-            }
-            
-            try:
-                result = await page.evaluate("""
-                    async (payload) => {
-                        const response = await fetch('https://www.traderjoes.com/api/graphql', {
-                            method: 'POST',
-                            headers: {'Content-Type': 'application/json'},
-                            body: JSON.stringify(payload)
-                        });
-                        return await response.json();
-                    }
-                """, payload)
-                
-                if 'data' in result and 'products' in result['data']:
-                    products_data = result['data']['products']
-                    items = products_data.get('items', [])
-                    total_count = products_data.get('total_count', 0)
-                    page_info = products_data.get('pageInfo', {})
-                    
-                    if current_page == 1:
-                        total_pages = page_info.get('totalPages', 1)
-                        print(f"[{total_count:4d} products, {total_pages:2d} pages] ", end='', flush=True)
-                    
-                    for item in items:
-                        product = {
-                            'sku': item.get('sku', ''),
-                            'item_title': item.get('item_title', ''),
-                            'retail_price': item.get('retail_price', ''),
-                            'sales_size': item.get('sales_size', ''),
-                            'sales_uom_description': item.get('sales_uom_description', ''),
-                            'inserted_at': timestamp,
-                            'store_code': store_code,
-                            'availability': item.get('availability', ''),
-                            'published': item.get('published', '')
-                        }
-                        
-                        if not product['retail_price'] and 'price_range' in item:
-                            try:
-                                price_val = item['price_range']['minimum_price']['final_price']['value']
-                                product['retail_price'] = str(price_val)
-                            except:
-                                pass
-                        
-                        if product['sku']:
-                            category_products.append(product)
-                    
-                    current_page += 1
-                    await asyncio.sleep(0.2)
-                else:
-                    break
-                    
-            except Exception as e:
-                print(f"Error: {e}")
-                break
+        if batch_size > 1:
+            items, total_count, total_pages = batched.pop(category['id'])
+        else:
+            items, total_count, total_pages = await fetch_category_items(
+                transport, GRAPHQL_QUERY, store_code, category['id'], limiter, sizer, retry=retry)
+        started = time.perf_counter()
+        category_products = items_to_products(items, store_code, timestamp)
+        telemetry.parsed(store_code, category['id'], total_pages, len(category_products),
+                         time.perf_counter() - started)
         
-        all_products.extend(category_products)
-        print(f"✓ ({len(category_products)} products)")
-    
-    # Remove duplicates
-    unique_products = {}
-    for p in all_products:
-        sku = p['sku']
-        if sku not in unique_products:
-            unique_products[sku] = p
+        # Duplicates across categories are dropped as they are written
+        written = sink.write_rows(category_products)
+        stats.add(store_code, written)
+        if expander is not None:
+            expander.keep(store_code, category['id'], written)
+        print(f"[{total_count:4d} products, {total_pages:2d} pages] ✓ ({len(category_products)} products)")
     
-    products_list = list(unique_products.values())
+    sink.end_store(store_code)
     
     print(f"\n{'='*70}")
-    print(f"Store {store_code} Complete: {len(products_list)} unique products")
+    print(f"Store {store_code} Complete: {stats.per_store.get(store_code, 0)} unique products")
     print(f"{'='*70}\n")
+
+async def fetch_stores_concurrently(transports, limiter, sizer, sink, stats, batch_size=1, retry=None,
+                                   stores=STORES, plan=None, expander=None):
+    """Fetch store x category work items on every transport slot in parallel
+
+    With batch_size > 1 a work item is a whole store, fetched with aliased
+    batches. Finished categories are held only until every category before
+    them (in stores/CATEGORIES order) has been written, so the streamed CSV
+    comes out identical to the sequential run. `plan` limits stores to the
+    category ids it lists for them; `expander` fills in the categories an
+    alias store skipped as their turn to be written comes.
+    """
+    planned = {store_code: [idx for idx, c in enumerate(CATEGORIES) if plan is None or c['id'] in plan[store_code]]
+               for store_code in stores}
+    copied = {store_code: [idx for idx, c in enumerate(CATEGORIES)
+                           if expander is not None and expander.skipped(store_code, c['id'])]
+              for store_code in stores}
+    work = asyncio.Queue()
+    for store_code in stores:
+        if not planned[store_code]:
+            continue
+        if batch_size > 1:
+            work.put_nowait((store_code, None))
+        else:
+            for cat_idx in planned[store_code]:
+                work.put_nowait((store_code, cat_idx))
+    
+    order = [(store_code, cat_idx) for store_code in stores
+             for cat_idx in sorted(planned[store_code] + copied[store_code])]
+    last = {store_code: cat_idx for store_code, cat_idx in order}
+    next_pos = 0
+    results = {}
+    timestamps = {}
+    done = 0
+    total = sum(len(planned[store_code]) for store_code in stores)
+    
+    def flush():
+        nonlocal next_pos
+        while next_pos < len(order):
+            store_code, cat_idx = order[next_pos]
+            category_id = CATEGORIES[cat_idx]['id']
+            if order[next_pos] in results:
+                written = sink.write_rows(results.pop(order[next_pos]))
+                if expander is not None:
+                    expander.keep(store_code, category_id, written)
+            elif cat_idx in copied[store_code]:
+                timestamp = timestamps.setdefault(store_code, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                written = sink.write_rows(expander.copies(store_code, category_id, timestamp))
+            else:
+                break
+            stats.add(store_code, written)
+            if cat_idx == last[store_code]:
+                sink.end_store(store_code)
+            next_pos += 1
+    
+    def record(store_code, cat_idx, items, total_count, total_pages):
+        nonlocal done
+        started = time.perf_counter()
+        products = items_to_products(items, store_code, timestamps[store_code])
+        telemetry.parsed(store_code, CATEGORIES[cat_idx]['id'], total_pages, len(products),
+                         time.perf_counter() - started)
+        results[(store_code, cat_idx)] = products
+        done += 1
+        print(f"[{done}/{total}] Store {store_code:>4s} {CATEGORIES[cat_idx]['name']:20s} "
+              f"[{total_count:4d} products, {total_pages:2d} pages] ✓ ({len(products)} products)",
+              flush=True)
+        flush()
+    
+    async def worker(transport):
+        while True:
+            try:
+                store_code, cat_idx = work.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            # One timestamp per store, taken when its first work item starts
+            if store_code not in timestamps:
+                timestamps[store_code] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if cat_idx is None:
+                batched = await fetch_store_items_batched(
+                    transport, GRAPHQL_QUERY, store_code, [CATEGORIES[idx]['id'] for idx in planned[store_code]],
+                    limiter, sizer, batch_size, retry=retry)
+                for idx in planned[store_code]:
+                    record(store_code, idx, *batched.pop(CATEGORIES[idx]['id']))
+            else:
+                record(store_code, cat_idx, *await fetch_category_items(
+                    transport, GRAPHQL_QUERY, store_code, CATEGORIES[cat_idx]['id'], limiter, sizer,
+                    retry=retry))
     
-    return products_list
+    await asyncio.gather(*(worker(t) for t in transports))
+    # Aliases that fetched nothing are only written here
+    flush()
+
+async def fingerprint_stores(transport, stores, limiter, retry=None):
+    """{store_code: CatalogFingerprint or None}, one aliased request per store"""
+    category_ids = [c['id'] for c in CATEGORIES]
+    fingerprints = {}
+    for idx, store_code in enumerate(stores, 1):
+        fingerprints[store_code] = await fingerprint_store(transport, store_code, category_ids, limiter,
+                                                           retry=retry)
+        status = fingerprints[store_code].digest if fingerprints[store_code] else "failed, will scrape in full"
+        print(f"[{idx}/{len(stores)}] Fingerprint {store_code:>4s}: {status}", flush=True)
+    return fingerprints
 
-async def fetch_all_stores():
-    """Fetch from all stores"""
+async def fetch_all_stores(concurrency=1, rps=DEFAULT_RPS, transport='browser', batch_size=1,
+                           stores=None, dedupe=False, output_file=None, limiter=None):
+    """Fetch from all stores
+
+    concurrency > 1 fetches store x category work items on that many pages
+    (or pooled connections) in parallel; rps caps requests per second across
+    all of them. transport is 'http' (direct POSTs reusing the browser
+    session) or 'browser' (fetch() inside Chromium, the fallback).
+    batch_size > 1 packs that many category/page selections into each POST.
+    Rows are streamed to the output CSV as they are parsed. With dedupe,
+    stores are fingerprinted first and stores matching an earlier one are
+    recorded in ALIASES_FILE, fetching only the categories that differ;
+    their other categories are written from the reference store's rows,
+    marked in a `copied_from` column (see catalog_fingerprint.py). `output_file` and `limiter` default to a
+    timestamped CSV and a TokenBucket of `rps`. Request telemetry is written
+    next to the output (see telemetry.py).
+    """
+    stores = stores or STORES
     print("="*70)
     print("TRADER JOE'S - MULTI-STORE COMPREHENSIVE FETCH")
     print("="*70)
     print(f"Start time: {datetime.now()}")
-    print(f"Stores to fetch: {len(STORES)}")
-    print(f"Categories per store: {len(CATEGORIES)}\n")
+    print(f"Stores to fetch: {len(stores)}{' (deduplicating catalogs)' if dedupe else ''}")
+    print(f"Categories per store: {len(CATEGORIES)}")
+    print(f"Transport: {transport}, concurrency: {concurrency}, rate limit: {rps if rps else 'none'} req/s, "
+          f"batch size: {batch_size}\n")
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-        )
-        
-        page = await context.new_page()
-        stealth_config = Stealth()
-        await stealth_config.apply_stealth_async(page)
-        
-        try:
-            # Establish session
-            print("Establishing session...")
-            await page.goto('https://www.traderjoes.com/', wait_until='networkidle')
-            await asyncio.sleep(2)
-            print("✓ Session established\n")
-            
-            all_stores_data = []
-            store_summary = {}
-            
-            for store_code, store_name in STORES.items():
-                products = await fetch_store(page, store_code, store_name)
-                all_stores_data.extend(products)
-                store_summary[store_code] = {
-                    'name': store_name,
-                    'products': len(products)
-                }
-                
-                # Small delay between stores
-                await asyncio.sleep(2)
-            
-            # Save combined results
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_file = f"traderjoes_ALL_STORES_{timestamp}.csv"
-            
-            fieldnames = ['sku', 'retail_price', 'item_title', 'inserted_at', 'store_code',
-                         'availability', 'sales_size', 'sales_uom_description', 'published']
-            
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(all_stores_data)
-            
-            print(f"\n{'='*70}")
-            print(f"✓✓✓ ALL STORES COMPLETE! ✓✓✓")
-            print(f"{'='*70}")
-            print(f"Total records: {len(all_stores_data)}")
-            print(f"Saved to: {output_file}\n")
-            
-            print("Products per store:")
-            for store_code, info in sorted(store_summary.items()):
-                print(f"  {store_code} ({info['name']:35s}): {info['products']:4d} products")
-            
-            # Count unique products across all stores
-            unique_skus = set(p['sku'] for p in all_stores_data)
-            print(f"\nUnique products across all stores: {len(unique_skus)}")
-            
-            # Statistics
-            with_price = sum(1 for p in all_stores_data if p.get('retail_price'))
-            print(f"Records with prices: {with_price} ({with_price/len(all_stores_data)*100:.1f}%)")
-            
-            print(f"\n{'='*70}\n")
-            
-            return output_file
+    limiter = limiter or TokenBucket(rps or None)
+    sizer = PageSizer()
+    retry = Retrier()
+    stats = RunStats()
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = output_file or f"traderjoes_ALL_STORES_{timestamp}.csv"
+    
+    plan, aliases, expander = None, {}, None
+    run = telemetry.start('all_stores')
+    
+    # Written to output_file.tmp and renamed into place only once complete;
+    # with dedupe, rows copied from a reference store say which one
+    fieldnames = FIELDNAMES + ['copied_from'] if dedupe else FIELDNAMES
+    with StreamingCSVWriter(output_file, fieldnames) as sink:
+        async with open_transports(transport, count=concurrency) as transports:
+            if dedupe:
+                fingerprints = await fingerprint_stores(transports[0], stores, limiter, retry)
+                plan, aliases = plan_scrape(fingerprints, [c['id'] for c in CATEGORIES])
+                save_aliases(ALIASES_FILE, fingerprints, aliases)
+                expander = AliasExpander(aliases, [c['id'] for c in CATEGORIES])
+                skipped = sum(len(CATEGORIES) - len(plan[code]) for code in aliases)
+                print(f"✓ {len(aliases)} of {len(stores)} stores are aliases; skipping {skipped} "
+                      f"store-categories (see {ALIASES_FILE})\n")
             
-        finally:
-            await browser.close()
+            if concurrency > 1:
+                await fetch_stores_concurrently(transports, limiter, sizer, sink, stats, batch_size, retry,
+                                                stores, plan, expander)
+            else:
+                for store_code, store_name in stores.items():
+                    await fetch_store(transports[0], store_code, store_name, limiter, sizer, sink, stats,
+                                      batch_size, retry, plan[store_code] if plan is not None else None,
+                                      expander)
+                    
+                    # Small delay between stores that were actually fetched
+                    if plan is None or plan[store_code]:
+                        await asyncio.sleep(2)
+    
+    telemetry_files = telemetry.paths_for(output_file)
+    telemetry.finish(*telemetry_files)
+    
+    print(f"\n{'='*70}")
+    print(f"✓✓✓ ALL STORES COMPLETE! ✓✓✓")
+    print(f"{'='*70}")
+    print(f"Total records: {stats.records}")
+    print(f"Saved to: {output_file}\n")
+    
+    print("Products per store:")
+    for store_code, store_name in sorted(stores.items()):
+        note = f" (rest copied from {aliases[store_code]['reference']})" if store_code in aliases else ""
+        print(f"  {store_code} ({store_name:35s}): {stats.per_store.get(store_code, 0):4d} products{note}")
+    
+    # Count unique products across all stores
+    print(f"\nUnique products across all stores: {len(stats.skus)}")
+    
+    # Statistics
+    print(f"Records with prices: {stats.with_price} ({stats.with_price/max(stats.records, 1)*100:.1f}%)")
+    if retry.retries:
+        print(f"Retried requests: {retry.retries}")
+    print(f"Telemetry: {telemetry.describe(run.summary())}")
+    print(f"  saved to {telemetry_files[0]} and {telemetry_files[1]}")
+    
+    print(f"\n{'='*70}\n")
+    
+    if retry.print_report():
+        print(f"Partial dataset saved to {output_file}", file=sys.stderr)
+        sys.exit(1)
+    
+    return output_file
 
 if __name__ == "__main__":
-    result = asyncio.run(fetch_all_stores())
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='store x category work items fetched in parallel (default: 1, sequential)')
+    parser.add_argument('--rps', type=float, default=DEFAULT_RPS,
+                        help=f'global requests-per-second limit across all pages, 0 for none (default: {DEFAULT_RPS})')
+    parser.add_argument('--transport', choices=TRANSPORTS, default='browser',
+                        help='browser: fetch() in Chromium (default); http: direct keep-alive POSTs after a browser bootstrap, opt-in until tested against the live site')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help=f'category/page selections per GraphQL request via aliases; 1 disables batching '
+                             f'(default: 1, suggested: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--all-discovered', action='store_true',
+                        help=f'fetch every valid store in {DISCOVERED_STORES_FILE} instead of the 5 core stores')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='fingerprint catalogs first; stores matching an earlier one only fetch what differs')
+    args = parser.parse_args()
+    
+    stores = load_discovered_stores() if args.all_discovered else STORES
+    result = asyncio.run(fetch_all_stores(concurrency=args.concurrency, rps=args.rps,
+                                          transport=args.transport, batch_size=args.batch_size,
+                                          stores=stores, dedupe=args.dedupe))
     if result:
         print(f"🎉 Multi-store dataset complete: {result}")
 
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Full-fleet scrape sharded across worker processes
+The coordinator splits the store list into shards (round-robin, so every
+shard gets a similar mix), starts one worker process per shard and waits.
+Each worker runs fetch_all_stores() over its shard with its own event loop,
+browser session and transport, writing fleet_<timestamp>/shard-N.csv and
+logging to fleet_<timestamp>/worker-N.log. All workers draw from one
+requests-per-second budget through a lock-protected token file
+(rate_limit.FileTokenBucket), so adding workers adds throughput until the
+budget is the bottleneck.
+
+The shard CSVs are then merged into traderjoes_ALL_STORES_<timestamp>.csv
+in the store list's order, so the output does not depend on which worker
+finished first. The workers' telemetry summaries are added up into
+traderjoes_ALL_STORES_<timestamp>.telemetry.json and .prom next to it.
+
+Usage:
+    python3 fetch_fleet.py --workers 4 --rps 8
+    python3 fetch_fleet.py --workers 2 --stores 31 452 546 701 706 --concurrency 2
+"""
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from csv_sink import FIELDNAMES, StreamingCSVWriter
+from fetch_all_stores import STORES, load_discovered_stores
+from rate_limit import DEFAULT_RPS, FileTokenBucket
+import telemetry
+from transport import TRANSPORTS
+
+RATE_FILE = "rate_limit.json"
+
+
+def shard(stores, index, count):
+    """Every `count`-th store of `stores` starting at `index`, in order"""
+    return {code: name for i, (code, name) in enumerate(stores.items()) if i % count == index}
+
+
+class _PartReader:
+    """Rows of one shard CSV, with a look at the next row's store"""
+
+    def __init__(self, path):
+        self.file = open(path, 'r', newline='', encoding='utf-8')
+        self.rows = csv.DictReader(self.file)
+        self.next = next(self.rows, None)
+
+    def take_store(self, store_code):
+        """The run of rows for `store_code` at the current position"""
+        out = []
+        while self.next is not None and self.next['store_code'] == store_code:
+            out.append(self.next)
+            self.next = next(self.rows, None)
+        return out
+
+    def close(self):
+        self.file.close()
+
+
+def merge_parts(parts, stores, output_file):
+    """Merge shard CSVs into `output_file` with stores in `stores` order; returns rows written
+
+    Each store's rows sit together in exactly one shard, in the order its
+    worker wrote them, so the merge streams and never holds more than one
+    store's rows.
+    """
+    readers = [_PartReader(path) for path in parts if os.path.exists(path)]
+    try:
+        with StreamingCSVWriter(output_file, FIELDNAMES) as sink:
+            for store_code in stores:
+                for reader in readers:
+                    rows = reader.take_store(store_code)
+                    if rows:
+                        sink.write_rows(rows)
+                        break
+                sink.end_store(store_code)
+            leftover = [reader for reader in readers if reader.next is not None]
+            if leftover:
+                raise ValueError(f"shard rows for unexpected store {leftover[0].next['store_code']}")
+        return sink.rows
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def worker_command(args, index, run_dir):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', str(index),
+               '--workers', str(args.workers), '--run-dir', run_dir,
+               '--rps', str(args.rps), '--transport', args.transport,
+               '--concurrency', str(args.concurrency), '--batch-size', str(args.batch_size)]
+    if args.stores:
+        command += ['--stores'] + args.stores
+    return command
+
+
+def coordinate(args, stores):
+    """Run the workers and merge their output; returns (output_file, failed worker indexes)"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    run_dir = f"fleet_{timestamp}"
+    os.makedirs(run_dir, exist_ok=True)
+    workers = min(args.workers, len(stores))
+
+    print("=" * 70)
+    print("TRADER JOE'S - SHARDED FLEET FETCH")
+    print("=" * 70)
+    print(f"Stores: {len(stores)}, workers: {workers}, shared rate limit: "
+          f"{args.rps if args.rps else 'none'} req/s")
+    print(f"Worker output and logs: {run_dir}/\n")
+
+    started = time.monotonic()
+    processes = []
+    for index in range(workers):
+        log = open(os.path.join(run_dir, f"worker-{index}.log"), 'w', encoding='utf-8')
+        process = subprocess.Popen(worker_command(args, index, run_dir), stdout=log, stderr=subprocess.STDOUT)
+        processes.append((index, process, log))
+        print(f"  Worker {index}: {len(shard(stores, index, workers))} stores (pid {process.pid})")
+
+    failed = []
+    for index, process, log in processes:
+        process.wait()
+        log.close()
+        if process.returncode == 0:
+            print(f"  ✓ Worker {index} done")
+        else:
+            failed.append(index)
+            print(f"  ⚠️  Worker {index} exited with status {process.returncode} "
+                  f"(see {run_dir}/worker-{index}.log)", file=sys.stderr)
+
+    output_file = f"traderjoes_ALL_STORES_{timestamp}.csv"
+    parts = [os.path.join(run_dir, f"shard-{index}.csv") for index in range(workers)]
+    rows = merge_parts(parts, stores, output_file)
+    elapsed = time.monotonic() - started
+    run = telemetry.merge_files([telemetry.paths_for(part)[0] for part in parts], job='fleet')
+    telemetry_files = telemetry.paths_for(output_file)
+    run.write(*telemetry_files)
+
+    print(f"\n{'=' * 70}")
+    print(f"✓ Merged {rows} rows from {workers} shards into {output_file} in {elapsed / 60:.1f} min")
+    print(f"Telemetry: {telemetry.describe(run.summary())}")
+    print(f"  saved to {telemetry_files[0]} and {telemetry_files[1]}")
+    print(f"{'=' * 70}\n")
+    return output_file, failed
+
+
+def run_worker(args, stores):
+    """One shard, sharing the coordinator's rate limit"""
+    import asyncio
+    from fetch_all_stores import fetch_all_stores
+
+    mine = shard(stores, args.worker, args.workers)
+    limiter = FileTokenBucket(os.path.join(args.run_dir, RATE_FILE), args.rps or None)
+    asyncio.run(fetch_all_stores(concurrency=args.concurrency, rps=args.rps, transport=args.transport,
+                                 batch_size=args.batch_size, stores=mine,
+                                 output_file=os.path.join(args.run_dir, f"shard-{args.worker}.csv"),
+                                 limiter=limiter))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='worker processes (default: 4)')
+    parser.add_argument('--stores', nargs='+', help='store codes (default: every valid discovered store)')
+    parser.add_argument('--rps', type=float, default=DEFAULT_RPS,
+                        help=f'requests-per-second limit shared by all workers, 0 for none (default: {DEFAULT_RPS})')
+    parser.add_argument('--transport', choices=TRANSPORTS, default='browser',
+                        help='browser: fetch() in Chromium (default); http: direct keep-alive POSTs after a browser bootstrap, opt-in until tested against the live site')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='store x category work items in parallel within each worker (default: 1)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='category/page selections per GraphQL request via aliases (default: 1)')
+    # Set by the coordinator for the processes it starts
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--run-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stores:
+        known = load_discovered_stores() if os.path.exists("../data/all_discovered_stores.json") else {}
+        stores = {code: STORES.get(code, known.get(code, f"Store {code}")) for code in args.stores}
+    else:
+        stores = load_discovered_stores()
+
+    if args.worker is not None:
+        run_worker(args, stores)
+    else:
+        output_file, failed = coordinate(args, stores)
+        if failed:
+            print(f"Partial dataset: workers {failed} did not finish cleanly", file=sys.stderr)
+            sys.exit(1)
+        print(f"🎉 Fleet dataset complete: {output_file}")
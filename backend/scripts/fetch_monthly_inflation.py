@@ -3,13 +3,29 @@
 Monthly Inflation Tracker - Fetch 5 stores and APPEND to historical CSV
 Designed to run on the 1st of each month via cron
 """
+import argparse
 import asyncio
-import csv
 from datetime import datetime
-from playwright.async_api import async_playwright
-from playwright_stealth import Stealth
+import glob
 import os
 import sys
+import time
+
+from checkpoint import CheckpointJournal
+from csv_sink import FIELDNAMES, StreamingCSVWriter, append_csv, count_path
+from graphql_batch import DEFAULT_BATCH_SIZE, fetch_store_items_batched
+from pager import PageSizer, fetch_category_items
+from price_db import PriceDB
+from rate_limit import DEFAULT_RPS, TokenBucket
+from retry import Retrier
+import snapshot_diff
+import telemetry
+from transport import TRANSPORTS, open_transports
+
+try:
+    import history_store
+except ImportError:  # pyarrow is optional; the CSV history still works without it
+    history_store = None
 
 # 5 core stores for CPI tracking
 CORE_STORES = {
@@ -23,6 +39,19 @@ CORE_STORES = {
 # Historical data file (will append to this)
 HISTORICAL_FILE = "traderjoes_inflation_tracker.csv"
 
+# Partitioned Parquet history (month=YYYY-MM/store_code=N), see history_store.py
+HISTORY_DIR = "history"
+
+# Indexed SQLite copy for quick lookups, see price_db.py
+PRICE_DB = "prices.sqlite"
+
+# Month-over-month changes only, see snapshot_diff.py
+CHANGE_LOG = snapshot_diff.CHANGE_LOG
+
+# Page-level journals for resuming interrupted runs (one per month, named
+# after the month the run started)
+CHECKPOINT_DIR = "checkpoints"
+
 CATEGORIES = [
     {"id": "8", "name": "Food"},
     {"id": "11", "name": "Bakery"},
@@ -81,179 +110,250 @@ query SearchProducts($categoryId: String, $currentPage: Int, $pageSize: Int, $st
 }
 """
 
-async def fetch_store(page, code):
-    """Fetch all products from one store"""
-    all_products = []
+async def fetch_store(transport, code, limiter, sizer, sink, batch_size=1, journal=None, retry=None):
+    """Fetch all products from one store, streaming each category to the sink
+
+    Returns the number of unique products written.
+    """
+    written = 0
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if journal:
+        timestamp = journal.store_timestamp(code, timestamp)
+    
+    if batch_size > 1:
+        batched = await fetch_store_items_batched(
+            transport, GRAPHQL_QUERY, code, [c['id'] for c in CATEGORIES],
+            limiter, sizer, batch_size, journal, retry)
     
     for category in CATEGORIES:
-        current_page = 1
-        total_pages = 1
+        if batch_size > 1:
+            items, _, total_pages = batched.pop(category['id'])
+        else:
+            items, _, total_pages = await fetch_category_items(
+                transport, GRAPHQL_QUERY, code, category['id'], limiter, sizer, journal, retry)
         
-        while current_page <= total_pages:
-            variables = {
-                "storeCode": str(code),
-                "categoryId": int(category['id']),
-                "currentPage": current_page,
-                "pageSize": 15
+        started = time.perf_counter()
+        category_products = []
+        for item in items:
+            product = {
+                'sku': item.get('sku', ''),
+                'item_title': item.get('item_title', ''),
+                'retail_price': item.get('retail_price', ''),
+                'sales_size': item.get('sales_size', ''),
+                'sales_uom_description': item.get('sales_uom_description', ''),
+                'inserted_at': timestamp,
+                'store_code': str(code),
+                'availability': item.get('availability', ''),
+                'published': item.get('published', '')
             }
             
-            payload = {
-                "operationName": "SearchProducts",
-                "variables": variables,
-                "query": GRAPHQL_QUERY
-            }
+            if not product['retail_price'] and 'price_range' in item:
+                try:
+                    price_val = item['price_range']['minimum_price']['final_price']['value']
+                    product['retail_price'] = str(price_val)
+                except:
+                    pass
             
-            try:
-                result = await page.evaluate("""
-                    async (payload) => {
-                        const response = await fetch('https://www.traderjoes.com/api/graphql', {
-                            method: 'POST',
-                            headers: {'Content-Type': 'application/json'},
-                            body: JSON.stringify(payload)
-                        });
-                        return await response.json();
-                    }
-                """, payload)
-                
-                if 'data' in result and 'products' in result['data']:
-                    products_data = result['data']['products']
-                    items = products_data.get('items', [])
-                    
-                    if current_page == 1:
-                        page_info = products_data.get('pageInfo', {})
-                        total_pages = page_info.get('totalPages', 1)
-                    
-                    for item in items:
-                            product = {
-                                'sku': item.get('sku', ''),
-                                'item_title': item.get('item_title', ''),
-                                'retail_price': item.get('retail_price', ''),
-                                'sales_size': item.get('sales_size', ''),
-                                'sales_uom_description': item.get('sales_uom_description', ''),
-                                'inserted_at': timestamp,
-                                'store_code': str(code),
-                                'availability': item.get('availability', ''),
-                                'published': item.get('published', '')
-                            }
-                        
-                        if not product['retail_price'] and 'price_range' in item:
-                            try:
-                                price_val = item['price_range']['minimum_price']['final_price']['value']
-                                product['retail_price'] = str(price_val)
-                            except:
-                                pass
-                        
-                        if product['sku']:
-                            all_products.append(product)
-                    
-                    current_page += 1
-                    await asyncio.sleep(0.2)
-                else:
-                    break
-            except Exception as e:
-                print(f"    Error: {e}", file=sys.stderr)
-                break
-    
-    # Remove duplicates
-    unique = {}
-    for p in all_products:
-        if p['sku'] not in unique:
-            unique[p['sku']] = p
+            if product['sku']:
+                category_products.append(product)
+        telemetry.parsed(code, category['id'], total_pages, len(category_products),
+                         time.perf_counter() - started)
+        
+        # Duplicates across categories are dropped as they are written
+        written += len(sink.write_rows(category_products))
     
-    return list(unique.values())
+    sink.end_store(str(code))
+    return written
 
-async def monthly_fetch():
-    """Monthly fetch - appends to historical file"""
-    run_date = datetime.now().strftime("%Y-%m-%d")
+def journal_path_for(today, resume):
+    """Journal for this run: the month it started in, not the month it resumes in
+
+    With resume, the newest journal that was not merged yet is picked up,
+    so a run started on the 31st and resumed on the 1st keeps its pages.
+    Without it, the month's journal is started over unless it was already
+    merged, in which case the run is refused rather than appending the
+    month twice.
+    """
+    path = os.path.join(CHECKPOINT_DIR, f"monthly_{today[:7]}.jsonl")
+    if resume:
+        for candidate in sorted(glob.glob(os.path.join(CHECKPOINT_DIR, "monthly_*.jsonl")), reverse=True):
+            journal = CheckpointJournal(candidate, resume=True)
+            journal.close()
+            if not journal.merged:
+                return candidate
+            if candidate == path:
+                break
+        return path
+    if os.path.exists(path):
+        journal = CheckpointJournal(path, resume=True)
+        journal.close()
+        if journal.merged:
+            print(f"ERROR: this month's run ({path}) was already merged into {HISTORICAL_FILE}; "
+                  f"not starting over. Delete the journal to redo the month.", file=sys.stderr)
+            sys.exit(1)
+    return path
+
+async def monthly_fetch(transport='browser', batch_size=1, resume=False, allow_incomplete=False,
+                        changes_only=False):
+    """Monthly fetch - appends to historical file
+
+    Every fetched page is journaled under CHECKPOINT_DIR; with resume=True a
+    crashed run picks up where it stopped, even after a month boundary. A
+    run with incomplete categories is not appended unless allow_incomplete=True.
+    The month's differences from the previous one always go to CHANGE_LOG;
+    with changes_only=True that is all that is kept: nothing is appended to
+    the historical file and the dated snapshot is deleted once logged.
+    Request telemetry for the run (including a failed one) is written next
+    to the dated snapshot and kept even when the snapshot is not.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    journal_path = journal_path_for(today, resume)
+    journal = CheckpointJournal(journal_path, resume=resume)
+    # The snapshot, history tag, PriceDB source and change-log label all use
+    # the date the month's run started, even when it is resumed days later
+    run_date = journal.run_label(today)
     
     print("="*70)
     print("TRADER JOE'S MONTHLY INFLATION TRACKER")
     print("="*70)
-    print(f"Run Date: {run_date}")
+    print(f"Run Date: {run_date}{f' (resumed {today})' if run_date != today else ''}")
     print(f"Stores: {len(CORE_STORES)}")
     print(f"Historical File: {HISTORICAL_FILE}")
+    print(f"Transport: {transport}, batch size: {batch_size}")
+    print(f"Checkpoint journal: {journal_path}{' (resuming)' if resume else ''}")
     print("="*70)
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-        )
-        
-        page = await context.new_page()
-        stealth_config = Stealth()
-        await stealth_config.apply_stealth_async(page)
+    if journal.merged:
+        print(f"\nThis month's run was already merged into {HISTORICAL_FILE}; nothing to do.")
+        journal.close()
+        return HISTORICAL_FILE
+    if resume:
+        print(f"Resuming: {len(journal.pages)} pages already fetched")
+    
+    # Rows stream into the dated snapshot as they arrive; it is renamed into
+    # place only once complete and then appended to the historical file
+    backup_file = f"backups/traderjoes_snapshot_{run_date}.csv"
+    telemetry.start('monthly')
+    
+    try:
+        limiter = TokenBucket(DEFAULT_RPS)
+        sizer = PageSizer()
+        retry = Retrier()
         
-        try:
-            print("\nEstablishing session...")
-            await page.goto('https://www.traderjoes.com/', wait_until='networkidle')
-            await asyncio.sleep(2)
-            print("✓ Ready\n")
-            
-            all_data = []
-            
-            for idx, (code, location) in enumerate(CORE_STORES.items(), 1):
-                print(f"[{idx}/{len(CORE_STORES)}] Store {code} ({location})...", flush=True)
-                products = await fetch_store(page, code)
-                all_data.extend(products)
-                print(f"  ✓ {len(products)} products collected")
-                await asyncio.sleep(1)
-            
-            # Determine if we need to write header
-            file_exists = os.path.exists(HISTORICAL_FILE)
-            
-            # Append to historical file
-            fieldnames = ['sku', 'retail_price', 'item_title', 'inserted_at', 'store_code',
-                         'availability', 'sales_size', 'sales_uom_description', 'published']
+        with StreamingCSVWriter(backup_file, FIELDNAMES) as sink:
+            async with open_transports(transport) as transports:
+                for idx, (code, location) in enumerate(CORE_STORES.items(), 1):
+                    print(f"[{idx}/{len(CORE_STORES)}] Store {code} ({location})...", flush=True)
+                    count = await fetch_store(transports[0], code, limiter, sizer, sink, batch_size,
+                                              journal, retry)
+                    print(f"  ✓ {count} products collected")
+                    await asyncio.sleep(1)
             
-            mode = 'a' if file_exists else 'w'
-            
-            with open(HISTORICAL_FILE, mode, newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerows(all_data)
+            if retry.print_report() and not allow_incomplete:
+                print(f"\nNot appending a partial month to {HISTORICAL_FILE}. Fetched pages are kept in "
+                      f"{journal_path};\nrerun with --resume to fetch only the missing ones "
+                      f"(or --allow-incomplete to append anyway).", file=sys.stderr)
+                sys.exit(1)
+        
+        records = sink.rows
+        
+        # Columnar history: this month's partitions (idempotent, so safe on resume)
+        if history_store is not None:
+            added = history_store.add_csv(backup_file, HISTORY_DIR, tag=f"snapshot-{run_date}")
+            print(f"Added {added} rows to history store {HISTORY_DIR}/ (month={run_date[:7]})")
+        else:
+            print("pyarrow not installed; skipping the columnar history store", file=sys.stderr)
+        
+        # Loaded once per snapshot file, so also safe on resume
+        with PriceDB(PRICE_DB) as db:
+            loaded = db.load_csv(backup_file)
+        print(f"Loaded {loaded} rows into {PRICE_DB}")
+        
+        if changes_only:
+            logged = {}
             
-            action = "Appended to" if file_exists else "Created"
+            def record_changes():
+                logged['counts'] = snapshot_diff.add_snapshot(backup_file, CHANGE_LOG, label=run_date)
             
+            # Journaled so a resumed run does not redo the month
+            journal.merge_once(CHANGE_LOG, record_changes)
+            os.remove(backup_file)
+            os.remove(count_path(backup_file))
+            counts = logged['counts'] or {}
             print(f"\n{'='*70}")
             print("✓ MONTHLY FETCH COMPLETE")
             print(f"{'='*70}")
-            print(f"{action} {HISTORICAL_FILE}")
-            print(f"Records added this run: {len(all_data)}")
-            
-            # Show file stats
-            if file_exists:
-                with open(HISTORICAL_FILE, 'r') as f:
-                    total_lines = sum(1 for _ in f)
-                print(f"Total records in file: {total_lines - 1}")  # -1 for header
-            
-            # Create dated backup
-            backup_file = f"backups/traderjoes_snapshot_{run_date}.csv"
-            os.makedirs('backups', exist_ok=True)
-            
-            with open(backup_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(all_data)
-            
-            print(f"Monthly snapshot saved: {backup_file}")
+            print(f"Records fetched this run: {records}")
+            print(f"Changes logged to {CHANGE_LOG}: " +
+                  ", ".join(f"{counts[c]} {c}" for c in snapshot_diff.CHANGES[1:] if counts.get(c)))
+            print(f"Rebuild the full snapshot with: python3 snapshot_diff.py rebuild {run_date}")
             print(f"\n{'='*70}\n")
-            
-            return HISTORICAL_FILE
-            
-        except Exception as e:
-            print(f"ERROR: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc()
-            sys.exit(1)
+            return CHANGE_LOG
         
-        finally:
-            await browser.close()
+        # Safe on resume: a month already in the log is skipped
+        counts = snapshot_diff.add_snapshot(backup_file, CHANGE_LOG, label=run_date)
+        if counts is not None:
+            print(f"Logged {sum(counts[c] for c in snapshot_diff.CHANGES[1:])} changes to {CHANGE_LOG}")
+        
+        file_exists = os.path.exists(HISTORICAL_FILE)
+        merge_state = {}
+        
+        def append_to_history():
+            merge_state['total'] = append_csv(backup_file, HISTORICAL_FILE)
+        
+        # Journaled so a resumed run never appends the same month twice
+        journal.merge_once(HISTORICAL_FILE, append_to_history)
+        
+        action = "Appended to" if file_exists else "Created"
+        
+        print(f"\n{'='*70}")
+        print("✓ MONTHLY FETCH COMPLETE")
+        print(f"{'='*70}")
+        print(f"{action} {HISTORICAL_FILE}")
+        print(f"Records added this run: {records}")
+        
+        # Show file stats (kept in a sidecar, so the file is never re-read)
+        if file_exists:
+            print(f"Total records in file: {merge_state['total']}")
+        
+        print(f"Monthly snapshot saved: {backup_file}")
+        print(f"\n{'='*70}\n")
+        
+        return HISTORICAL_FILE
+        
+    except Exception as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        print(f"Progress kept in {journal_path}; rerun with --resume to fetch only what is missing",
+              file=sys.stderr)
+        sys.exit(1)
+    
+    finally:
+        journal.close()
+        telemetry_files = telemetry.paths_for(backup_file)
+        run = telemetry.finish(*telemetry_files)
+        print(f"Telemetry: {telemetry.describe(run.summary())}")
+        print(f"  saved to {telemetry_files[0]} and {telemetry_files[1]}")
 
 if __name__ == "__main__":
-    result = asyncio.run(monthly_fetch())
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--transport', choices=TRANSPORTS, default='browser',
+                        help='browser: fetch() in Chromium (default); http: direct keep-alive POSTs after a browser bootstrap, opt-in until tested against the live site')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help=f'category/page selections per GraphQL request via aliases; 1 disables batching '
+                             f'(default: 1, suggested: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--resume', action='store_true',
+                        help="resume the last interrupted run from its checkpoint journal, even one "
+                             "started last month")
+    parser.add_argument('--allow-incomplete', action='store_true',
+                        help='append to the historical file even if some categories stayed incomplete')
+    parser.add_argument('--changes-only', action='store_true',
+                        help=f'keep only the month\'s changes in {CHANGE_LOG}; skip the historical '
+                             f'file and the dated snapshot')
+    args = parser.parse_args()
+    
+    result = asyncio.run(monthly_fetch(transport=args.transport, batch_size=args.batch_size,
+                                       resume=args.resume, allow_incomplete=args.allow_incomplete,
+                                       changes_only=args.changes_only))
     print(f"✓ Inflation tracker updated: {result}")
-
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+GraphQL alias batching
+Packs several store/category/page `products(...)` selections into one POST:
+
+    query BatchProducts {
+      s701c8p1: products(filter: {...}, currentPage: 1, pageSize: 100) { ... }
+      s701c11p1: products(...) { ... }
+    }
+
+and splits the response back out per alias. An alias that comes back with
+an error (or no data) is retried on its own through the regular pager.
+"""
+import json
+import sys
+
+from pager import fetch_category_items, fetch_page, give_up, post
+
+# Same fields as the scrapers' SearchProducts query, so rows keep the CSV schema
+PRODUCT_FIELDS = """
+    items {
+      sku
+      item_title
+      sales_size
+      sales_uom_description
+      availability
+      published
+      price_range {
+        minimum_price {
+          final_price {
+            value
+          }
+        }
+      }
+      retail_price
+    }
+    total_count
+    pageInfo: page_info {
+      currentPage: current_page
+      totalPages: total_pages
+    }
+"""
+
+DEFAULT_BATCH_SIZE = 8
+
+
+def alias_for(store_code, category_id, current_page):
+    return f"s{store_code}c{category_id}p{current_page}"
+
+
+def build_batch_query(selections, page_size):
+    """Query text for [(store_code, category_id, current_page), ...]"""
+    parts = []
+    for store_code, category_id, current_page in selections:
+        parts.append(
+            f"  {alias_for(store_code, category_id, current_page)}: products(\n"
+            f"    filter: {{store_code: {{eq: {json.dumps(str(store_code))}}}, "
+            f"category_id: {{eq: {json.dumps(str(category_id))}}}}}\n"
+            f"    currentPage: {int(current_page)}\n"
+            f"    pageSize: {int(page_size)}\n"
+            f"  ) {{{PRODUCT_FIELDS}  }}"
+        )
+    return "query BatchProducts {\n" + "\n".join(parts) + "\n}\n"
+
+
+def split_batch_result(result, selections):
+    """{selection: products_data or None}; None marks an alias to retry alone"""
+    data = (result or {}).get('data') or {}
+    failed = set()
+    for error in (result or {}).get('errors') or []:
+        path = error.get('path') or []
+        if path:
+            failed.add(path[0])
+        else:
+            # An error without a path can't be pinned on one alias
+            return {sel: None for sel in selections}
+
+    split = {}
+    for sel in selections:
+        alias = alias_for(*sel)
+        split[sel] = None if alias in failed else data.get(alias)
+    return split
+
+
+async def fetch_batch(transport, selections, page_size, limiter, retry=None):
+    """POST one batch; every selection maps to its products data or None"""
+    payload = {
+        "operationName": "BatchProducts",
+        "variables": {},
+        "query": build_batch_query(selections, page_size)
+    }
+    categories = {category_id for _, category_id, _ in selections}
+    category_id = categories.pop() if len(categories) == 1 else 'batch'
+    try:
+        result = await post(transport, payload, selections[0][0], limiter, retry, category_id)
+    except Exception as e:
+        print(f"    Batch error ({len(selections)} aliases): {e}", file=sys.stderr)
+        return {sel: None for sel in selections}
+    return split_batch_result(result, selections)
+
+
+async def fetch_batched(transport, selections, page_size, limiter, batch_size, retry=None):
+    """Run `selections` in chunks of `batch_size` aliases"""
+    results = {}
+    for start in range(0, len(selections), batch_size):
+        chunk = selections[start:start + batch_size]
+        results.update(await fetch_batch(transport, chunk, page_size, limiter, retry))
+    return results
+
+
+async def fetch_store_items_batched(transport, query, store_code, category_ids, limiter,
+                                    sizer, batch_size=DEFAULT_BATCH_SIZE, journal=None, retry=None):
+    """All raw items for every category of one store using aliased batches
+
+    Round 1 asks for page 1 of every category; round 2 asks for every
+    remaining page those reported. Aliases that fail are retried alone
+    (a failed page 1 goes through the regular pager, which also handles
+    page-size fallback). `query` is the single-selection query used for
+    those retries. Pages already in the checkpoint journal are reused and
+    new ones are recorded as they arrive; pages that still fail after the
+    `retry` policy are reported to it as incomplete.
+
+    Returns {category_id: (items, total_count, total_pages)}
+    """
+    page_size = sizer.size(store_code)
+    cached = {cid: journal.page(store_code, cid, 1) if journal else None for cid in category_ids}
+    firsts = await fetch_batched(
+        transport, [(store_code, cid, 1) for cid in category_ids if not cached[cid]],
+        page_size, limiter, batch_size, retry)
+
+    out = {}
+    pending = {}
+    for cid in category_ids:
+        if cached[cid]:
+            cid_page_size, first = cached[cid]['page_size'], cached[cid]['data']
+        else:
+            cid_page_size, first = page_size, firsts[(store_code, cid, 1)]
+            items = (first or {}).get('items') or []
+            if first is None or len(items) < min(page_size, (first or {}).get('total_count', 0) or 0):
+                # Rejected or clamped: redo the whole category on its own
+                out[cid] = await fetch_category_items(transport, query, store_code, cid, limiter,
+                                                      sizer, journal, retry)
+                continue
+            if journal:
+                journal.record_page(store_code, cid, 1, page_size, first)
+
+        total_pages = (first.get('pageInfo') or {}).get('totalPages', 1) or 1
+        out[cid] = (list(first.get('items') or []), first.get('total_count', 0) or 0, total_pages)
+        for n in range(2, total_pages + 1):
+            pending.setdefault(cid_page_size, []).append((store_code, cid, n))
+
+    rest = {}
+    for size, selections in pending.items():
+        todo = [sel for sel in selections if not (journal and journal.page(*sel))]
+        fetched = await fetch_batched(transport, todo, size, limiter, batch_size, retry)
+        if journal:
+            for sel, data in fetched.items():
+                if data is not None:
+                    journal.record_page(*sel, size, data)
+        rest.update(fetched)
+
+    for size, selections in pending.items():
+        for sel in selections:
+            _, cid, current_page = sel
+            cached_page = journal.page(*sel) if journal else None
+            if cached_page:
+                data = cached_page['data']
+            else:
+                data = rest[sel]
+            if data is None:
+                try:
+                    data = await fetch_page(transport, query, store_code, cid, current_page,
+                                            size, limiter, retry, required=True)
+                except Exception as e:
+                    give_up(retry, store_code, cid, current_page, e)
+                else:
+                    if journal:
+                        journal.record_page(store_code, cid, current_page, size, data)
+            out[cid][0].extend((data or {}).get('items') or [])
+
+    return out
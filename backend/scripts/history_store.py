@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Partitioned columnar price history
+Replaces re-parsing the ever-growing CSVs with a Parquet dataset laid out as
+
+    history/month=2025-10/store_code=701/<tag>-0.parquet
+
+with typed columns: numeric prices and sizes, dictionary-encoded SKU /
+title / unit strings and real timestamps. Readers filter on month and
+store_code, so only the matching partitions are opened.
+
+Usage:
+    python3 history_store.py import traderjoes-dump-3.csv traderjoes_inflation_tracker.csv
+    python3 history_store.py query --month 2025-10 --store 701
+
+Needs pyarrow (pip install pyarrow).
+"""
+import argparse
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+
+HISTORY_DIR = "history"
+
+# Column types as stored; store_code and month live in the partition path
+SCHEMA = pa.schema([
+    ('sku', pa.dictionary(pa.int32(), pa.string())),
+    ('retail_price', pa.float64()),
+    ('item_title', pa.dictionary(pa.int32(), pa.string())),
+    ('inserted_at', pa.timestamp('s')),
+    ('availability', pa.int8()),
+    ('sales_size', pa.float64()),
+    ('sales_uom_description', pa.dictionary(pa.int32(), pa.string())),
+    ('published', pa.int8()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('month', pa.string()), ('store_code', pa.string())]), flavor='hive')
+
+# Parsed as text first: SKUs and store codes keep their leading zeros and
+# bad numeric cells become nulls instead of failing the whole import
+CSV_TYPES = {name: pa.string() for name in
+             ['sku', 'retail_price', 'item_title', 'inserted_at', 'store_code', 'availability',
+              'sales_size', 'sales_uom_description', 'published']}
+
+
+def _to_number(column, type_):
+    text = pc.utf8_trim_whitespace(column)
+    numeric = pc.if_else(pc.match_substring_regex(text, r'^-?\d+(\.\d+)?$'), text, None)
+    return pc.cast(pc.cast(numeric, pa.float64()), type_, safe=False)
+
+
+def _to_timestamp(column):
+    text = pc.if_else(pc.match_substring_regex(column, r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}'),
+                      pc.utf8_slice_codeunits(column, 0, 19), None)
+    text = pc.replace_substring(text, 'T', ' ')
+    parsed = pc.strptime(text, format='%Y-%m-%d %H:%M:%S', unit='s', error_is_null=True)
+    return pc.cast(parsed, pa.timestamp('s'))
+
+
+def normalize_batch(batch):
+    """Typed table from a batch of raw CSV text columns; drops rows without a timestamp"""
+    inserted_at = _to_timestamp(batch.column('inserted_at'))
+    table = pa.table({
+        'sku': pc.dictionary_encode(batch.column('sku')),
+        'retail_price': _to_number(batch.column('retail_price'), pa.float64()),
+        'item_title': pc.dictionary_encode(batch.column('item_title')),
+        'inserted_at': inserted_at,
+        'availability': _to_number(batch.column('availability'), pa.int8()),
+        'sales_size': _to_number(batch.column('sales_size'), pa.float64()),
+        'sales_uom_description': pc.dictionary_encode(batch.column('sales_uom_description')),
+        'published': _to_number(batch.column('published'), pa.int8()),
+        'month': pc.strftime(inserted_at, format='%Y-%m'),
+        'store_code': batch.column('store_code'),
+    })
+    return table.filter(pc.is_valid(table.column('inserted_at')))
+
+
+def _csv_batches(path, block_size=64 << 20):
+    reader = pv.open_csv(
+        path,
+        read_options=pv.ReadOptions(block_size=block_size),
+        convert_options=pv.ConvertOptions(column_types=CSV_TYPES, include_columns=list(CSV_TYPES),
+                                          strings_can_be_null=True),
+    )
+    for batch in reader:
+        yield batch
+
+
+def add_csv(path, root=HISTORY_DIR, tag=None):
+    """Write a CSV in the scrapers' schema into the partitioned store
+
+    Files are named after `tag` (default: the CSV's base name), so
+    re-adding the same CSV overwrites its own files instead of duplicating
+    rows. Returns the number of rows written.
+    """
+    tag = tag or os.path.splitext(os.path.basename(path))[0]
+    rows = 0
+
+    def tables():
+        nonlocal rows
+        for batch in _csv_batches(path):
+            table = normalize_batch(batch)
+            rows += table.num_rows
+            yield from table.to_batches()
+
+    full_schema = SCHEMA.append(pa.field('month', pa.string())).append(pa.field('store_code', pa.string()))
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(full_schema, tables()),
+        root,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=f"{tag}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+        max_rows_per_group=1 << 20,
+    )
+    return rows
+
+
+def open_history(root=HISTORY_DIR):
+    return ds.dataset(root, format='parquet', partitioning=PARTITIONING)
+
+
+def read_history(root=HISTORY_DIR, months=None, stores=None, columns=None):
+    """Rows for the given months / store codes as a pyarrow Table
+
+    Only partitions matching `months` and `stores` are read.
+    """
+    dataset = open_history(root)
+    expr = None
+    if months:
+        expr = ds.field('month').isin([str(m) for m in months])
+    if stores:
+        store_expr = ds.field('store_code').isin([str(s) for s in stores])
+        expr = store_expr if expr is None else expr & store_expr
+    return dataset.to_table(columns=columns, filter=expr)
+
+
+def list_partitions(root=HISTORY_DIR):
+    """Sorted (month, store_code) pairs present in the store"""
+    parts = set()
+    for fragment in open_history(root).get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        parts.add((keys.get('month'), keys.get('store_code')))
+    return sorted(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', default=HISTORY_DIR, help=f'history store directory (default: {HISTORY_DIR})')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    imp = sub.add_parser('import', help='convert existing CSVs into partitions (one-time)')
+    imp.add_argument('csv', nargs='+')
+
+    query = sub.add_parser('query', help='print rows for some months/stores')
+    query.add_argument('--month', action='append', help='YYYY-MM (repeatable)')
+    query.add_argument('--store', action='append', help='store code (repeatable)')
+    query.add_argument('--sku', help='only this SKU')
+
+    sub.add_parser('partitions', help='list (month, store_code) partitions')
+
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        for path in args.csv:
+            print(f"Importing {path}...", flush=True)
+            rows = add_csv(path, args.root)
+            print(f"  ✓ {rows:,} rows")
+        print(f"History store: {args.root} ({len(list_partitions(args.root))} partitions)")
+    elif args.command == 'query':
+        table = read_history(args.root, args.month, args.store)
+        if args.sku:
+            table = table.filter(pc.equal(pc.cast(table.column('sku'), pa.string()), args.sku))
+        table = table.cast(pa.schema([
+            pa.field(f.name, f.type.value_type if pa.types.is_dictionary(f.type) else f.type)
+            for f in table.schema]))
+        pv.write_csv(table, sys.stdout.buffer)
+    elif args.command == 'partitions':
+        for month, store_code in list_partitions(args.root):
+            print(f"{month}  {store_code}")
+
+
+if __name__ == "__main__":
+    main()
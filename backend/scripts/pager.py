@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Category pager shared by both scrapers
+
+Asks for the largest page size the endpoint accepts (stepping down a ladder,
+per store, whenever a size is rejected or silently clamped), learns totalPages from
+page 1, then issues the remaining pages concurrently and reassembles them in
+page order.
+"""
+import asyncio
+import sys
+
+import telemetry
+from transport import TransportError
+
+# Largest first; 15 is what the site itself asks for, so it always works
+PAGE_SIZES = (100, 50, 30, 15)
+
+
+class PageSizer:
+    """Remembers the largest page size each store has accepted this run
+
+    Kept per store, so one store clamping its pages does not shrink the
+    pages of every store after it.
+    """
+
+    def __init__(self, sizes=PAGE_SIZES):
+        self.sizes = list(sizes)
+        self.index = {}
+
+    def size(self, store_code):
+        return self.sizes[self.index.get(str(store_code), 0)]
+
+    def step_down(self, store_code, rejected):
+        """Record that `rejected` failed for the store; True if a smaller size is left to try"""
+        if rejected != self.size(store_code):
+            # Another category already stepped down past it
+            return True
+        index = self.index.get(str(store_code), 0)
+        if index + 1 < len(self.sizes):
+            self.index[str(store_code)] = index + 1
+            print(f"  (store {store_code}: page size {rejected} rejected, falling back to "
+                  f"{self.size(store_code)})", file=sys.stderr)
+            return True
+        return False
+
+
+def build_payload(query, store_code, category_id, current_page, page_size):
+    return {
+        "operationName": "SearchProducts",
+        "variables": {
+            "storeCode": str(store_code),
+            "categoryId": int(category_id),
+            "currentPage": current_page,
+            "pageSize": page_size
+        },
+        "query": query
+    }
+
+
+async def post(transport, payload, store_code, limiter, retry=None, category_id='-', check=None):
+    """POST through the rate limiter, under the run's retry policy when given one
+
+    Every attempt is timed for the run's telemetry under (store_code, category_id).
+    `check(result)` may raise to make the attempt count as failed, so a bad
+    response is retried like a failed request.
+    """
+    async def request():
+        await limiter.acquire()
+        with telemetry.request():
+            result = await transport.post(payload)
+        if check is not None:
+            check(result)
+        return result
+
+    with telemetry.labels(store_code, category_id):
+        if retry is None:
+            return await request()
+        return await retry.run(store_code, request)
+
+
+def give_up(retry, store_code, category_id, current_page, reason):
+    """Report a page that could not be fetched; its category ends incomplete"""
+    print(f"    Error (store {store_code}, category {category_id}, page {current_page}): {reason}",
+          file=sys.stderr)
+    telemetry.incomplete(store_code, category_id)
+    if retry is not None:
+        retry.mark_incomplete(store_code, category_id, current_page, reason)
+
+
+def products_of(result):
+    """data.products of a response, or None"""
+    return ((result or {}).get('data') or {}).get('products')
+
+
+def require_products(result):
+    if products_of(result) is None:
+        raise TransportError("response has no data.products")
+
+
+async def fetch_page(transport, query, store_code, category_id, current_page, page_size, limiter,
+                     retry=None, required=False):
+    """One page of products; None if the response has no data.products
+
+    With required=True a response without data.products is retried under
+    `retry` and raises once attempts run out. Page 1 leaves it off: there a
+    missing page means the page size was rejected and the ladder steps down.
+    """
+    result = await post(transport, build_payload(query, store_code, category_id,
+                                                 current_page, page_size),
+                        store_code, limiter, retry, category_id,
+                        require_products if required else None)
+    return products_of(result)
+
+
+async def fetch_category_items(transport, query, store_code, category_id, limiter, sizer,
+                               journal=None, retry=None):
+    """All raw product items for one store/category, in page order
+
+    With a checkpoint journal, pages it already holds are reused (at the
+    page size they were fetched with) and every newly fetched page is
+    recorded as soon as it arrives. Failed requests are retried under
+    `retry`; pages that still fail are reported to it as incomplete.
+
+    Returns (items, total_count, total_pages)
+    """
+    cached = journal.page(store_code, category_id, 1) if journal else None
+    if cached:
+        page_size, first = cached['page_size'], cached['data']
+    else:
+        while True:
+            page_size = sizer.size(store_code)
+            try:
+                first = await fetch_page(transport, query, store_code, category_id, 1, page_size,
+                                         limiter, retry)
+            except Exception as e:
+                give_up(retry, store_code, category_id, 1, e)
+                return [], 0, 0
+
+            if first is None:
+                if sizer.step_down(store_code, page_size):
+                    continue
+                give_up(retry, store_code, category_id, 1, "response has no data.products")
+                return [], 0, 0
+
+            # The endpoint capped the page below what we asked for: its page
+            # numbering no longer matches ours, so step down and start over
+            if (len(first.get('items') or []) < min(page_size, first.get('total_count', 0) or 0)
+                    and sizer.step_down(store_code, page_size)):
+                continue
+            break
+        if journal:
+            journal.record_page(store_code, category_id, 1, page_size, first)
+
+    items = list(first.get('items') or [])
+    total_count = first.get('total_count', 0) or 0
+    total_pages = (first.get('pageInfo') or {}).get('totalPages', 1) or 1
+
+    async def rest(current_page):
+        cached = journal.page(store_code, category_id, current_page) if journal else None
+        if cached:
+            return cached['data'].get('items') or []
+        try:
+            data = await fetch_page(transport, query, store_code, category_id,
+                                    current_page, page_size, limiter, retry, required=True)
+        except Exception as e:
+            give_up(retry, store_code, category_id, current_page, e)
+            return []
+        if journal:
+            journal.record_page(store_code, category_id, current_page, page_size, data)
+        return data.get('items') or []
+
+    pages = await asyncio.gather(*(rest(n) for n in range(2, total_pages + 1)))
+    for page_items in pages:
+        items.extend(page_items)
+
+    return items, total_count, total_pages
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Cross-store price comparison - regenerates ../data/price_comparison_by_store.csv
+and ../data/items_with_price_variations.csv from a snapshot CSV
+
+Available items (availability 1) are pivoted once into a sku x store price
+matrix; Min/Max/Range/Avg are reductions over its rows and the variation
+subset is a mask on Range, so the cost grows with the matrix, not with a
+Python loop per item or store. Works for any number of stores.
+
+    price_comparison_by_store.csv    sku, item_title, one column per store,
+                                     Min_Price, Max_Price, Price_Range, Avg_Price
+                                     (largest range first, ties by sku)
+    items_with_price_variations.csv  the rows with Range > 0, short store
+                                     labels and only the Range column
+
+By default only items carried by every store are compared; --min-stores
+relaxes that for large fleets (missing stores are left blank and skipped by
+the statistics). A snapshot with several observations of a (store, sku)
+uses the latest one.
+
+Usage:
+    python3 price_comparison.py                                    # ../data/all_stores master.csv
+    python3 price_comparison.py traderjoes_ALL_STORES_20251101_020000.csv --min-stores 400
+    python3 price_comparison.py snapshot.csv --store-names names.json --out-dir comparison/
+"""
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FILE = "../data/all_stores master.csv"
+OUTPUT_DIR = "../data"
+COMPARISON_FILE = "price_comparison_by_store.csv"
+VARIATIONS_FILE = "items_with_price_variations.csv"
+
+# Column labels of the original 5-store analysis (docs/PRICE_COMPARISON_OLD_VS_NEW.md);
+# other stores are labelled "Store <code>" unless --store-names says otherwise
+STORE_LABELS = {
+    "31": "Los Angeles, CA",
+    "452": "Austin, TX",
+    "546": "East Village, NYC",
+    "701": "South Loop, Chicago",
+    "706": "Hyde Park, Chicago",
+}
+
+
+def short_label(label):
+    """Comma-free label for the variations file: "Austin, TX" -> "Austin", "Hyde Park, Chicago" -> "Hyde Park Chicago" """
+    return re.sub(r', [A-Z]{2}$', '', label).replace(',', '')
+
+
+def load_snapshot(path):
+    """Latest available observation per (store_code, sku)"""
+    frame = pd.read_csv(path, usecols=['sku', 'item_title', 'retail_price', 'store_code',
+                                       'availability', 'inserted_at'],
+                        dtype={'store_code': str, 'inserted_at': str})
+    frame = frame[frame['availability'] == 1]
+    frame = frame.sort_values('inserted_at', kind='stable')
+    return frame.drop_duplicates(['store_code', 'sku'], keep='last')
+
+
+def price_matrix(frame, labels, min_stores=None):
+    """sku x store price frame, columns sorted by label, rows by sku
+
+    Keeps items priced in at least `min_stores` stores (default: all).
+    """
+    matrix = frame.pivot(index='sku', columns='store_code', values='retail_price')
+    matrix = matrix.rename(columns=lambda code: labels.get(code, f"Store {code}"))
+    matrix = matrix.sort_index(axis=1).sort_index()
+    priced = matrix.notna().sum(axis=1).to_numpy()
+    return matrix[priced >= (min_stores or matrix.shape[1])]
+
+
+def compare(matrix, titles):
+    """The comparison table: prices plus Min/Max/Range/Avg, largest range first
+
+    Ties keep SKU order, so the output is the same on every machine.
+    """
+    prices = matrix.to_numpy(dtype='float64')
+    lo = np.nanmin(prices, axis=1)
+    hi = np.nanmax(prices, axis=1)
+    table = matrix.copy()
+    table.columns.name = None
+    table.insert(0, 'item_title', titles.reindex(matrix.index).to_numpy())
+    table['Min_Price'] = lo
+    table['Max_Price'] = hi
+    table['Price_Range'] = hi - lo
+    table['Avg_Price'] = np.round(np.nanmean(prices, axis=1), 2)
+    return table.sort_values('Price_Range', ascending=False, kind='stable').reset_index()
+
+
+def variations(table, store_columns):
+    """Rows whose price differs between stores, with short labels and only the Range"""
+    varied = table[table['Price_Range'].to_numpy() > 0]
+    out = varied[['sku', 'item_title'] + store_columns].rename(columns=short_label)
+    out['Range'] = varied['Price_Range']
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('snapshot', nargs='?', default=SNAPSHOT_FILE,
+                        help=f'snapshot CSV in the scrapers\' schema (default: {SNAPSHOT_FILE})')
+    parser.add_argument('--out-dir', default=OUTPUT_DIR, help=f'output directory (default: {OUTPUT_DIR})')
+    parser.add_argument('--store-names', help='JSON file of {store_code: column label}')
+    parser.add_argument('--min-stores', type=int,
+                        help='compare items priced in at least this many stores (default: all of them)')
+    args = parser.parse_args()
+
+    labels = dict(STORE_LABELS)
+    if args.store_names:
+        with open(args.store_names, 'r', encoding='utf-8') as f:
+            labels.update({str(code): label for code, label in json.load(f).items()})
+
+    frame = load_snapshot(args.snapshot)
+    titles = frame.drop_duplicates('sku', keep='last').set_index('sku')['item_title']
+    matrix = price_matrix(frame, labels, args.min_stores)
+    table = compare(matrix, titles)
+    varied = variations(table, list(matrix.columns))
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    table.to_csv(os.path.join(args.out_dir, COMPARISON_FILE), index=False)
+    varied.to_csv(os.path.join(args.out_dir, VARIATIONS_FILE), index=False)
+    print(f"✓ {COMPARISON_FILE}: {len(table)} items x {matrix.shape[1]} stores")
+    print(f"✓ {VARIATIONS_FILE}: {len(varied)} items with price differences")
+
+
+if __name__ == "__main__":
+    main()
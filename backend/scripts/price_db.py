@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Indexed local price database
+Loads CSVs in the scrapers' schema into SQLite, with a month column and
+composite indexes on (sku, store_code, month) and (store_code, month), so
+common questions are index lookups instead of a full CSV parse:
+
+    python3 price_db.py load traderjoes-dump-3.csv traderjoes_inflation_tracker.csv
+    python3 price_db.py series 033372
+    python3 price_db.py snapshot 2025-10 --store 701 --store 31
+    python3 price_db.py changes 701 2025-10
+
+A store's price for a month is its last observation in that month.
+sqlite3 ships with Python; nothing to install.
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+
+DB_PATH = "prices.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    sku TEXT NOT NULL,
+    store_code TEXT NOT NULL,
+    month TEXT NOT NULL,
+    inserted_at TEXT NOT NULL,
+    retail_price REAL NOT NULL,
+    item_title TEXT,
+    availability INTEGER,
+    sales_size REAL,
+    sales_uom_description TEXT,
+    published INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_prices_sku_store_month ON prices (sku, store_code, month);
+CREATE INDEX IF NOT EXISTS idx_prices_store_month ON prices (store_code, month);
+CREATE TABLE IF NOT EXISTS sources (
+    name TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    loaded_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+# One row per (sku, store_code, month): the latest observation that month
+MONTHLY_PRICES = """
+SELECT sku, store_code, month, retail_price, item_title FROM (
+    SELECT sku, store_code, month, retail_price, item_title,
+           ROW_NUMBER() OVER (PARTITION BY sku, store_code, month ORDER BY inserted_at DESC) AS n
+    FROM prices WHERE {where}
+) WHERE n = 1
+"""
+
+BATCH_ROWS = 10_000
+
+
+def _number(value, type_=float):
+    try:
+        return type_(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(record):
+    """Insert tuple for one CSV record, or None if it has no usable price/timestamp"""
+    price = _number(record.get('retail_price'))
+    inserted_at = (record.get('inserted_at') or '').strip().replace('T', ' ')[:19]
+    if price is None or len(inserted_at) < 19 or not inserted_at[:4].isdigit():
+        return None
+    return (
+        (record.get('sku') or '').strip(),
+        (record.get('store_code') or '').strip(),
+        inserted_at[:7],
+        inserted_at,
+        price,
+        record.get('item_title'),
+        _number(record.get('availability'), int),
+        _number(record.get('sales_size')),
+        record.get('sales_uom_description'),
+        _number(record.get('published'), int),
+    )
+
+
+def _placeholders(values):
+    return ', '.join('?' for _ in values)
+
+
+class PriceDB:
+    """SQLite price store with a few ready-made queries"""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def load_csv(self, path, source=None):
+        """Load a CSV in the scrapers' schema; returns rows added
+
+        Each file (by base name, or `source`) is loaded once, in a single
+        transaction, so re-running a load or a crashed load never leaves
+        duplicate or partial rows behind. Rows without a valid price or
+        timestamp are skipped.
+        """
+        source = source or os.path.basename(path)
+        if self.conn.execute("SELECT 1 FROM sources WHERE name = ?", (source,)).fetchone():
+            return 0
+
+        rows = 0
+        with self.conn:
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                batch = []
+                for record in csv.DictReader(f):
+                    row = _row(record)
+                    if row is None:
+                        continue
+                    batch.append(row)
+                    if len(batch) >= BATCH_ROWS:
+                        self.conn.executemany("INSERT INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                        rows += len(batch)
+                        batch = []
+                if batch:
+                    self.conn.executemany("INSERT INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                    rows += len(batch)
+            self.conn.execute("INSERT INTO sources (name, rows) VALUES (?, ?)", (source, rows))
+        self.conn.execute("ANALYZE")
+        return rows
+
+    def months(self, store_code=None):
+        if store_code is None:
+            cur = self.conn.execute("SELECT DISTINCT month FROM prices ORDER BY month")
+        else:
+            cur = self.conn.execute("SELECT DISTINCT month FROM prices WHERE store_code = ? ORDER BY month",
+                                    (str(store_code),))
+        return [month for (month,) in cur]
+
+    def time_series(self, sku, stores=None):
+        """[(month, store_code, price)] for one SKU, sorted by month then store"""
+        where, params = "sku = ?", [str(sku)]
+        if stores:
+            where += f" AND store_code IN ({_placeholders(stores)})"
+            params += [str(s) for s in stores]
+        cur = self.conn.execute(MONTHLY_PRICES.format(where=where) + " ORDER BY month, store_code", params)
+        return [(month, store_code, price) for _, store_code, month, price, _ in cur]
+
+    def snapshot(self, month, stores=None, skus=None):
+        """Cross-store prices for one month: {sku: {'title': ..., 'prices': {store_code: price}}}"""
+        where, params = "month = ?", [month]
+        if stores:
+            where += f" AND store_code IN ({_placeholders(stores)})"
+            params += [str(s) for s in stores]
+        if skus:
+            where += f" AND sku IN ({_placeholders(skus)})"
+            params += [str(s) for s in skus]
+        out = {}
+        for sku, store_code, _, price, title in self.conn.execute(
+                MONTHLY_PRICES.format(where=where) + " ORDER BY sku, store_code", params):
+            item = out.setdefault(sku, {'title': title, 'prices': {}})
+            item['prices'][store_code] = price
+        return out
+
+    def changes(self, store_code, month, previous=None):
+        """Items whose price in `store_code` differs between `previous` and `month`
+
+        `previous` defaults to the store's latest earlier month with data.
+        Returns [(sku, title, old_price, new_price)] sorted by SKU.
+        """
+        store_code = str(store_code)
+        if previous is None:
+            earlier = [m for m in self.months(store_code) if m < month]
+            if not earlier:
+                return []
+            previous = earlier[-1]
+        query = MONTHLY_PRICES.format(where="store_code = ? AND month IN (?, ?)")
+        prices = {}
+        for sku, _, row_month, price, title in self.conn.execute(query, (store_code, previous, month)):
+            entry = prices.setdefault(sku, {'title': None})
+            entry[row_month] = price
+            if row_month == month or entry['title'] is None:
+                entry['title'] = title
+        changed = []
+        for sku in sorted(prices):
+            entry = prices[sku]
+            if previous in entry and month in entry and entry[previous] != entry[month]:
+                changed.append((sku, entry['title'], entry[previous], entry[month]))
+        return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DB_PATH, help=f'database file (default: {DB_PATH})')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    load = sub.add_parser('load', help='load CSVs (each file only once)')
+    load.add_argument('csv', nargs='+')
+
+    series = sub.add_parser('series', help='monthly prices of one SKU across stores')
+    series.add_argument('sku')
+    series.add_argument('--store', action='append', help='store code (repeatable)')
+
+    snapshot = sub.add_parser('snapshot', help='every SKU priced across stores for one month')
+    snapshot.add_argument('month', help='YYYY-MM')
+    snapshot.add_argument('--store', action='append', help='store code (repeatable)')
+
+    changes = sub.add_parser('changes', help="items whose price changed in a store since its previous month")
+    changes.add_argument('store')
+    changes.add_argument('month', help='YYYY-MM')
+    changes.add_argument('--since', help='compare against this month instead (YYYY-MM)')
+
+    args = parser.parse_args()
+
+    with PriceDB(args.db) as db:
+        if args.command == 'load':
+            for path in args.csv:
+                print(f"Loading {path}...", flush=True)
+                rows = db.load_csv(path)
+                print(f"  ✓ {rows:,} rows" if rows else "  already loaded")
+        elif args.command == 'series':
+            for month, store_code, price in db.time_series(args.sku, args.store):
+                print(f"{month}  {store_code:>5}  ${price:.2f}")
+        elif args.command == 'snapshot':
+            snap = db.snapshot(args.month, args.store)
+            stores = args.store or sorted({s for item in snap.values() for s in item['prices']})
+            writer = csv.writer(sys.stdout)
+            writer.writerow(['sku', 'item_title'] + stores)
+            for sku, item in snap.items():
+                writer.writerow([sku, item['title']] + [item['prices'].get(s, '') for s in stores])
+        elif args.command == 'changes':
+            changed = db.changes(args.store, args.month, args.since)
+            for sku, title, old, new in changed:
+                pct = f"{(new - old) / old * 100:+.1f}%" if old else "new price"
+                print(f"{sku:>8}  ${old:.2f} -> ${new:.2f}  ({pct})  {title}")
+            print(f"{len(changed)} price changes", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Rate limiting for the GraphQL scrapers
+A single token bucket shared by every worker keeps the whole run under a
+requests-per-second budget, no matter how many pages fetch in parallel.
+FileTokenBucket does the same across processes on one machine.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import time
+
+# Default request budget: matches the old fixed 0.2s pause between pages
+DEFAULT_RPS = 5.0
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive (or None for unlimited)")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens=1):
+        """Wait until `tokens` are available, then take them"""
+        if self.rate is None:
+            return
+        # Holding the lock while sleeping keeps waiters first-come first-served
+        async with self.lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+
+
+class FileTokenBucket:
+    """Token bucket shared by several processes through a small locked state file
+
+    Each acquire takes an exclusive flock on `path`, refills from the wall
+    clock and takes tokens, or learns how long to wait without holding the
+    lock. Same interface as TokenBucket.
+    """
+
+    def __init__(self, path, rate, capacity=None):
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive (or None for unlimited)")
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate or 1.0)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def _take(self, tokens):
+        """Take `tokens` if available and return 0, else return seconds to wait"""
+        with open(self.path, 'a+', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                except ValueError:
+                    # New file: start full, like TokenBucket
+                    state = {'tokens': self.capacity, 'updated': time.time()}
+                now = time.time()
+                level = min(self.capacity, state['tokens'] + max(0.0, now - state['updated']) * self.rate)
+                wait = 0.0
+                if level >= tokens:
+                    level -= tokens
+                else:
+                    wait = (tokens - level) / self.rate
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'tokens': level, 'updated': now}))
+                f.flush()
+                return wait
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    async def acquire(self, tokens=1):
+        """Wait until `tokens` are available, then take them"""
+        if self.rate is None:
+            return
+        while True:
+            wait = await asyncio.to_thread(self._take, tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Retry policy shared by both scrapers
+  - exponential backoff with full jitter for transient failures
+  - rate-limit responses (HTTP 429/503) honour Retry-After and pause the
+    store's circuit breaker for that long instead of burning attempts
+  - a circuit breaker per store: after repeated failures only that store's
+    requests pause for a cooldown, other stores keep going
+  - every category that still ends incomplete is recorded for the run report
+"""
+import asyncio
+import random
+import sys
+import time
+
+import telemetry
+from transport import TransportError
+
+RATE_LIMIT_STATUSES = (429, 503)
+
+
+def is_rate_limited(error):
+    return isinstance(error, TransportError) and error.status in RATE_LIMIT_STATUSES
+
+
+class RetryPolicy:
+    """How many times to try a request and how long to wait in between"""
+
+    def __init__(self, attempts=5, base_delay=0.5, max_delay=30.0, rate_limit_delay=5.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_delay = rate_limit_delay
+
+    def retryable(self, error):
+        if isinstance(error, TransportError) and error.status is not None:
+            # 4xx other than 429 means the request itself is wrong; retrying won't help
+            return error.status in RATE_LIMIT_STATUSES or error.status >= 500
+        return True
+
+    def backoff(self, attempt, error):
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        if is_rate_limited(error):
+            try:
+                return min(self.max_delay, float(error.retry_after))
+            except (TypeError, ValueError):
+                return min(self.max_delay, self.rate_limit_delay * 2 ** attempt)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Pauses one store's requests after `threshold` consecutive failures"""
+
+    def __init__(self, name, threshold=5, cooldown=60.0):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+
+    async def wait(self):
+        delay = self.open_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def success(self):
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.trip(self.cooldown)
+            # Half-open after the cooldown: one more failure trips it again
+            self.failures = self.threshold - 1
+
+    def trip(self, seconds):
+        until = time.monotonic() + seconds
+        if until > self.open_until:
+            self.open_until = until
+            print(f"  (store {self.name}: pausing requests for {seconds:.1f}s)", file=sys.stderr)
+
+
+class Retrier:
+    """Retry policy, per-store breakers and the incomplete-category report for one run"""
+
+    def __init__(self, policy=None, threshold=5, cooldown=60.0):
+        self.policy = policy or RetryPolicy()
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.breakers = {}
+        self.incomplete = {}
+        self.retries = 0
+
+    def breaker(self, store_code):
+        store_code = str(store_code)
+        if store_code not in self.breakers:
+            self.breakers[store_code] = CircuitBreaker(store_code, self.threshold, self.cooldown)
+        return self.breakers[store_code]
+
+    async def run(self, store_code, request):
+        """Await `request()` (a zero-argument coroutine factory) under the policy"""
+        breaker = self.breaker(store_code)
+        for attempt in range(self.policy.attempts):
+            await breaker.wait()
+            try:
+                result = await request()
+            except Exception as e:
+                if not self.policy.retryable(e) or attempt + 1 == self.policy.attempts:
+                    breaker.failure()
+                    raise
+                delay = self.policy.backoff(attempt, e)
+                if is_rate_limited(e):
+                    breaker.trip(delay)
+                else:
+                    breaker.failure()
+                self.retries += 1
+                telemetry.retried()
+                print(f"    Retry {attempt + 1}/{self.policy.attempts - 1} for store {store_code} "
+                      f"in {delay:.1f}s: {e}", file=sys.stderr)
+                await asyncio.sleep(delay)
+            else:
+                breaker.success()
+                return result
+
+    def mark_incomplete(self, store_code, category_id, current_page, reason):
+        key = (str(store_code), str(category_id))
+        self.incomplete.setdefault(key, []).append((current_page, str(reason)))
+
+    def print_report(self, file=sys.stderr):
+        """List every category that ended incomplete; returns how many there were"""
+        if not self.incomplete:
+            return 0
+        print(f"\n⚠️  {len(self.incomplete)} incomplete categories:", file=file)
+        for (store_code, category_id), missing in sorted(self.incomplete.items()):
+            pages = ', '.join(str(page) for page, _ in missing)
+            print(f"  store {store_code}, category {category_id}: missing page(s) {pages} "
+                  f"({missing[-1][1]})", file=file)
+        return len(self.incomplete)
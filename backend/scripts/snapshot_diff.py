@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Snapshot diff engine - monthly snapshots as a compact change log
+Each run's snapshot is compared with the previous one, row by row, keyed by
+(store_code, sku) using a hash of the row's other fields. Only the
+differences are appended to the change log (traderjoes_price_changes.csv):
+
+    snapshot,change,old_retail_price,sku,retail_price,item_title,inserted_at,store_code,...
+    2025-11-01,snapshot,,,,,2025-11-01 02:00:05,701,,,,
+    2025-11-01,price,3.99,033372,4.29,Organic Sweet Potatoes,...
+    2025-11-01,added,,012345,2.99,...
+    2025-11-01,removed,1.99,054321,,,,701,,,,
+
+change is one of
+    snapshot       a store that is in the snapshot, with its inserted_at
+    added          new (store_code, sku); the full row
+    removed        (store_code, sku) no longer listed; old_retail_price only
+    price          retail_price changed (the full new row)
+    availability   availability changed, price did not
+    updated        only title, size, unit or published changed
+
+The first snapshot logged is all "added" rows. Replaying the log up to a
+snapshot rebuilds it: the same rows grouped by store, every row carrying
+its store's inserted_at (the scrapers stamp one timestamp per store).
+
+Usage:
+    python3 snapshot_diff.py add backups/traderjoes_snapshot_2025-11-01.csv
+    python3 snapshot_diff.py list
+    python3 snapshot_diff.py show 2025-11-01
+    python3 snapshot_diff.py rebuild 2025-11-01 -o snapshot_2025-11-01.csv
+"""
+import argparse
+import csv
+import hashlib
+import os
+import re
+import shutil
+import sys
+from collections import Counter
+
+from csv_sink import FIELDNAMES, StreamingCSVWriter, fsync_dir
+
+CHANGE_LOG = "traderjoes_price_changes.csv"
+LOG_FIELDNAMES = ['snapshot', 'change', 'old_retail_price'] + FIELDNAMES
+
+# Everything but the key and the per-store timestamp
+HASHED_FIELDS = [name for name in FIELDNAMES if name not in ('sku', 'store_code', 'inserted_at')]
+
+CHANGES = ['snapshot', 'added', 'removed', 'price', 'availability', 'updated']
+
+
+def row_hash(row):
+    text = '\x1f'.join(row.get(name) or '' for name in HASHED_FIELDS)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+
+def _label_for(path, stores):
+    """YYYY-MM-DD from the snapshot's file name, else from its newest timestamp"""
+    match = re.search(r'\d{4}-\d{2}-\d{2}', os.path.basename(path))
+    if match:
+        return match.group(0)
+    return max(stores.values())[:10]
+
+
+class SnapshotState:
+    """Rows of one snapshot: {store_code: {sku: row}} plus each store's inserted_at"""
+
+    def __init__(self):
+        self.stores = {}
+        self.timestamps = {}
+
+    def rows(self):
+        """Snapshot rows in store order"""
+        for store_code, timestamp in self.timestamps.items():
+            for row in self.stores.get(store_code, {}).values():
+                yield dict(row, inserted_at=timestamp)
+
+    def apply(self, timestamps, records):
+        """Move to the next snapshot from its change records"""
+        self.timestamps = timestamps
+        for record in records:
+            change, store_code, sku = record['change'], record['store_code'], record['sku']
+            if change == 'removed':
+                self.stores.get(store_code, {}).pop(sku, None)
+            else:
+                row = {name: record[name] for name in FIELDNAMES if name != 'inserted_at'}
+                self.stores.setdefault(store_code, {})[sku] = row
+        for store_code in [code for code, rows in self.stores.items() if not rows]:
+            del self.stores[store_code]
+
+
+def read_log(path=CHANGE_LOG):
+    """[(label, {store_code: inserted_at}, [change records])] in log order"""
+    if not os.path.exists(path):
+        return []
+    snapshots = []
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f):
+            if not snapshots or snapshots[-1][0] != record['snapshot']:
+                snapshots.append((record['snapshot'], {}, []))
+            _, timestamps, records = snapshots[-1]
+            if record['change'] == 'snapshot':
+                timestamps[record['store_code']] = record['inserted_at']
+            else:
+                records.append(record)
+    return snapshots
+
+
+def replay(path=CHANGE_LOG, until=None):
+    """SnapshotState as of snapshot `until` (default: the latest); KeyError if it was never logged"""
+    state = SnapshotState()
+    for label, timestamps, records in read_log(path):
+        state.apply(timestamps, records)
+        if label == until:
+            return state
+    if until is not None:
+        raise KeyError(f"snapshot {until} is not in {path}")
+    return state
+
+
+def diff(previous, snapshot_path):
+    """(store timestamps, change records) turning `previous` into the snapshot CSV
+
+    Within a store, the first row of each SKU counts, like the scrapers'
+    per-store dedup.
+    """
+    timestamps, records = {}, []
+    seen = {}
+    with open(snapshot_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            store_code, sku = row['store_code'], row['sku']
+            store_seen = seen.setdefault(store_code, set())
+            if sku in store_seen:
+                continue
+            store_seen.add(sku)
+            timestamps.setdefault(store_code, row['inserted_at'])
+
+            old = previous.stores.get(store_code, {}).get(sku)
+            if old is None:
+                change = 'added'
+            elif row_hash(old) == row_hash(row):
+                continue
+            elif old['retail_price'] != row['retail_price']:
+                change = 'price'
+            elif old['availability'] != row['availability']:
+                change = 'availability'
+            else:
+                change = 'updated'
+            records.append(dict(row, change=change, old_retail_price=old['retail_price'] if old else ''))
+
+    for store_code, rows in previous.stores.items():
+        for sku, old in rows.items():
+            if sku not in seen.get(store_code, ()):
+                records.append({'change': 'removed', 'old_retail_price': old['retail_price'],
+                                'sku': sku, 'store_code': store_code})
+    return timestamps, records
+
+
+def add_snapshot(snapshot_path, log=CHANGE_LOG, label=None):
+    """Append the snapshot's changes to `log`; returns a Counter of changes, or None if already logged
+
+    Snapshots have to be added in order: a label older than the log's
+    latest is refused.
+    """
+    logged = read_log(log)
+    state = SnapshotState()
+    for logged_label, timestamps, records in logged:
+        state.apply(timestamps, records)
+
+    timestamps, records = diff(state, snapshot_path)
+    if not timestamps:
+        raise ValueError(f"{snapshot_path} has no rows")
+    label = label or _label_for(snapshot_path, timestamps)
+    labels = [logged_label for logged_label, _, _ in logged]
+    if label in labels:
+        return None
+    if labels and label < labels[-1]:
+        raise ValueError(f"snapshot {label} is older than the latest logged snapshot {labels[-1]}")
+
+    # The log is small next to the snapshots, so it is rewritten and renamed
+    # into place rather than appended: a crash never leaves half a snapshot in it
+    tmp_path = log + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        if logged:
+            with open(log, 'r', newline='', encoding='utf-8') as existing:
+                shutil.copyfileobj(existing, f)
+        writer = csv.DictWriter(f, fieldnames=LOG_FIELDNAMES, restval='', extrasaction='ignore')
+        if not logged:
+            writer.writeheader()
+        for store_code, timestamp in timestamps.items():
+            writer.writerow({'snapshot': label, 'change': 'snapshot', 'store_code': store_code,
+                             'inserted_at': timestamp})
+        for record in records:
+            record.pop('inserted_at', None)
+            writer.writerow(dict(record, snapshot=label))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, log)
+    fsync_dir(log)
+
+    counts = Counter(record['change'] for record in records)
+    counts['snapshot'] = len(timestamps)
+    return counts
+
+
+def rebuild(label, output_file, log=CHANGE_LOG):
+    """Write snapshot `label` back out as a CSV in the scrapers' schema; returns rows written"""
+    state = replay(log, label)
+    with StreamingCSVWriter(output_file, FIELDNAMES) as sink:
+        sink.write_rows(state.rows())
+    return sink.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--log', default=CHANGE_LOG, help=f'change log (default: {CHANGE_LOG})')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    add = sub.add_parser('add', help='append the changes since the previous snapshot')
+    add.add_argument('snapshot', nargs='+', help='snapshot CSVs, oldest first')
+    add.add_argument('--label', help='snapshot label (default: date in the file name)')
+
+    sub.add_parser('list', help='logged snapshots and their change counts')
+
+    show = sub.add_parser('show', help="one snapshot's price changes")
+    show.add_argument('label')
+
+    rebuild_cmd = sub.add_parser('rebuild', help='write a logged snapshot back out as a CSV')
+    rebuild_cmd.add_argument('label')
+    rebuild_cmd.add_argument('-o', '--out', help='output CSV (default: snapshot_<label>.csv)')
+
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        if args.label and len(args.snapshot) > 1:
+            parser.error('--label needs a single snapshot')
+        for path in args.snapshot:
+            counts = add_snapshot(path, args.log, args.label)
+            if counts is None:
+                print(f"  {path}: already logged")
+            else:
+                print(f"✓ {path}: " + ", ".join(f"{counts[c]} {c}" for c in CHANGES if counts[c]))
+    elif args.command == 'list':
+        for label, timestamps, records in read_log(args.log):
+            counts = Counter(record['change'] for record in records)
+            print(f"{label}  {len(timestamps)} stores  " +
+                  ", ".join(f"{counts[c]} {c}" for c in CHANGES[1:] if counts[c]))
+    elif args.command == 'show':
+        snapshot = [entry for entry in read_log(args.log) if entry[0] == args.label]
+        if not snapshot:
+            sys.exit(f"snapshot {args.label} is not in {args.log}")
+        for record in snapshot[0][2]:
+            if record['change'] == 'price':
+                old, new = record['old_retail_price'], record['retail_price']
+                try:
+                    pct = f"{(float(new) - float(old)) / float(old) * 100:+.1f}%"
+                except (ValueError, ZeroDivisionError):
+                    pct = "new price"
+                print(f"{record['store_code']:>5}  {record['sku']:>8}  ${old} -> ${new}  "
+                      f"({pct})  {record['item_title']}")
+    else:
+        output_file = args.out or f"snapshot_{args.label}.csv"
+        rows = rebuild(args.label, output_file, args.log)
+        print(f"✓ Rebuilt {args.label}: {rows} rows -> {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Scrape run telemetry
+Counters for the fetch path, kept per (store, category) and written at the
+end of a run as a JSON summary and a Prometheus text-format file:
+
+    requests, errors by kind (HTTP status or exception name), retries,
+    incomplete pages, pages, rows, decoded response bytes, a request latency
+    histogram, pages/sec and rows/sec, and where the time went:
+    "transport" (page.evaluate or the HTTP round trip) vs "parse" (JSON
+    decoding and turning items into CSV rows)
+
+A run calls start() once; pager.post() labels every request with its store
+and category, and the transports and scrapers report into whatever run is
+active. Without an active run every hook is a no-op. Aliased batch requests
+spanning several categories carry the category "batch"; those categories
+still get pages and rows, but no request timings of their own.
+
+Summaries from several processes (fetch_fleet.py's workers) add up:
+
+    python3 telemetry.py merge fleet_*/shard-*.telemetry.json -o run.telemetry.json
+    python3 telemetry.py show traderjoes_ALL_STORES_20251101_020000.telemetry.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+# Upper bounds in seconds; the last bucket (+Inf) is implicit
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "traderjoes_scrape"
+
+_active = None
+_labels = ContextVar('telemetry_labels', default=('-', '-'))
+_sample = ContextVar('telemetry_sample', default=None)
+
+
+def _new_series():
+    return {
+        'requests': 0, 'errors': {}, 'retries': 0, 'incomplete_pages': 0,
+        'pages': 0, 'rows': 0, 'bytes': 0,
+        'transport_seconds': 0.0, 'parse_seconds': 0.0,
+        'latency_sum': 0.0, 'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'first': None, 'last': None,
+    }
+
+
+def _add_series(into, series):
+    for name in ('requests', 'retries', 'incomplete_pages', 'pages', 'rows', 'bytes',
+                 'transport_seconds', 'parse_seconds', 'latency_sum'):
+        into[name] += series[name]
+    for kind, count in series['errors'].items():
+        into['errors'][kind] = into['errors'].get(kind, 0) + count
+    into['latency_buckets'] = [a + b for a, b in zip(into['latency_buckets'], series['latency_buckets'])]
+    for name, pick in (('first', min), ('last', max)):
+        values = [v for v in (into[name], series[name]) if v is not None]
+        into[name] = pick(values) if values else None
+    return into
+
+
+def quantile(buckets, q):
+    """Latency quantile from histogram counts, interpolated within the bucket like PromQL"""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for index, count in enumerate(buckets):
+        if seen + count >= rank and count:
+            if index == len(LATENCY_BUCKETS):
+                return LATENCY_BUCKETS[-1]
+            lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+            return lower + (LATENCY_BUCKETS[index] - lower) * (rank - seen) / count
+        seen += count
+    return LATENCY_BUCKETS[-1]
+
+
+def _number(value):
+    return repr(round(value, 6)) if isinstance(value, float) else str(value)
+
+
+def _report(series):
+    """JSON view of one series: raw counters plus latency quantiles and rates"""
+    out = dict(series)
+    out['errors_total'] = sum(series['errors'].values())
+    for name, q in (('latency_p50', 0.5), ('latency_p90', 0.9), ('latency_p99', 0.99)):
+        value = quantile(series['latency_buckets'], q)
+        out[name] = round(value, 4) if value is not None else None
+    window = series['last'] - series['first'] if series['first'] is not None else 0
+    out['pages_per_sec'] = round(series['pages'] / window, 3) if window > 0 else None
+    out['rows_per_sec'] = round(series['rows'] / window, 3) if window > 0 else None
+    return out
+
+
+class Telemetry:
+    """Counters for one scrape run, keyed by (store_code, category_id)"""
+
+    def __init__(self, job):
+        self.job = job
+        self.started = time.time()
+        self.finished = None
+        self.series = {}
+
+    def stats(self, store_code, category_id):
+        key = (str(store_code), str(category_id))
+        if key not in self.series:
+            self.series[key] = _new_series()
+        return self.series[key]
+
+    def observe(self, store_code, category_id, started, seconds, nbytes=0, parse_seconds=0.0, error=None):
+        """One request attempt that took `seconds`, `parse_seconds` of it decoding the response"""
+        stats = self.stats(store_code, category_id)
+        stats['requests'] += 1
+        stats['bytes'] += nbytes
+        stats['parse_seconds'] += parse_seconds
+        stats['transport_seconds'] += max(0.0, seconds - parse_seconds)
+        stats['latency_sum'] += seconds
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+        stats['latency_buckets'][index] += 1
+        if error is not None:
+            stats['errors'][error] = stats['errors'].get(error, 0) + 1
+        stats['first'] = started if stats['first'] is None else min(stats['first'], started)
+        stats['last'] = max(stats['last'] or 0.0, started + seconds)
+
+    def merge(self, summary):
+        """Add the series of a summary written by another process"""
+        self.started = min(self.started, summary['started'])
+        if summary.get('finished'):
+            self.finished = max(self.finished or 0.0, summary['finished'])
+        for store_code, store in summary['stores'].items():
+            for category_id, series in store['categories'].items():
+                raw = {name: series[name] for name in _new_series()}
+                _add_series(self.stats(store_code, category_id), raw)
+
+    def totals(self, keys=None):
+        total = _new_series()
+        for key, series in self.series.items():
+            if keys is None or key in keys:
+                _add_series(total, series)
+        return total
+
+    def summary(self):
+        finished = self.finished or time.time()
+        run = _report(self.totals())
+        # Whole-run rates are over the run's wall time, not the request window
+        elapsed = finished - self.started
+        run['pages_per_sec'] = round(run['pages'] / elapsed, 3) if elapsed > 0 else None
+        run['rows_per_sec'] = round(run['rows'] / elapsed, 3) if elapsed > 0 else None
+
+        stores = {}
+        for (store_code, category_id) in sorted(self.series):
+            stores.setdefault(store_code, {'categories': {}})['categories'][category_id] = \
+                _report(self.series[(store_code, category_id)])
+        for store_code, store in stores.items():
+            store['totals'] = _report(self.totals({(store_code, cid) for cid in store['categories']}))
+
+        return {
+            'job': self.job,
+            'started': self.started,
+            'finished': finished,
+            'started_at': datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec='seconds'),
+            'elapsed_seconds': round(elapsed, 3),
+            'latency_buckets': list(LATENCY_BUCKETS),
+            'totals': run,
+            'stores': stores,
+        }
+
+    def prometheus(self):
+        """Prometheus text exposition format (for node_exporter's textfile collector)"""
+        job = self.job
+        finished = self.finished or time.time()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for pairs, value in samples:
+                text = ','.join(f'{k}="{v}"' for k, v in [('job', job)] + pairs)
+                lines.append(f"{METRIC_PREFIX}_{name}{{{text}}} {_number(value)}")
+
+        keys = sorted(self.series)
+
+        def per_key(field):
+            return [([('store', s), ('category', c)], self.series[(s, c)][field]) for s, c in keys]
+
+        metric('run_start_timestamp_seconds', 'gauge', 'Unix time the run started',
+               [([], round(self.started))])
+        metric('run_duration_seconds', 'gauge', 'Wall time of the run',
+               [([], round(finished - self.started, 3))])
+        metric('requests_total', 'counter', 'GraphQL request attempts', per_key('requests'))
+        metric('request_errors_total', 'counter', 'Failed request attempts by HTTP status or exception',
+               [([('store', s), ('category', c), ('kind', kind)], count)
+                for s, c in keys for kind, count in sorted(self.series[(s, c)]['errors'].items())])
+        metric('retries_total', 'counter', 'Requests retried under the retry policy', per_key('retries'))
+        metric('incomplete_pages_total', 'counter', 'Pages given up on after retries',
+               per_key('incomplete_pages'))
+        metric('pages_total', 'counter', 'Result pages parsed', per_key('pages'))
+        metric('rows_total', 'counter', 'Product rows parsed', per_key('rows'))
+        metric('response_bytes_total', 'counter', 'Decoded response body bytes (after gzip)',
+               per_key('bytes'))
+        metric('phase_seconds_total', 'counter',
+               'Time in the transport (page.evaluate / HTTP round trip) and in parsing',
+               [([('store', s), ('category', c), ('phase', phase)], self.series[(s, c)][f'{phase}_seconds'])
+                for s, c in keys for phase in ('transport', 'parse')])
+
+        rates = [(s, c, _report(self.series[(s, c)])) for s, c in keys]
+        metric('pages_per_second', 'gauge', 'Pages per second over the series\' request window',
+               [([('store', s), ('category', c)], float(r['pages_per_sec'])) for s, c, r in rates
+                if r['pages_per_sec'] is not None])
+        metric('rows_per_second', 'gauge', 'Rows per second over the series\' request window',
+               [([('store', s), ('category', c)], float(r['rows_per_sec'])) for s, c, r in rates
+                if r['rows_per_sec'] is not None])
+
+        # The histogram is per category only, so a fleet run stays a manageable file
+        name = f"{METRIC_PREFIX}_request_seconds"
+        lines.append(f"# HELP {name} GraphQL request latency")
+        lines.append(f"# TYPE {name} histogram")
+        categories = sorted({c for _, c in keys})
+        for category_id in categories:
+            total = self.totals({key for key in keys if key[1] == category_id})
+            labels = f'job="{job}",category="{category_id}"'
+            cumulative = 0
+            for bound, count in zip(list(LATENCY_BUCKETS) + ['+Inf'], total['latency_buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {_number(total['latency_sum'])}")
+            lines.append(f"{name}_count{{{labels}}} {total['requests']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path, prom_path):
+        """Write both files atomically"""
+        self.finished = self.finished or time.time()
+        for path, text in ((json_path, json.dumps(self.summary(), indent=1)), (prom_path, self.prometheus())):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(path + '.tmp', path)
+
+
+def paths_for(output_file):
+    """(json, prom) telemetry paths next to a run's output CSV"""
+    base = os.path.splitext(output_file)[0]
+    return base + '.telemetry.json', base + '.prom'
+
+
+def start(job):
+    """Begin collecting for this process's run; returns the Telemetry"""
+    global _active
+    _active = Telemetry(job)
+    return _active
+
+
+def finish(json_path, prom_path):
+    """Write the active run's files and stop collecting; returns the Telemetry (or None)"""
+    global _active
+    run, _active = _active, None
+    if run is not None:
+        run.write(json_path, prom_path)
+    return run
+
+
+@contextmanager
+def labels(store_code, category_id):
+    """Attribute requests made inside the block (and the tasks it starts) to a store/category"""
+    token = _labels.set((str(store_code), str(category_id)))
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+@contextmanager
+def request():
+    """Time one request attempt under the current labels"""
+    if _active is None:
+        yield
+        return
+    sample = {'bytes': 0, 'parse_seconds': 0.0}
+    token = _sample.set(sample)
+    started, clock = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        # TransportError carries the HTTP status; anything else is named by its type
+        error = str(e.status) if getattr(e, 'status', None) else type(e).__name__
+        raise
+    finally:
+        _sample.reset(token)
+        _active.observe(*_labels.get(), started, time.perf_counter() - clock,
+                        sample['bytes'], sample['parse_seconds'], error)
+
+
+def note_response(nbytes, parse_seconds=0.0):
+    """Called by a transport: decoded size of the response body and time spent parsing it"""
+    sample = _sample.get()
+    if sample is not None:
+        sample['bytes'] += nbytes
+        sample['parse_seconds'] += parse_seconds
+
+
+def retried():
+    if _active is not None:
+        _active.stats(*_labels.get())['retries'] += 1
+
+
+def incomplete(store_code, category_id):
+    if _active is not None:
+        _active.stats(store_code, category_id)['incomplete_pages'] += 1
+
+
+def parsed(store_code, category_id, pages, rows, seconds):
+    """A category's pages turned into `rows` CSV rows in `seconds`"""
+    if _active is not None:
+        stats = _active.stats(store_code, category_id)
+        stats['pages'] += pages
+        stats['rows'] += rows
+        stats['parse_seconds'] += seconds
+
+
+def describe(summary):
+    """One-line run health: requests, errors, latency and throughput"""
+    t = summary['totals']
+    p50 = f"{t['latency_p50'] * 1000:.0f}" if t['latency_p50'] is not None else "-"
+    p99 = f"{t['latency_p99'] * 1000:.0f}" if t['latency_p99'] is not None else "-"
+    busy = t['transport_seconds'] + t['parse_seconds']
+    parse_share = f"{t['parse_seconds'] / busy * 100:.1f}%" if busy else "-"
+    return (f"{t['requests']} requests ({t['errors_total']} errors, {t['retries']} retries), "
+            f"latency p50 {p50} ms / p99 {p99} ms, {t['pages_per_sec'] or 0:.2f} pages/s, "
+            f"{t['rows_per_sec'] or 0:.1f} rows/s, {t['bytes'] / 1e6:.1f} MB, parsing {parse_share} of busy time")
+
+
+def merge_files(paths, job=None):
+    """Telemetry holding the sum of the JSON summaries at `paths`"""
+    run = None
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"  (no telemetry in {path})", file=sys.stderr)
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+        if run is None:
+            run = Telemetry(job or summary['job'])
+            run.started = summary['started']
+        run.merge(summary)
+    if run is None:
+        run = Telemetry(job or 'merged')
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    merge = sub.add_parser('merge', help='add up summaries from several processes')
+    merge.add_argument('summaries', nargs='+')
+    merge.add_argument('-o', '--out', required=True, help='merged JSON summary (the .prom goes next to it)')
+    merge.add_argument('--job', help='job label (default: the first summary\'s)')
+
+    show = sub.add_parser('show', help='per-store health of one run')
+    show.add_argument('summary')
+
+    args = parser.parse_args()
+
+    if args.command == 'merge':
+        run = merge_files(args.summaries, args.job)
+        prom_path = os.path.splitext(args.out)[0].removesuffix('.telemetry') + '.prom'
+        run.write(args.out, prom_path)
+        print(f"✓ {args.out}, {prom_path}: {describe(run.summary())}")
+    else:
+        with open(args.summary, 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+        print(f"{summary['job']} started {summary['started_at']}, {summary['elapsed_seconds'] / 60:.1f} min")
+        print(describe(summary))
+        for store_code, store in summary['stores'].items():
+            t = store['totals']
+            errors = ', '.join(f"{kind}: {count}" for kind, count in sorted(t['errors'].items()))
+            print(f"  {store_code:>5}  {t['requests']:5d} req  p50 {(t['latency_p50'] or 0) * 1000:6.0f} ms  "
+                  f"{t['pages_per_sec'] or 0:6.2f} pages/s  {t['rows_per_sec'] or 0:8.1f} rows/s"
+                  f"{'  errors ' + errors if errors else ''}")
+
+
+if __name__ == "__main__":
+    main()
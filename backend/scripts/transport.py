@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+GraphQL transports for the Trader Joe's scrapers
+
+Two ways to POST a query:
+  - "browser": page.evaluate(fetch(...)) inside a stealth Chromium page
+    (the original path and the scrapers' default)
+  - "http":    a keep-alive HTTP connection pool that reuses the cookies and
+    headers captured from one Playwright session; the browser is closed as
+    soon as the session is bootstrapped
+    (opt-in with --transport http; so far only tested against a local stub)
+
+Both expose the same `await transport.post(payload) -> dict` interface, and
+both report the response size and JSON decode time to the run's telemetry.
+"""
+import asyncio
+import gzip
+import json
+import http.client
+import time
+from contextlib import asynccontextmanager
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit
+
+import telemetry
+
+HOME_URL = 'https://www.traderjoes.com/'
+GRAPHQL_URL = 'https://www.traderjoes.com/api/graphql'
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+TRANSPORTS = ('http', 'browser')
+
+FETCH_JS = """
+    async ({url, payload}) => {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(payload)
+        });
+        if (!response.ok) {
+            return {__status: response.status, __retryAfter: response.headers.get('Retry-After')};
+        }
+        // Decoded body bytes, as HttpTransport counts them (text.length would count UTF-16 units)
+        const buffer = await response.arrayBuffer();
+        const started = performance.now();
+        const body = JSON.parse(new TextDecoder().decode(buffer));
+        return {__body: body, __bytes: buffer.byteLength, __parseMs: performance.now() - started};
+    }
+"""
+
+
+class TransportError(Exception):
+    """Non-2xx response (or unreadable body) from the GraphQL endpoint"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class BrowserTransport:
+    """POST through fetch() in a page that already sits on the site origin"""
+
+    name = 'browser'
+
+    def __init__(self, page, url=GRAPHQL_URL):
+        self.page = page
+        self.url = url
+
+    async def post(self, payload):
+        result = await self.page.evaluate(FETCH_JS, {'url': self.url, 'payload': payload})
+        if isinstance(result, dict) and '__status' in result:
+            raise TransportError(f"HTTP {result['__status']} from {self.url}",
+                                 status=result['__status'], retry_after=result.get('__retryAfter'))
+        telemetry.note_response(result['__bytes'], result['__parseMs'] / 1000)
+        return result['__body']
+
+    async def close(self):
+        pass
+
+
+class HttpTransport:
+    """Direct GraphQL POSTs over a pool of keep-alive connections
+
+    Blocking http.client I/O runs in worker threads, one connection per
+    in-flight request, so `pool_size` is also the maximum parallelism.
+    Cookies set by the server during the run are folded back into the jar.
+    """
+
+    name = 'http'
+
+    def __init__(self, url=GRAPHQL_URL, headers=None, cookies=None, pool_size=1, timeout=30):
+        parts = urlsplit(url)
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or '/'
+        if parts.query:
+            self.path += '?' + parts.query
+        self.timeout = timeout
+        self.headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip',
+            'User-Agent': USER_AGENT,
+            'Connection': 'keep-alive',
+        }
+        self.headers.update(headers or {})
+        self.cookies = dict(cookies or {})
+        self.pool = asyncio.Queue()
+        for _ in range(max(1, pool_size)):
+            self.pool.put_nowait(None)  # connections are opened lazily
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _request_headers(self):
+        headers = dict(self.headers)
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+        return headers
+
+    def _roundtrip(self, conn, body):
+        """One blocking request; reconnects once if a kept-alive socket went stale"""
+        for attempt in range(2):
+            if conn is None:
+                conn = self._connect()
+            try:
+                conn.request('POST', self.path, body=body, headers=self._request_headers())
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                    http.client.BadStatusLine, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                conn = None
+                if attempt:
+                    raise
+
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for morsel in SimpleCookie(header).values():
+                self.cookies[morsel.key] = morsel.value
+
+        if response.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        if response.will_close:
+            conn.close()
+            conn = None
+        return conn, response.status, response.headers.get('Retry-After'), data
+
+    async def post(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        conn = await self.pool.get()
+        try:
+            conn, status, retry_after, data = await asyncio.to_thread(self._roundtrip, conn, body)
+        except Exception:
+            if conn is not None:
+                conn.close()
+            conn = None
+            raise
+        finally:
+            self.pool.put_nowait(conn)
+
+        if not 200 <= status < 300:
+            raise TransportError(f"HTTP {status} from {self.url}", status=status,
+                                 retry_after=retry_after)
+        started = time.perf_counter()
+        try:
+            result = json.loads(data)
+        except ValueError as e:
+            raise TransportError(f"Invalid JSON from {self.url}: {e}", status=status)
+        # Decoded body size, so both transports report the same thing
+        telemetry.note_response(len(data), time.perf_counter() - started)
+        return result
+
+    async def close(self):
+        while not self.pool.empty():
+            conn = self.pool.get_nowait()
+            if conn is not None:
+                conn.close()
+
+
+async def new_session_page(context, url=HOME_URL):
+    """New stealth page sitting on the Trader Joe's origin, ready for fetch()"""
+    from playwright_stealth import Stealth
+
+    page = await context.new_page()
+    stealth_config = Stealth()
+    await stealth_config.apply_stealth_async(page)
+    await page.goto(url, wait_until='networkidle')
+    return page
+
+
+async def capture_session(context, page, url=GRAPHQL_URL):
+    """Cookies and browser-identifying headers for replaying requests outside Chromium"""
+    cookies = {c['name']: c['value'] for c in await context.cookies(url)}
+    user_agent = await page.evaluate("() => navigator.userAgent")
+    origin = f"{urlsplit(url).scheme}://{urlsplit(url).netloc}"
+    headers = {
+        'User-Agent': user_agent,
+        'Origin': origin,
+        'Referer': origin + '/',
+    }
+    return headers, cookies
+
+
+@asynccontextmanager
+async def open_transports(mode='browser', count=1, headless=False, url=GRAPHQL_URL):
+    """Yield `count` transports ready to POST GraphQL queries
+
+    browser: one stealth page per transport; Chromium stays up for the run
+    http:    Chromium bootstraps the session and is closed before yielding;
+             every slot shares one HttpTransport with a pool of `count`
+             keep-alive connections
+    """
+    if mode not in TRANSPORTS:
+        raise ValueError(f"Unknown transport {mode!r}, expected one of {TRANSPORTS}")
+
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        try:
+            context = await browser.new_context(
+                viewport={'width': 1920, 'height': 1080},
+                user_agent=USER_AGENT,
+            )
+
+            print("Establishing session...")
+            page = await new_session_page(context)
+            await asyncio.sleep(2)
+
+            if mode == 'browser':
+                pages = [page]
+                for _ in range(count - 1):
+                    pages.append(await new_session_page(context))
+                print(f"✓ Session established (browser transport, {count} page(s))\n")
+                yield [BrowserTransport(pg, url) for pg in pages]
+                return
+
+            headers, cookies = await capture_session(context, page, url)
+        finally:
+            await browser.close()
+
+    transport = HttpTransport(url, headers=headers, cookies=cookies, pool_size=count)
+    print(f"✓ Session established (http transport, {len(cookies)} cookies, "
+          f"{count} connection(s)); browser closed\n")
+    try:
+        yield [transport] * count
+    finally:
+        await transport.close()
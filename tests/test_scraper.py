@@ -0,0 +1,307 @@
+"""
+Scraper plumbing against a local stub of the GraphQL endpoint
+Run from the repository root: python3 -m pytest tests
+"""
+import asyncio
+import csv
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'scripts'))
+
+from checkpoint import CheckpointJournal
+from discover_stores import STORE_TOTAL, probe_store
+from csv_sink import StreamingCSVWriter, append_csv, count_path, read_row_count
+from graphql_batch import alias_for, fetch_store_items_batched, split_batch_result
+from pager import PageSizer, fetch_category_items
+from rate_limit import TokenBucket
+from retry import Retrier, RetryPolicy
+from transport import HttpTransport
+
+QUERY = "query SearchProducts { products { items { sku } } }"
+SELECTION = re.compile(r'(\w+): products\(\s*filter: \{store_code: \{eq: "(\w+)"\}, '
+                       r'category_id: \{eq: "(\d+)"\}\}\s*currentPage: (\d+)\s*pageSize: (\d+)')
+PROBE = re.compile(r'(\w+): products\(\s*filter: \{store_code: \{eq: "\w+"\}(?:, category_id: \{eq: "(\d+)"\})?\}')
+
+
+class StubCatalog:
+    """What the stub serves: `totals` items per category, at most `clamp` per page"""
+
+    def __init__(self, totals, clamp=None, reject_above=None, failing_aliases=(), missing_pages=()):
+        self.totals = totals
+        self.clamp = clamp
+        self.reject_above = reject_above
+        self.failing_aliases = set(failing_aliases)
+        # (category_id, page) answered once without products, as a flaky endpoint does
+        self.missing_pages = set(missing_pages)
+        self.store_total = sum(totals.values())
+        self.requests = []
+
+    def page(self, store_code, category_id, current_page, page_size):
+        self.requests.append((store_code, category_id, current_page, page_size))
+        if self.reject_above and page_size > self.reject_above:
+            return None
+        if (category_id, current_page) in self.missing_pages:
+            self.missing_pages.discard((category_id, current_page))
+            return None
+        served = min(page_size, self.clamp or page_size)
+        total = self.totals[category_id]
+        start = (current_page - 1) * served
+        items = [{'sku': f"{category_id}-{i}", 'item_title': f"Item {i}", 'retail_price': 1.99}
+                 for i in range(start, min(start + served, total))]
+        return {'items': items, 'total_count': total,
+                'pageInfo': {'currentPage': current_page, 'totalPages': -(-total // page_size)}}
+
+    def respond(self, body):
+        if body['operationName'] == 'ProbeStore':
+            return {'data': {alias: {'total_count': self.totals[category_id] if category_id else self.store_total}
+                             for alias, category_id in PROBE.findall(body['query'])}}
+        if body['operationName'] != 'BatchProducts':
+            v = body['variables']
+            return {'data': {'products': self.page(v['storeCode'], str(v['categoryId']),
+                                                   v['currentPage'], v['pageSize'])}}
+        data, errors = {}, []
+        for alias, store_code, category_id, current_page, page_size in SELECTION.findall(body['query']):
+            if alias in self.failing_aliases:
+                self.failing_aliases.discard(alias)
+                data[alias] = None
+                errors.append({'message': 'Internal server error', 'path': [alias]})
+            else:
+                data[alias] = self.page(store_code, category_id, int(current_page), int(page_size))
+        return {'data': data, 'errors': errors} if errors else {'data': data}
+
+
+@pytest.fixture
+def stub():
+    """(catalog, transport) served from a local thread; set catalog attributes per test"""
+    catalog = StubCatalog({'8': 70, '11': 20})
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            out = json.dumps(catalog.respond(body)).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield catalog, HttpTransport(f"http://127.0.0.1:{server.server_port}/api/graphql")
+    server.shutdown()
+    server.server_close()
+
+
+def skus(items):
+    return [item['sku'] for item in items]
+
+
+def test_page_size_ladder_starts_largest(stub):
+    catalog, transport = stub
+    sizer = PageSizer()
+    items, total_count, total_pages = asyncio.run(
+        fetch_category_items(transport, QUERY, '31', '8', TokenBucket(None), sizer))
+
+    assert skus(items) == [f"8-{i}" for i in range(70)]
+    assert (total_count, total_pages) == (70, 1)
+    assert sizer.size('31') == 100
+    assert len(catalog.requests) == 1
+
+
+def test_short_page_steps_down_the_ladder(stub):
+    catalog, transport = stub
+    catalog.clamp = 30
+    sizer = PageSizer()
+    items, total_count, total_pages = asyncio.run(
+        fetch_category_items(transport, QUERY, '31', '8', TokenBucket(None), sizer))
+
+    # 100 and 50 come back clamped to 30 items, so the pager restarts at 30
+    assert [size for _, _, page, size in catalog.requests if page == 1] == [100, 50, 30]
+    assert skus(items) == [f"8-{i}" for i in range(70)]
+    assert (total_count, total_pages) == (70, 3)
+    assert sizer.size('31') == 30
+
+
+def test_short_page_steps_down_only_that_store(stub):
+    catalog, transport = stub
+    catalog.clamp = 30
+    sizer = PageSizer()
+    asyncio.run(fetch_category_items(transport, QUERY, '31', '8', TokenBucket(None), sizer))
+    catalog.clamp = None
+    items, _, total_pages = asyncio.run(
+        fetch_category_items(transport, QUERY, '452', '8', TokenBucket(None), sizer))
+
+    assert (sizer.size('31'), sizer.size('452')) == (30, 100)
+    assert skus(items) == [f"8-{i}" for i in range(70)]
+    assert total_pages == 1
+
+
+def test_rejected_page_size_steps_down(stub):
+    catalog, transport = stub
+    catalog.reject_above = 50
+    sizer = PageSizer()
+    items, _, total_pages = asyncio.run(
+        fetch_category_items(transport, QUERY, '31', '8', TokenBucket(None), sizer))
+
+    assert skus(items) == [f"8-{i}" for i in range(70)]
+    assert total_pages == 2
+    assert sizer.size('31') == 50
+
+
+def test_later_page_without_products_is_retried(stub):
+    catalog, transport = stub
+    catalog.clamp = 30
+    catalog.missing_pages = {('8', 2)}
+    retry = Retrier(RetryPolicy(base_delay=0))
+    items, _, _ = asyncio.run(
+        fetch_category_items(transport, QUERY, '31', '8', TokenBucket(None), PageSizer(), retry=retry))
+
+    assert skus(items) == [f"8-{i}" for i in range(70)]
+    assert retry.retries == 1 and not retry.incomplete
+
+
+def test_split_batch_result_partial_errors():
+    selections = [('31', '8', 1), ('31', '11', 1)]
+    ok = {'items': [], 'total_count': 0}
+    result = {'data': {alias_for(*selections[0]): None, alias_for(*selections[1]): ok},
+              'errors': [{'message': 'boom', 'path': [alias_for(*selections[0])]}]}
+    assert split_batch_result(result, selections) == {selections[0]: None, selections[1]: ok}
+
+    # An error that can't be pinned on one alias fails the whole batch
+    result['errors'] = [{'message': 'boom'}]
+    assert split_batch_result(result, selections) == {selections[0]: None, selections[1]: None}
+    assert split_batch_result(None, selections) == {selections[0]: None, selections[1]: None}
+
+
+def test_failed_alias_is_retried_alone(stub):
+    catalog, transport = stub
+    catalog.failing_aliases = {alias_for('31', '8', 1)}
+    out = asyncio.run(fetch_store_items_batched(transport, QUERY, '31', ['8', '11'], TokenBucket(None),
+                                                PageSizer(), batch_size=8))
+
+    assert skus(out['8'][0]) == [f"8-{i}" for i in range(70)]
+    assert skus(out['11'][0]) == [f"11-{i}" for i in range(20)]
+    # The failed alias was served once more, on its own
+    assert not catalog.failing_aliases
+    assert catalog.requests == [('31', '11', 1, 100), ('31', '8', 1, 100)]
+
+
+def test_failed_later_alias_goes_through_retry(stub):
+    catalog, transport = stub
+    catalog.totals['8'] = 250
+    # Missing in the batch, and once more when asked for on its own
+    catalog.failing_aliases = {alias_for('31', '8', 2)}
+    catalog.missing_pages = {('8', 2)}
+    retry = Retrier(RetryPolicy(base_delay=0))
+    out = asyncio.run(fetch_store_items_batched(transport, QUERY, '31', ['8', '11'], TokenBucket(None),
+                                                PageSizer(), batch_size=8, retry=retry))
+
+    assert skus(out['8'][0]) == [f"8-{i}" for i in range(250)]
+    assert retry.retries == 1 and not retry.incomplete
+
+
+def test_probe_reads_store_total_once(stub):
+    catalog, transport = stub
+    # Bakery (11) is part of Food (8), so the store total is not their sum
+    catalog.store_total = 70
+    counts = asyncio.run(probe_store(transport, '31', ['8', '11', STORE_TOTAL], TokenBucket(None),
+                                     batch_size=8, journal=None))
+
+    assert counts == {'8': 70, '11': 20, STORE_TOTAL: 70}
+
+
+def test_journal_resume_reuses_fetched_pages(stub, tmp_path):
+    catalog, transport = stub
+    catalog.clamp = 30
+    path = str(tmp_path / 'checkpoints' / 'run.jsonl')
+
+    journal = CheckpointJournal(path)
+    assert journal.store_timestamp('31', '2025-11-01 02:00:00') == '2025-11-01 02:00:00'
+    first, _, _ = asyncio.run(fetch_category_items(transport, QUERY, '31', '8', TokenBucket(None),
+                                                   PageSizer(), journal))
+    journal.close()
+    fetched = len(catalog.requests)
+
+    journal = CheckpointJournal(path, resume=True)
+    assert journal.store_timestamp('31', '2025-11-03 09:00:00') == '2025-11-01 02:00:00'
+    assert journal.page('31', '8', 1)['page_size'] == 30
+    again, _, _ = asyncio.run(fetch_category_items(transport, QUERY, '31', '8', TokenBucket(None),
+                                                   PageSizer(), journal))
+    journal.close()
+
+    assert again == first
+    assert len(catalog.requests) == fetched
+
+    # Without resume the journal starts over
+    journal = CheckpointJournal(path)
+    assert journal.page('31', '8', 1) is None
+    journal.close()
+
+
+def test_merge_once_truncates_a_partial_append(tmp_path):
+    target = tmp_path / 'history.csv'
+    target.write_text("sku\nold\n")
+    path = str(tmp_path / 'run.jsonl')
+
+    journal = CheckpointJournal(path)
+    with pytest.raises(RuntimeError):
+        def crash():
+            with open(target, 'a') as f:
+                f.write("new\nhalf")
+            raise RuntimeError("killed mid-append")
+        journal.merge_once(str(target), crash)
+    journal.close()
+
+    journal = CheckpointJournal(path, resume=True)
+    assert journal.merge_once(str(target), lambda: target.open('a').write("new\n"))
+    journal.close()
+    assert target.read_text() == "sku\nold\nnew\n"
+
+    journal = CheckpointJournal(path, resume=True)
+    assert journal.merged
+    assert not journal.merge_once(str(target), lambda: target.open('a').write("again\n"))
+    journal.close()
+    assert target.read_text() == "sku\nold\nnew\n"
+
+
+def test_streaming_writer_count_sidecar(tmp_path):
+    path = str(tmp_path / 'out' / 'snapshot.csv')
+    row = {'sku': '1', 'retail_price': '1.99', 'store_code': '31'}
+    with StreamingCSVWriter(path) as sink:
+        assert os.path.exists(path + '.tmp') and not os.path.exists(path)
+        assert len(sink.write_rows([row, dict(row, retail_price='2.49'), dict(row, sku='2')])) == 2
+        sink.end_store('31')
+        sink.write_rows([row])
+
+    assert not os.path.exists(path + '.tmp')
+    with open(path, newline='', encoding='utf-8') as f:
+        assert len(list(csv.DictReader(f))) == 3
+    assert read_row_count(path) == 3
+
+    target = str(tmp_path / 'history.csv')
+    assert append_csv(path, target) == 3
+    assert append_csv(path, target) == 6
+    with open(count_path(target)) as f:
+        assert f.read() == "6\n"
+
+
+def test_streaming_writer_discards_failed_run(tmp_path):
+    path = str(tmp_path / 'snapshot.csv')
+    with pytest.raises(RuntimeError):
+        with StreamingCSVWriter(path) as sink:
+            sink.write_rows([{'sku': '1', 'store_code': '31'}])
+            raise RuntimeError("scrape failed")
+    assert os.listdir(tmp_path) == []
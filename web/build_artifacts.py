@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Incremental builder for the web JSON artifacts
+Keeps per-month aggregate state (price counts, cached medians and titles per
+SKU/store) in artifact_state/, one set of files per month:
+
+    artifact_state/counts-2025-10.csv    price counts per (sku, store_code)
+    artifact_state/medians-2025-10.csv   median per (sku, store_code), plus store 'all'
+    artifact_state/items-2025-10.csv     first title, availability and unit per SKU
+    artifact_state/unit-counts-2025-10.csv   the same counts for price per unit
+    artifact_state/unit-medians-2025-10.csv  median price per unit per (sku, store_code)
+    artifact_state/sources.json          snapshots already folded in
+
+A monthly update reads only the new snapshot, rewrites the state files of
+the month(s) it touches, then renders the artifacts from the cached medians
+and rewrites only the ones whose content changed:
+
+    featured_items_FULL.json   every month, SKUs seen at all four site stores;
+                               items with a known size also carry a per_unit
+                               series (price per oz / fl oz / each, see
+                               unit_prices.py) next to the shelf prices
+    featured_items_FULL.bin    the same prices (and prices per unit) packed as
+                               integers, see price_pack.py
+    featured_items.json        the same for the last 6 months
+    dropdown_items.json        SKU/title list for the item picker, with each
+                               store's latest price
+    dropdown_index.json        search index over those titles (and the same
+                               latest prices), see search_index.py
+    price_data.json            SKUs in the latest month, all-store medians
+    basket_essentials.json     same rules as create_basket_essentials.py, over
+                               the latest 12 calendar months
+    data/manifest.json         months, stores and which shard holds each SKU
+    data/items-NN.bin          featured_items_FULL.json's items, split into
+                               shards by a hash of the SKU so the site can
+                               fetch only the items it shows; each shard is
+                               a price pack like featured_items_FULL.bin
+
+Usage:
+    python3 build_artifacts.py rebuild traderjoes-dump-3.csv    # one-time, from the full dump
+    python3 build_artifacts.py update ../backend/scripts/backups/traderjoes_snapshot_2025-11-01.csv
+    python3 build_artifacts.py render                           # re-render from the state only
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import zlib
+
+import pandas as pd
+
+from price_aggregates import DUMP_COLUMNS, KEYS, PriceCounts, month_labels, read_dump_chunks
+from price_pack import pack
+from search_index import SearchIndex
+from title_classifier import TitleClassifier
+from unit_prices import UNIT_PRICE_DECIMALS, normalize
+
+STATE_DIR = "artifact_state"
+
+# Store codes used by the site (basket order; the featured files list them by code)
+STORE_MAP = {
+    '452': 'austin',
+    '701': 'chicago',
+    '546': 'newyork',
+    '31': 'la'
+}
+
+# Pseudo store code for medians over every store's rows
+ALL_STORES = 'all'
+
+FEATURED_MONTHS = 6
+BASKET_MONTHS = 12
+
+# Unit columns, folded in when a CSV has them
+SIZE_COLUMNS = ['sales_size', 'sales_uom_description']
+
+# Lazily loaded item shards; a SKU always lands in the same shard
+SHARD_DIR = "data"
+SHARD_COUNT = 32
+
+
+def clean_titles(titles):
+    """Remove the image-carousel suffixes the site sometimes appends to titles"""
+    return (titles.str.replace(' 2 of 8 assets', '', regex=False)
+            .str.replace(' 1 of 8 assets', '', regex=False).str.strip())
+
+
+def normalize_skus(skus):
+    # Scraper output keeps leading zeros; the artifacts never had them
+    return skus.str.strip().str.lstrip('0').replace('', '0')
+
+
+def nest_prices(monthly):
+    """{sku: {store_code: {month: price}}} from a Series indexed by (sku, store_code, month)"""
+    prices = {}
+    for (sku, store_code, month), price in monthly.items():
+        prices.setdefault(sku, {}).setdefault(store_code, {})[month] = price
+    return prices
+
+
+def basket_items(monthly, titles, skus, months, store_map, min_months=6, min_stores=3):
+    """'items' of basket_essentials.json
+
+    `monthly` holds rounded median prices indexed by (sku, store_code,
+    month). A store needs prices for `min_months` of `months`, an item
+    needs `min_stores` such stores. Items come out in `skus` order and
+    stores in `store_map` order.
+    """
+    monthly = monthly[monthly.index.get_level_values('month').isin(months)
+                      & monthly.index.get_level_values('store_code').isin(list(store_map))]
+
+    # Only keep stores with enough months of data...
+    months_per_store = monthly.groupby(level=['sku', 'store_code']).transform('size')
+    monthly = monthly[months_per_store >= min_months]
+    # ...and items with data for enough such stores
+    store_keys = monthly.index.droplevel('month').unique()
+    stores_per_item = pd.Series(1, index=store_keys).groupby(level='sku').size()
+    monthly = monthly[monthly.index.get_level_values('sku').isin(
+        stores_per_item[stores_per_item >= min_stores].index)]
+
+    prices = nest_prices(monthly)
+    items = {}
+    for sku in skus:
+        if sku not in prices:
+            continue
+        items[str(sku)] = {
+            'title': titles[sku],
+            'stores': {
+                store_name: {month: prices[sku][store_code][month]
+                             for month in months if month in prices[sku][store_code]}
+                for store_code, store_name in store_map.items() if store_code in prices[sku]
+            }
+        }
+    return items
+
+
+def write_if_changed(path, text):
+    """Atomically write `text` (str or bytes) unless `path` already holds exactly that; True if written"""
+    data = text.encode('utf-8') if isinstance(text, str) else text
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+class ArtifactState:
+    """Per-month aggregates the artifacts are rendered from"""
+
+    def __init__(self, root=STATE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.sources_path = os.path.join(root, 'sources.json')
+        try:
+            with open(self.sources_path, 'r') as f:
+                self.sources = json.load(f)
+        except OSError:
+            self.sources = {}
+
+    def _path(self, kind, month):
+        return os.path.join(self.root, f"{kind}-{month}.csv")
+
+    def months(self):
+        found = []
+        for path in glob.glob(os.path.join(self.root, 'medians-*.csv')):
+            match = re.match(r'medians-(\d{4}-\d{2})\.csv$', os.path.basename(path))
+            if match:
+                found.append(match.group(1))
+        return sorted(found)
+
+    def load_counts(self, month, kind='counts'):
+        path = self._path(kind, month)
+        if not os.path.exists(path):
+            return PriceCounts()
+        frame = pd.read_csv(path, dtype={'sku': str, 'store_code': str, 'month': str},
+                            float_precision='round_trip')
+        return PriceCounts(frame.set_index(KEYS + ['retail_price'])['count'])
+
+    def load_medians(self, month):
+        frame = pd.read_csv(self._path('medians', month), dtype={'sku': str, 'store_code': str},
+                            float_precision='round_trip')
+        frame['month'] = month
+        return frame.set_index(KEYS)['retail_price']
+
+    def medians(self, months=None):
+        """Cached medians of `months` (default: all) indexed by (sku, store_code, month)"""
+        months = self.months() if months is None else months
+        return pd.concat([self.load_medians(month) for month in months])
+
+    def unit_medians(self, months=None):
+        """Cached medians of price per unit, like medians(); months without sizes are skipped"""
+        months = self.months() if months is None else months
+        frames = []
+        for month in months:
+            path = self._path('unit-medians', month)
+            if os.path.exists(path):
+                frame = pd.read_csv(path, dtype={'sku': str, 'store_code': str}, float_precision='round_trip')
+                frame['month'] = month
+                frames.append(frame.set_index(KEYS)['retail_price'])
+        if not frames:
+            return pd.Series([], index=pd.MultiIndex.from_arrays([[], [], []], names=KEYS), dtype='float64')
+        return pd.concat(frames)
+
+    def load_items(self, month):
+        path = self._path('items', month)
+        if not os.path.exists(path):
+            return pd.DataFrame({'item_title': pd.Series(dtype=object), 'available': pd.Series(dtype=bool),
+                                 'unit': pd.Series(dtype=object)},
+                                index=pd.Index([], name='sku', dtype=object))
+        items = pd.read_csv(path, dtype={'sku': str, 'item_title': str, 'unit': str}).set_index('sku')
+        if 'unit' not in items:
+            # State written before units were tracked
+            items['unit'] = pd.Series(pd.NA, index=items.index, dtype=object)
+        return items
+
+    def _write_csv(self, frame, kind, month):
+        path = self._path(kind, month)
+        frame.to_csv(path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def save_month(self, month, counts, items, unit_counts=None):
+        """Replace one month's counts, items and cached medians (and their per-unit twins)"""
+        all_stores = counts.counts.reset_index()
+        all_stores['store_code'] = ALL_STORES
+        all_stores = all_stores.groupby(KEYS + ['retail_price'])['count'].sum()
+        medians = pd.concat([counts.medians(), PriceCounts(all_stores).medians()])
+        self._write_csv(counts.counts, 'counts', month)
+        self._write_csv(items, 'items', month)
+        if unit_counts is not None and len(unit_counts):
+            self._write_csv(unit_counts.counts, 'unit-counts', month)
+            self._write_csv(unit_counts.medians().droplevel('month'), 'unit-medians', month)
+        # Medians last: their presence is what marks the month as complete
+        self._write_csv(medians.droplevel('month'), 'medians', month)
+
+    def ingest(self, path):
+        """Fold a CSV in the scrapers' schema into the state; returns the months touched
+
+        A file already ingested (by base name) is skipped, so re-running an
+        update never counts a snapshot twice.
+        """
+        name = os.path.basename(path)
+        if name in self.sources:
+            print(f"  {name} already ingested, skipping")
+            return []
+
+        header = pd.read_csv(path, nrows=0).columns
+        sized = all(column in header for column in SIZE_COLUMNS)
+        columns = DUMP_COLUMNS + ['availability'] + (SIZE_COLUMNS if sized else [])
+
+        counts = {}
+        unit_counts = {}
+        items = {}
+        for chunk in read_dump_chunks(path, columns=columns):
+            chunk['sku'] = normalize_skus(chunk['sku'])
+            chunk['month'] = month_labels(chunk['inserted_at'])
+            chunk['available'] = chunk['availability'].fillna('').str.strip() == '1'
+            if sized:
+                quantity, chunk['unit'] = normalize(chunk['sales_size'], chunk['sales_uom_description'])
+                chunk['unit_price'] = (chunk['retail_price'].to_numpy() / quantity).round(UNIT_PRICE_DECIMALS)
+            else:
+                chunk['unit'] = None
+            for month, rows in chunk.groupby('month', sort=False):
+                counts.setdefault(month, PriceCounts()).add(rows)
+                firsts = rows.groupby('sku', sort=False).agg(
+                    item_title=('item_title', 'first'), available=('available', 'any'), unit=('unit', 'first'))
+                items[month] = _merge_items(items.get(month), firsts)
+                if sized:
+                    # Rows in another unit than the SKU's first one that month would not compare
+                    same_unit = rows['unit'] == rows['sku'].map(firsts['unit'])
+                    unit_rows = rows.loc[same_unit, KEYS + ['unit_price']].rename(
+                        columns={'unit_price': 'retail_price'})
+                    unit_counts.setdefault(month, PriceCounts()).add(unit_rows)
+
+        for month in sorted(counts):
+            # Earlier data for the month (e.g. an earlier snapshot) comes first
+            merged = self.load_counts(month).merge(counts[month])
+            merged_units = self.load_counts(month, 'unit-counts').merge(unit_counts.get(month, PriceCounts()))
+            self.save_month(month, merged, _merge_items(self.load_items(month), items[month]), merged_units)
+
+        self.sources[name] = sorted(counts)
+        with open(self.sources_path + '.tmp', 'w') as f:
+            json.dump(self.sources, f, indent=2)
+        os.replace(self.sources_path + '.tmp', self.sources_path)
+        return sorted(counts)
+
+    def reset(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.__init__(self.root)
+
+
+def _merge_items(earlier, later):
+    if earlier is None or len(earlier) == 0:
+        return later
+    combined = pd.concat([earlier, later])
+    return combined.groupby(level='sku', sort=False).agg(item_title=('item_title', 'first'),
+                                                          available=('available', 'any'),
+                                                          unit=('unit', 'first'))
+
+
+def shard_of(sku):
+    return zlib.crc32(sku.encode('utf-8')) % SHARD_COUNT
+
+
+def shard_items(full, featured_months):
+    """{file name: text or bytes} for the manifest and the packed item shards of featured_items_FULL.json"""
+    shards = {}
+    for sku, item in full['items'].items():
+        shards.setdefault(shard_of(sku), {})[sku] = item
+    names = {n: f"items-{n:02d}.bin" for n in sorted(shards)}
+    manifest = {
+        'months': full['months'],
+        'featured_months': featured_months,
+        'stores': [STORE_MAP[code] for code in sorted(STORE_MAP)],
+        'shards': [names[n] for n in sorted(shards)],
+        'items': {sku: sorted(shards).index(shard_of(sku)) for sku in full['items']},
+    }
+    out = {f"{SHARD_DIR}/manifest.json": json.dumps(manifest)}
+    for n, items in shards.items():
+        out[f"{SHARD_DIR}/{names[n]}"] = pack({'months': full['months'], 'items': items})
+    return out
+
+
+def render(state):
+    """All artifacts as {file name: text}; binary ones as bytes"""
+    months = state.months()
+    if not months:
+        return {}
+    medians = state.medians(months).round(2)
+    items = {month: state.load_items(month) for month in months}
+
+    store_level = medians.index.get_level_values('store_code')
+    tracked = medians[store_level.isin(list(STORE_MAP))].sort_index()
+    all_stores = medians[store_level == ALL_STORES]
+
+    # Latest title per SKU for display
+    titles = pd.concat([items[month]['item_title'] for month in months])
+    latest_titles = clean_titles(titles.groupby(level='sku').last())
+
+    # Price per unit, kept only for months sold in the SKU's latest unit
+    month_units = pd.concat({month: items[month]['unit'] for month in months}, names=['month', 'sku'])
+    latest_units = month_units.dropna().groupby(level='sku').last()
+    unit_medians = state.unit_medians(months).round(UNIT_PRICE_DECIMALS)
+    unit_keys = unit_medians.index.droplevel('store_code')
+    unit_medians = unit_medians[
+        (month_units.reindex(unit_keys.swaplevel()).to_numpy()
+         == latest_units.reindex(unit_keys.get_level_values('sku')).to_numpy())
+        & unit_medians.index.get_level_values('store_code').isin(list(STORE_MAP))]
+
+    artifacts = {}
+
+    # SKUs seen at every site store at some point
+    pairs = tracked.index.droplevel('month').unique()
+    stores_per_sku = pd.Series(1, index=pairs).groupby(level='sku').size()
+    full_skus = sorted(stores_per_sku[stores_per_sku == len(STORE_MAP)].index)
+    prices = nest_prices(tracked[tracked.index.get_level_values('sku').isin(full_skus)])
+    unit_prices = nest_prices(unit_medians[unit_medians.index.get_level_values('sku').isin(full_skus)])
+    store_order = sorted(STORE_MAP)
+
+    def by_store(nested, window):
+        stores = {}
+        for store_code in store_order:
+            series = {month: price for month, price in nested.get(store_code, {}).items() if month in window}
+            if series:
+                stores[STORE_MAP[store_code]] = series
+        return stores
+
+    def featured(window):
+        out = {}
+        for sku in full_skus:
+            stores = by_store(prices[sku], window)
+            if stores:
+                out[sku] = {'title': latest_titles[sku], 'stores': stores}
+                per_unit = by_store(unit_prices.get(sku, {}), window)
+                if per_unit:
+                    out[sku]['per_unit'] = {'unit': latest_units[sku], 'stores': per_unit}
+        return {'months': window, 'items': out}
+
+    full = featured(months)
+    artifacts['featured_items_FULL.json'] = json.dumps(full)
+    artifacts['featured_items_FULL.bin'] = pack(full)
+    artifacts['featured_items.json'] = json.dumps(featured(months[-FEATURED_MONTHS:]))
+    # Each store's latest price rides along so suggestions can show it before any shard loads
+    dropdown = [{'sku': sku, 'title': item['title'],
+                 'latest': {store: series[max(series)] for store, series in item['stores'].items()}}
+                for sku, item in full['items'].items()]
+    artifacts['dropdown_items.json'] = json.dumps(dropdown)
+    artifacts['dropdown_index.json'] = SearchIndex.build(dropdown).to_json()
+    artifacts.update(shard_items(full, months[-FEATURED_MONTHS:]))
+
+    # Everything on sale in the latest month, at its all-store median that month
+    latest = items[months[-1]]
+    all_prices = nest_prices(all_stores[all_stores.index.get_level_values('month') == months[-1]])
+    price_data = {}
+    for sku in sorted(latest.index):
+        price_data[sku] = {
+            'name': latest_titles[sku],
+            'prices': all_prices.get(sku, {}).get(ALL_STORES, {}),
+            'available': bool(latest.at[sku, 'available'])
+        }
+    artifacts['price_data.json'] = json.dumps(price_data)
+
+    # Basket essentials: essential SKUs seen at all four stores, last 12 calendar months
+    classifier = TitleClassifier()
+    essential = {}
+    for month in months:
+        month_titles = items[month]['item_title']
+        essential[month] = set(month_titles.index[classifier.categories(month_titles).notna()])
+    essential = pd.concat([pd.DataFrame({'sku': list(skus), 'month': month}) for month, skus in essential.items()])
+    keys = tracked.index.to_frame(index=False).merge(essential, on=['sku', 'month'])
+    stores_per_essential = keys.drop_duplicates(['sku', 'store_code']).groupby('sku').size()
+    basket_skus = sorted(stores_per_essential[stores_per_essential == len(STORE_MAP)].index)
+
+    start = str(pd.Period(months[-1], 'M') - (BASKET_MONTHS - 1))
+    basket_months = [month for month in months if month >= start]
+    first_titles = pd.concat([items[month]['item_title'] for month in basket_months])
+    first_titles = clean_titles(first_titles.groupby(level='sku', sort=False).first())
+    basket_prices = tracked[tracked.index.get_level_values('sku').isin(basket_skus)]
+    basket = {
+        'months': basket_months,
+        'items': basket_items(basket_prices, first_titles,
+                              [sku for sku in basket_skus if sku in first_titles.index],
+                              basket_months, STORE_MAP)
+    }
+    artifacts['basket_essentials.json'] = json.dumps(basket, indent=2)
+
+    return artifacts
+
+
+def publish(state, out_dir='.'):
+    """Render and write the artifacts that changed; returns the names written"""
+    artifacts = render(state)
+    written = []
+    for name, text in artifacts.items():
+        path = os.path.join(out_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if write_if_changed(path, text):
+            written.append(name)
+            print(f"  ✓ {name} updated")
+    print(f"    {len(artifacts) - len(written)} artifact(s) unchanged")
+
+    # Shards that no longer exist (including JSON shards from before they were packed)
+    for path in glob.glob(os.path.join(out_dir, SHARD_DIR, 'items-*.*')):
+        if f"{SHARD_DIR}/{os.path.basename(path)}" not in artifacts:
+            os.remove(path)
+            print(f"  ✓ {SHARD_DIR}/{os.path.basename(path)} removed")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--state', default=STATE_DIR, help=f'aggregate state directory (default: {STATE_DIR})')
+    parser.add_argument('--out', default='.', help='where the artifacts live (default: current directory)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    rebuild = sub.add_parser('rebuild', help='start the state over from full CSV dumps')
+    rebuild.add_argument('csv', nargs='+')
+    update = sub.add_parser('update', help='fold new snapshot CSVs in and republish')
+    update.add_argument('csv', nargs='+')
+    sub.add_parser('render', help='republish from the current state')
+
+    args = parser.parse_args()
+    state = ArtifactState(args.state)
+
+    if args.command == 'rebuild':
+        state.reset()
+    if args.command in ('rebuild', 'update'):
+        for path in args.csv:
+            print(f"Ingesting {path}...", flush=True)
+            months = state.ingest(path)
+            if months:
+                print(f"  ✓ months: {', '.join(months)}")
+
+    print("Publishing artifacts...")
+    written = publish(state, args.out)
+    print(f"{len(written)} artifact(s) rewritten")
+
+
+if __name__ == "__main__":
+    main()
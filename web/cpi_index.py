@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+CPI index engine
+Prices the curated basket in cpi_basket_essentials.json (category weights
+and item quantities) against the monthly medians kept by build_artifacts.py
+and writes the resulting indexes (base month = 100) back into the file's
+"index" block, per store and nationally (medians over every store's rows):
+
+  laspeyres  fixed base-month basket
+  paasche    current-month basket; no quantities are scraped, so they are
+             implied by holding the base-month expenditure shares fixed
+  fisher     geometric mean of the two
+  chained    month-to-month links (share-weighted price relatives) over
+             items priced in both months, so items may come and go
+
+Everything is computed on a dense (sku x store x month) price array,
+item-major and C-contiguous: gap filling runs along the contiguous month
+axis and the per-store sums stream through the array once.
+
+Usage:
+    python3 cpi_index.py
+    python3 cpi_index.py --base 2025-01 --impute linear --weights equal
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from build_artifacts import ALL_STORES, STATE_DIR, STORE_MAP, ArtifactState, write_if_changed
+
+BASKET_FILE = "cpi_basket_essentials.json"
+
+IMPUTATIONS = ('carry', 'linear', 'none')
+WEIGHTINGS = ('category', 'quantity', 'equal')
+METHODS = ('laspeyres', 'paasche', 'fisher', 'chained')
+
+
+def price_tensor(medians, skus, stores, months):
+    """(sku x store x month) float array from medians indexed by (sku, store_code, month); NaN = no price"""
+    prices = np.full((len(skus), len(stores), len(months)), np.nan)
+    index = medians.index
+    i = pd.Index(skus).get_indexer(index.get_level_values('sku'))
+    j = pd.Index(stores).get_indexer(index.get_level_values('store_code'))
+    k = pd.Index(months).get_indexer(index.get_level_values('month'))
+    keep = (i >= 0) & (j >= 0) & (k >= 0)
+    prices[i[keep], j[keep], k[keep]] = medians.to_numpy()[keep]
+    return prices
+
+
+# Rows (sku x store pairs) per block when filling gaps: a block's months stay in cache
+# while each of its months is filled from the one before
+CARRY_BLOCK = 8192
+
+
+def _carry(prices, forward=True, backward=False):
+    """Copy of `prices` with gaps filled from the nearest earlier month (forward), then later one (backward)"""
+    filled = prices.copy()
+    rows = filled.reshape(-1, filled.shape[-1])
+    months = list(range(rows.shape[1]))
+    orders = ([months] if forward else []) + ([months[::-1]] if backward else [])
+    for start in range(0, len(rows), CARRY_BLOCK):
+        block = rows[start:start + CARRY_BLOCK]
+        for order in orders:
+            previous = block[:, order[0]]
+            for t in order[1:]:
+                current = block[:, t]
+                np.copyto(current, previous, where=np.isnan(current))
+                previous = current
+    return filled
+
+
+def impute(prices, method='carry'):
+    """Fill missing months along the last axis
+
+    carry:  last known price carried forward (the first known one backwards)
+    linear: straight line between known prices, carried flat at the ends
+    none:   leave gaps; each index then uses only the items priced
+    """
+    months = prices.shape[-1]
+    if method == 'none':
+        return prices
+    if method == 'carry':
+        return _carry(prices, backward=True)
+    if method == 'linear':
+        known = ~np.isnan(prices)
+        when = np.where(known, np.arange(months, dtype=float), np.nan)
+        before, after = _carry(prices), _carry(prices, forward=False, backward=True)
+        t_before, t_after = _carry(when), _carry(when, forward=False, backward=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = (np.arange(months) - t_before) / (t_after - t_before)
+        filled = np.where(known, prices, before + frac * (after - before))
+        filled = np.where(np.isnan(before), after, filled)
+        return np.where(np.isnan(after), before, filled)
+    raise ValueError(f"unknown imputation {method!r} (expected one of {IMPUTATIONS})")
+
+
+def basket_quantities(base_prices, quantities, categories, category_weights, scheme='category'):
+    """Fixed (sku x store) quantities for the basket
+
+    category: each category gets its CPI weight, split over its items by
+              base-month spending (price x quantity)
+    quantity: the basket's quantities as they are
+    equal:    every item gets the same base-month spending
+    `categories` and `category_weights` hold each SKU's category and its
+    weight. Items without a base-month price get NaN and drop out of
+    fixed-basket indexes.
+    """
+    quantities = np.asarray(quantities, dtype=float)[:, None]
+    if scheme == 'quantity':
+        return np.where(np.isnan(base_prices), np.nan, quantities)
+    if scheme == 'equal':
+        return 1.0 / base_prices
+    if scheme == 'category':
+        weights = np.asarray(category_weights, dtype=float)
+        spend = base_prices * quantities
+        _, category = np.unique(np.asarray(categories), return_inverse=True)
+        totals = np.zeros((category.max() + 1, base_prices.shape[1]))
+        np.add.at(totals, category, np.nan_to_num(spend))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            share = weights[:, None] * spend / totals[category]
+        return share / base_prices
+    raise ValueError(f"unknown weighting {scheme!r} (expected one of {WEIGHTINGS})")
+
+
+class _Prices:
+    """Zero-filled prices, their 'priced' mask and reciprocals, computed once for all methods
+
+    Full-size arrays are few (each one is a pass over memory): reciprocals
+    are zero where there is no price, so products of them with `values`
+    already drop unpriced items without a mask. After carry or linear
+    imputation an item is priced in every month or in none, and the
+    masked sums reduce to plain sums over the base month.
+    """
+
+    def __init__(self, prices, quantities, base):
+        self.valid = ~np.isnan(prices)
+        self.values = np.where(self.valid, prices, 0.0)
+        self.inverse = np.divide(1.0, self.values, out=np.zeros(self.values.shape), where=self.valid)
+        self.base = base
+        base_valid = self.valid[..., base] & ~np.isnan(quantities)
+        # Base-basket quantities, zero for items that can't be in it
+        self.q = np.where(base_valid, quantities, 0.0)
+        self.base_spend = self.values[..., base] * self.q
+        self.dense = bool((self.valid == self.valid[..., :1]).all())
+        # Base-month spending on the items priced each month, shared by laspeyres and paasche
+        self.priced_spend = self.masked_spend(self.valid)
+
+    def weigh(self, array, weights):
+        """sum over SKUs of array x weights -> (store x month)"""
+        return np.einsum('ijt,ij->jt', array, weights, optimize=True)
+
+    def masked_spend(self, *masks):
+        """Base-month spending on the items priced where every mask holds -> (store x month)"""
+        months = masks[0].shape[-1]
+        if self.dense:
+            return np.repeat(self.base_spend.sum(axis=0)[:, None], months, axis=1)
+        subscripts = ','.join(['ijt'] * len(masks)) + ',ij->jt'
+        return np.einsum(subscripts, *masks, self.base_spend)
+
+
+def _ratio(num, den):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(den > 0, num / den, np.nan)
+
+
+def laspeyres(prices, quantities, base, _p=None):
+    """sum(p_t q_0) / sum(p_0 q_0) per store and month, over items priced in both"""
+    p = _p or _Prices(prices, quantities, base)
+    return _ratio(p.weigh(p.values, p.q), p.priced_spend)
+
+
+def paasche(prices, quantities, base, _p=None):
+    """Paasche with base-month expenditure shares held fixed (a weighted harmonic mean of relatives)"""
+    p = _p or _Prices(prices, quantities, base)
+    return _ratio(p.priced_spend, p.weigh(p.inverse, p.base_spend * p.values[..., p.base]))
+
+
+def fisher(laspeyres_index, paasche_index):
+    return np.sqrt(laspeyres_index * paasche_index)
+
+
+def chained(prices, quantities, base, _p=None):
+    """Month-to-month links multiplied out and rebased to `base`
+
+    Each link is the base-month expenditure-share weighted mean of the
+    items' price relatives to the previous month, over items priced in
+    both months.
+    """
+    p = _p or _Prices(prices, quantities, base)
+    # values[t] * inverse[t - 1] is the relative where both months are priced, else 0
+    links = _ratio(np.einsum('ijt,ijt,ij->jt', p.values[..., 1:], p.inverse[..., :-1], p.base_spend),
+                   p.masked_spend(p.valid[..., 1:], p.valid[..., :-1]))
+    level = np.concatenate([np.ones((prices.shape[1], 1)), np.cumprod(links, axis=-1)], axis=-1)
+    return level / level[:, base:base + 1]
+
+
+def compute_indexes(prices, quantities, base):
+    """{method: (store x month) array} for every method"""
+    p = _Prices(prices, quantities, base)
+    las = laspeyres(prices, quantities, base, p)
+    paa = paasche(prices, quantities, base, p)
+    return {
+        'laspeyres': las,
+        'paasche': paa,
+        'fisher': fisher(las, paa),
+        'chained': chained(prices, quantities, base, p),
+    }
+
+
+def basket_entries(basket):
+    """[(sku, category_name, quantity, category_weight)] in file order"""
+    items = []
+    for category_name, category in basket['categories'].items():
+        for sku, item in category['items'].items():
+            items.append((sku, category_name, item.get('quantity', 1), category['weight']))
+    return items
+
+
+def _series(values):
+    return [None if np.isnan(v) else round(float(v) * 100, 2) for v in values]
+
+
+def build_index(basket, medians, base_month=None, imputation='carry', weighting='category'):
+    """The "index" block for the basket from medians indexed by (sku, store_code, month)"""
+    items = basket_entries(basket)
+    skus = [sku for sku, _, _, _ in items]
+    months = sorted(medians.index.get_level_values('month').unique())
+    stores = sorted(s for s in medians.index.get_level_values('store_code').unique() if s != ALL_STORES)
+    base_month = base_month or months[0]
+    if base_month not in months:
+        raise ValueError(f"base month {base_month} has no data (have {months[0]} to {months[-1]})")
+    base = months.index(base_month)
+
+    prices = impute(price_tensor(medians, skus, stores + [ALL_STORES], months), imputation)
+    quantities = basket_quantities(prices[:, :, base], [q for _, _, q, _ in items],
+                                   [c for _, c, _, _ in items], [w for _, _, _, w in items], weighting)
+    indexes = compute_indexes(prices, quantities, base)
+
+    def block(j):
+        out = {method: _series(indexes[method][j]) for method in METHODS}
+        out['items_priced'] = int((~np.isnan(prices[:, j, base])).sum())
+        return out
+
+    return {
+        'base_month': base_month,
+        'months': months,
+        'imputation': imputation,
+        'weights': weighting,
+        'national': block(len(stores)),
+        'stores': {STORE_MAP.get(store_code, store_code): block(j) for j, store_code in enumerate(stores)},
+    }
+
+
+def _is_series(value):
+    # Number series and month/store label lists, as opposed to lists of sentences
+    return isinstance(value, list) and all(
+        v is None or isinstance(v, (int, float)) or (isinstance(v, str) and len(v) < 16) for v in value)
+
+
+def format_basket(value, indent=0, inline=False):
+    """JSON in the file's layout: basket items and series on one line, the rest indented"""
+    if inline or not isinstance(value, (dict, list)) or _is_series(value):
+        return json.dumps(value, ensure_ascii=False)
+    pad = ' ' * (indent + 2)
+    if isinstance(value, list):
+        lines = [pad + format_basket(v, indent + 2) for v in value]
+        return "[\n" + ",\n".join(lines) + "\n" + ' ' * indent + "]"
+    lines = []
+    for key, v in value.items():
+        if isinstance(v, dict) and key == 'items':
+            # One basket item per line
+            inner = [f"{pad}  {json.dumps(sku, ensure_ascii=False)}: {format_basket(item, inline=True)}"
+                     for sku, item in v.items()]
+            lines.append(f"{pad}\"items\": {{\n" + ",\n".join(inner) + f"\n{pad}}}")
+        else:
+            lines.append(f"{pad}{json.dumps(key, ensure_ascii=False)}: {format_basket(v, indent + 2)}")
+    return "{\n" + ",\n".join(lines) + "\n" + ' ' * indent + "}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--basket', default=BASKET_FILE, help=f'basket definition to update (default: {BASKET_FILE})')
+    parser.add_argument('--state', default=STATE_DIR, help=f'build_artifacts.py state (default: {STATE_DIR})')
+    parser.add_argument('--base', help='base month YYYY-MM (default: earliest month)')
+    parser.add_argument('--impute', choices=IMPUTATIONS, default='carry',
+                        help='how missing months are filled (default: carry)')
+    parser.add_argument('--weights', choices=WEIGHTINGS, default='category',
+                        help='category: CPI category weights; quantity: basket quantities; '
+                             'equal: equal spending per item (default: category)')
+    args = parser.parse_args()
+
+    with open(args.basket, 'r', encoding='utf-8') as f:
+        basket = json.load(f)
+    state = ArtifactState(args.state)
+    if not state.months():
+        print(f"No aggregate state in {args.state}/; run build_artifacts.py first", file=sys.stderr)
+        sys.exit(1)
+
+    basket['index'] = build_index(basket, state.medians(), args.base, args.impute, args.weights)
+    index = basket['index']
+    print(f"Base {index['base_month']}, {len(index['months'])} months, {len(index['stores'])} stores")
+    for method in METHODS:
+        print(f"  National {method:<9}: {index['national'][method][-1]}")
+
+    if write_if_changed(args.basket, format_basket(basket) + "\n"):
+        print(f"✓ Updated {os.path.basename(args.basket)}")
+    else:
+        print(f"{os.path.basename(args.basket)} unchanged")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,11 @@ let months = [];
 let rawMonths = [];
 let monthsFull = []; // Full month history
 let rawMonthsFull = [];
+let dataManifest = null; // data/manifest.json when the site is built with item shards
+let shardRequests = {}; // shard file -> fetch promise, so each shard is downloaded once
+let loadedItems = new Set(); // SKUs whose prices are already in priceData
+let searchIndex = null; // dropdown_index.json (see search_index.py), if the site has one
+const STORES = ['austin', 'chicago', 'newyork', 'la'];
 
 // Helper function to fill in missing months (2025-07, 2025-08, 2025-09)
 function fillMissingMonths(monthsArray) {
@@ -43,15 +48,234 @@ function fillPricesForMissingMonths(prices, months) {
     return prices;
 }
 
+// Add one featured item's prices ({title, stores: {store: {month: price}}}) to priceData
+function addItemPrices(sku, itemData) {
+    itemNames[sku] = itemData.title;
+    
+    STORES.forEach(store => {
+        if (itemData.stores && itemData.stores[store]) {
+            // Create price array for last 12 months (filtered)
+            let prices = rawMonths.map(month => {
+                return itemData.stores[store][month] || null;
+            });
+            
+            // Create FULL UNFILTERED price array for "Show Full History"
+            let pricesFull = rawMonthsFull.map(month => {
+                return itemData.stores[store][month] || null;
+            });
+            
+            // Fill missing months with June price
+            prices = fillPricesForMissingMonths(prices, rawMonths);
+            pricesFull = fillPricesForMissingMonths(pricesFull, rawMonthsFull);
+            
+            // Only add if we have at least some price data
+            if (prices.some(p => p !== null)) {
+                priceData[store][sku] = prices;
+                priceDataFull[store][sku] = pricesFull;
+            }
+        }
+    });
+    loadedItems.add(sku);
+}
+
+// Same normalization as search_index.py
+function normalizeTitle(text) {
+    return (text || '').normalize('NFKD').replace(/[\u0300-\u036f]/g, '').toLowerCase()
+        .replace(/['\u2019]/g, '').replace(/[^a-z0-9]+/g, ' ').trim();
+}
+
+function undelta(deltas) {
+    let total = 0;
+    return deltas.map(d => (total += d));
+}
+
+function prepareSearchIndex(data) {
+    data.postings = data.postings.map(undelta);
+    Object.keys(data.trigrams).forEach(gram => { data.trigrams[gram] = undelta(data.trigrams[gram]); });
+    data.normalized = data.titles.map(normalizeTitle);
+    return data;
+}
+
+function wordTrigrams(word) {
+    const grams = new Set();
+    for (let i = 0; i + 3 <= word.length; i++) grams.add(word.slice(i, i + 3));
+    return [...grams];
+}
+
+// [[word id, rank]] for one query word: 0 exact, 1 prefix, 2 infix
+function matchingWords(index, part) {
+    const words = index.words;
+    const out = [];
+    if (part.length < 3) {
+        let lo = 0, hi = words.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            if (words[mid] < part) lo = mid + 1; else hi = mid;
+        }
+        for (let w = lo; w < words.length && words[w].startsWith(part); w++) {
+            out.push([w, words[w] === part ? 0 : 1]);
+        }
+        return out;
+    }
+    const grams = wordTrigrams(part).sort((a, b) => (index.trigrams[a] || []).length - (index.trigrams[b] || []).length);
+    let candidates = new Set(index.trigrams[grams[0]] || []);
+    grams.slice(1).forEach(gram => {
+        const next = new Set(index.trigrams[gram] || []);
+        candidates = new Set([...candidates].filter(w => next.has(w)));
+    });
+    candidates.forEach(w => {
+        const word = words[w];
+        if (word.includes(part)) out.push([w, word === part ? 0 : word.startsWith(part) ? 1 : 2]);
+    });
+    return out;
+}
+
+// Ranked [{sku, title, category}] from the prebuilt index, as SearchIndex.search does
+function indexedSearch(index, query, limit) {
+    const normalized = normalizeTitle(query);
+    const parts = normalized.split(' ').filter(Boolean);
+    if (!parts.length) return [];
+    let scores = null;
+    for (const part of parts) {
+        const ranks = new Map();
+        matchingWords(index, part).forEach(([w, rank]) => {
+            index.postings[w].forEach(i => {
+                if (rank < (ranks.has(i) ? ranks.get(i) : 3)) ranks.set(i, rank);
+            });
+        });
+        if (scores === null) {
+            scores = ranks;
+        } else {
+            const next = new Map();
+            ranks.forEach((rank, i) => { if (scores.has(i)) next.set(i, scores.get(i) + rank); });
+            scores = next;
+        }
+        if (!scores.size) return [];
+    }
+    const ranked = [...scores.keys()].map(i => ({
+        i,
+        key: [index.normalized[i].startsWith(normalized) ? 0 : 1, scores.get(i), index.titles[i].length],
+        title: index.titles[i]
+    })).sort((a, b) => {
+        for (let k = 0; k < a.key.length; k++) if (a.key[k] !== b.key[k]) return a.key[k] - b.key[k];
+        return a.title < b.title ? -1 : a.title > b.title ? 1 : 0;
+    });
+    return ranked.slice(0, limit).map(({ i }) => ({
+        sku: index.skus[i],
+        title: index.titles[i],
+        category: index.tags[i] >= 0 ? index.categories[index.tags[i]] : null,
+        latest: index.latest ? index.latest[i] : undefined
+    }));
+}
+
+// Read a price pack (see price_pack.py): shared month/store names, uint cents per (item, store, month),
+// optionally followed by prices per unit, which the site does not read
+function readPricePack(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'TJPP' || view.getUint16(4, true) !== 2) throw new Error('Not a version 2 price pack');
+    const priceBytes = view.getUint16(6, true);
+    const nMonths = view.getUint32(8, true);
+    const nStores = view.getUint32(12, true);
+    const nItems = view.getUint32(16, true);
+    const blockLength = view.getUint32(20, true);
+    const strings = new TextDecoder().decode(new Uint8Array(buffer, 28, blockLength)).split('\0');
+    const PriceArray = priceBytes === 2 ? Uint16Array : Uint32Array;
+    const count = nItems * nStores * nMonths;
+    let offset = nMonths + nStores;
+    return {
+        months: strings.slice(0, nMonths),
+        stores: strings.slice(nMonths, offset),
+        skus: strings.slice(offset, offset += nItems),
+        titles: strings.slice(offset, offset += nItems),
+        prices: new PriceArray(buffer, 28 + blockLength, count),
+        missing: priceBytes === 2 ? 0xFFFF : 0xFFFFFFFF
+    };
+}
+
+// {store: {month: price}} for item i of a pack's (item, store, month) array
+function packedSeries(pack, values, i, missing, scale) {
+    const stores = {};
+    const nMonths = pack.months.length;
+    pack.stores.forEach((store, j) => {
+        const start = (i * pack.stores.length + j) * nMonths;
+        let series = null;
+        for (let k = 0; k < nMonths; k++) {
+            const value = values[start + k];
+            if (value !== missing) {
+                series = series || {};
+                series[pack.months[k]] = value / scale;
+            }
+        }
+        if (series) stores[store] = series;
+    });
+    return stores;
+}
+
+// One item of a price pack in the featured JSON shape ({title, stores: {store: {month: price}}})
+function packedItem(pack, i) {
+    return { title: pack.titles[i], stores: packedSeries(pack, pack.prices, i, pack.missing, 100) };
+}
+
+// {items: {sku: item}} for a whole pack
+function packedItems(pack) {
+    const items = {};
+    pack.skus.forEach((sku, i) => { items[sku] = packedItem(pack, i); });
+    return { months: pack.months, items };
+}
+
+function fetchShard(file) {
+    if (!shardRequests[file]) {
+        shardRequests[file] = fetch('data/' + file).then(response => {
+            if (!response.ok) throw new Error('Failed to load data/' + file);
+            // Shards are price packs; JSON shards come from sites built before they were packed
+            if (file.endsWith('.bin')) return response.arrayBuffer().then(buffer => packedItems(readPricePack(buffer)));
+            return response.json();
+        }).catch(error => {
+            delete shardRequests[file]; // allow a retry
+            throw error;
+        });
+    }
+    return shardRequests[file];
+}
+
+// Make sure the prices of these SKUs are in priceData, fetching only the shards that hold them
+async function loadItems(skus) {
+    if (!dataManifest) return; // everything was loaded up front
+    const wanted = skus.filter(sku => !loadedItems.has(sku) && sku in dataManifest.items);
+    const files = [...new Set(wanted.map(sku => dataManifest.shards[dataManifest.items[sku]]))];
+    const shards = await Promise.all(files.map(fetchShard));
+    shards.forEach(shard => {
+        wanted.forEach(sku => {
+            if (!loadedItems.has(sku) && shard.items[sku]) addItemPrices(sku, shard.items[sku]);
+        });
+    });
+}
+
 async function loadRealData() {
     try {
         console.log('Starting data load...');
         
-        // Load featured items (for item search) - using FULL version with complete history
-        const featuredResponse = await fetch('featured_items_FULL.json');
-        if (!featuredResponse.ok) throw new Error('Failed to load featured_items_FULL.json');
-        const featuredData = await featuredResponse.json();
-        console.log('Featured data loaded (FULL history)');
+        // Item prices: a small manifest whose shards are fetched as items are picked,
+        // or the single FULL file when the site has no shards
+        let featuredData = null;
+        const manifestResponse = await fetch('data/manifest.json');
+        if (manifestResponse.ok) {
+            dataManifest = await manifestResponse.json();
+            console.log('Item manifest loaded:', dataManifest.shards.length, 'shards');
+        } else {
+            // Packed integer cents if available (no JSON to parse), else the JSON
+            const packResponse = await fetch('featured_items_FULL.bin');
+            if (packResponse.ok) {
+                featuredData = packedItems(readPricePack(await packResponse.arrayBuffer()));
+                console.log('Featured data loaded (FULL history, packed)');
+            } else {
+                const featuredResponse = await fetch('featured_items_FULL.json');
+                if (!featuredResponse.ok) throw new Error('Failed to load featured_items_FULL.json');
+                featuredData = await featuredResponse.json();
+                console.log('Featured data loaded (FULL history)');
+            }
+        }
         
         // Load basket essentials (for basket builder)
         const basketResponse = await fetch('basket_essentials.json');
@@ -59,11 +283,21 @@ async function loadRealData() {
         const basketData = await basketResponse.json();
         console.log('Basket essentials loaded');
         
-        // Load dropdown items (for item search autocomplete)
-        const dropdownResponse = await fetch('dropdown_items.json');
-        if (!dropdownResponse.ok) throw new Error('Failed to load dropdown_items.json');
-        itemList = await dropdownResponse.json();
-        console.log('Dropdown items loaded:', itemList.length);
+        // Load dropdown items (for item search autocomplete): the search index holds
+        // the same list, otherwise the plain list is scanned on each keystroke
+        const indexResponse = await fetch('dropdown_index.json');
+        if (indexResponse.ok) {
+            searchIndex = prepareSearchIndex(await indexResponse.json());
+            itemList = searchIndex.skus.map((sku, i) => ({
+                sku, title: searchIndex.titles[i], latest: searchIndex.latest ? searchIndex.latest[i] : undefined
+            }));
+            console.log('Search index loaded:', itemList.length, 'items');
+        } else {
+            const dropdownResponse = await fetch('dropdown_items.json');
+            if (!dropdownResponse.ok) throw new Error('Failed to load dropdown_items.json');
+            itemList = await dropdownResponse.json();
+            console.log('Dropdown items loaded:', itemList.length);
+        }
         
         // Load basket dropdown (for basket builder autocomplete)
         const basketDropdownResponse = await fetch('basket_essentials_dropdown.json');
@@ -73,7 +307,7 @@ async function loadRealData() {
         
         // Extract months (keep raw format for processing)
         // Store FULL unfiltered history for "Show Full History" feature
-        const allMonths = featuredData.months;
+        const allMonths = dataManifest ? dataManifest.months : featuredData.months;
         
         // Fill in missing months (July, August, September) with placeholder
         const filledMonths = fillMissingMonths(allMonths);
@@ -90,48 +324,26 @@ async function loadRealData() {
         
         // Transform data into format needed by app
         // priceData = { store: { sku: [prices...] } }
-        const stores = ['austin', 'chicago', 'newyork', 'la'];
+        const stores = STORES;
         
         stores.forEach(store => {
             priceData[store] = {};
             priceDataFull[store] = {};
         });
         
-        // Process featured items (for item search)
-        Object.entries(featuredData.items).forEach(([sku, itemData]) => {
-            // Store item name
-            itemNames[sku] = itemData.title;
-            
-            // Process prices for each store
-            stores.forEach(store => {
-                if (itemData.stores && itemData.stores[store]) {
-                    // Create price array for last 12 months (filtered)
-                    let prices = rawMonths.map(month => {
-                        return itemData.stores[store][month] || null;
-                    });
-                    
-                    // Create FULL UNFILTERED price array for "Show Full History"
-                    let pricesFull = rawMonthsFull.map(month => {
-                        return itemData.stores[store][month] || null;
-                    });
-                    
-                    // Fill missing months with June price
-                    prices = fillPricesForMissingMonths(prices, rawMonths);
-                    pricesFull = fillPricesForMissingMonths(pricesFull, rawMonthsFull);
-                    
-                    // Only add if we have at least some price data
-                    if (prices.some(p => p !== null)) {
-                        priceData[store][sku] = prices;
-                        priceDataFull[store][sku] = pricesFull;
-                    }
-                }
-            });
-        });
+        if (featuredData) {
+            // Process featured items (for item search)
+            Object.entries(featuredData.items).forEach(([sku, itemData]) => addItemPrices(sku, itemData));
+        } else {
+            // Names come from the dropdown list; prices arrive with loadItems()
+            itemList.forEach(item => { itemNames[item.sku] = item.title; });
+        }
         
         // Process basket essentials (for basket builder)
         Object.entries(basketData.items).forEach(([sku, itemData]) => {
             // Store item name (overwrite if exists, as basket essentials are more complete)
             itemNames[sku] = itemData.title;
+            loadedItems.add(sku);
             
             // Process prices for each store
             stores.forEach(store => {
@@ -195,11 +407,14 @@ function searchItems(query, useBasketItems = false) {
         document.getElementById('basketStore')?.value || 'austin' : 
         document.getElementById('searchStore')?.value || 'austin';
     
-    return sourceList
-        .filter(item => item.title.toLowerCase().includes(lowerQuery))
+    const matches = searchIndex ? indexedSearch(searchIndex, query, 10) :
+        sourceList.filter(item => item.title.toLowerCase().includes(lowerQuery));
+    
+    return matches
         .map(item => {
-            // Get current price for this item at the selected store
-            let currentPrice = null;
+            // Get current price for this item at the selected store: from its loaded
+            // series, else the latest price the dropdown list carries (its shard may not be loaded)
+            let currentPrice = item.latest ? item.latest[currentStore] ?? null : null;
             if (priceData[currentStore] && priceData[currentStore][item.sku]) {
                 const prices = priceData[currentStore][item.sku];
                 // Get the last non-null price
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Chunked ingestion of the raw price dump
+The dump is read a chunk at a time with explicit dtypes, and rows are folded
+into per-(sku, store_code, month) aggregates as they go, so memory follows
+the size of the aggregate rather than the size of the file.
+
+Medians stay exact: each key keeps how many times it saw each distinct price
+(a handful per SKU and month), and counts from different chunks simply add.
+"""
+import numpy as np
+import pandas as pd
+
+KEYS = ['sku', 'store_code', 'month']
+
+# Everything is read as text; prices and dates are coerced afterwards so bad
+# cells become NaN/NaT instead of failing the read
+DUMP_COLUMNS = ['sku', 'retail_price', 'item_title', 'inserted_at', 'store_code']
+
+CHUNK_ROWS = 250_000
+
+
+def read_dump_chunks(path, chunksize=CHUNK_ROWS, columns=DUMP_COLUMNS):
+    """Yield cleaned frames of the dump: numeric prices, real timestamps, no invalid rows"""
+    reader = pd.read_csv(path, usecols=columns, dtype=str,
+                         chunksize=chunksize)
+    for chunk in reader:
+        chunk['retail_price'] = pd.to_numeric(chunk['retail_price'], errors='coerce')
+        chunk['inserted_at'] = pd.to_datetime(chunk['inserted_at'], errors='coerce')
+        yield chunk.dropna(subset=['inserted_at', 'retail_price'])
+
+
+def month_labels(timestamps):
+    return timestamps.dt.to_period('M').astype(str)
+
+
+class PriceCounts:
+    """Mergeable count of every price seen per (sku, store_code, month)"""
+
+    def __init__(self, counts=None):
+        if counts is None:
+            index = pd.MultiIndex.from_arrays([[], [], [], []], names=KEYS + ['retail_price'])
+            counts = pd.Series([], index=index, dtype='int64', name='count')
+        self.counts = counts
+
+    def add(self, frame):
+        """Fold rows with sku, store_code, month and retail_price columns in"""
+        if len(frame):
+            self.merge(PriceCounts(frame.groupby(KEYS + ['retail_price']).size().rename('count')))
+        return self
+
+    def merge(self, other):
+        if len(self.counts) == 0:
+            self.counts = other.counts
+        elif len(other.counts):
+            combined = pd.concat([self.counts, other.counts])
+            self.counts = combined.groupby(level=combined.index.names).sum()
+        return self
+
+    def __len__(self):
+        return len(self.counts)
+
+    def medians(self):
+        """Exact median price per (sku, store_code, month), sorted by key"""
+        counts = self.counts.sort_index()
+        keys = counts.index.droplevel('retail_price')
+        prices = counts.index.get_level_values('retail_price').to_numpy(dtype='float64')
+        n = counts.to_numpy()
+        end = n.cumsum()
+        # Position of each key's first row, and where that key's rows end
+        codes = np.vstack(keys.codes)
+        starts = np.flatnonzero(np.r_[True, (codes[:, 1:] != codes[:, :-1]).any(axis=0)])
+        first_end = np.r_[0, end][starts]
+        group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(n)]))
+        before = end - n - first_end[group]   # rows of this key ahead of each price
+        total = np.add.reduceat(n, starts)[group]
+        lo = (total - 1) // 2
+        hi = total // 2
+        take_lo = (before <= lo) & (lo < before + n)
+        take_hi = (before <= hi) & (hi < before + n)
+        median = (prices[take_lo] + prices[take_hi]) / 2
+        return pd.Series(median, index=keys[starts], name='retail_price')
+
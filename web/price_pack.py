@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Packed binary form of featured_items_FULL.json-style artifacts
+({"months": [...], "items": {sku: {"title": ..., "stores": {store: {month: price}},
+                                   "per_unit": {"unit": ..., "stores": {...}}}}}, per_unit optional)
+
+Month and store names are stored once; prices are integer cents in one
+dense little-endian array of shape (item, store, month), so the browser can
+read them straight into a Uint16Array/Uint32Array without parsing JSON.
+Prices per unit follow as a second array of the same shape in
+ten-thousandths of a dollar (unit_prices.UNIT_PRICE_DECIMALS):
+
+    offset  size  field
+    0       4     magic b'TJPP'
+    4       2     format version (2)
+    6       2     bytes per price: 2 (uint16) or 4 (uint32, if any price >= $655.35)
+    8       4     number of months
+    12      4     number of stores
+    16      4     number of items
+    20      4     length of the string block
+    24      4     bytes per unit price: 4 (uint32), or 0 if no item has per_unit
+    28      ...   string block, UTF-8, NUL separated: months, stores, SKUs, titles,
+                  then one unit per item ("" for none) if there are unit prices;
+                  zero padded to a multiple of 4 bytes
+    ...     ...   prices, cents, zero padded to a multiple of 4 bytes;
+                  all ones (0xFFFF / 0xFFFFFFFF) = no price
+    ...     ...   unit prices, ten-thousandths; 0xFFFFFFFF = no price
+
+A store that has no price at all for an item is left out of that item on
+unpacking, as in the JSON, so unpack(pack(x)) == x.
+
+Usage:
+    python3 price_pack.py featured_items_FULL.json    # writes featured_items_FULL.bin and checks it
+"""
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'TJPP'
+VERSION = 2
+HEADER = struct.Struct('<4sHHIIIII')
+SEPARATOR = '\0'
+UNIT_SCALE = 10_000
+UNIT_DTYPE = np.dtype('<u4')
+
+
+def _dense(skus, series_of, stores, months, scale):
+    """(item, store, month) int64 array of price * scale, -1 where there is no price"""
+    month_index = {month: k for k, month in enumerate(months)}
+    store_index = {store: j for j, store in enumerate(stores)}
+    out = np.full((len(skus), len(stores), len(months)), -1, dtype=np.int64)
+    for i, sku in enumerate(skus):
+        for store, series in series_of(sku).items():
+            for month, price in series.items():
+                out[i, store_index[store], month_index[month]] = int(round(price * scale))
+    return out
+
+
+def _series(values, missing, stores, months, scale, decimals):
+    """{store: {month: price}} for one item's (store, month) array; stores without prices left out"""
+    out = {}
+    for j, store in enumerate(stores):
+        series = {months[k]: round(int(v) / scale, decimals) for k, v in enumerate(values[j]) if v != missing}
+        if series:
+            out[store] = series
+    return out
+
+
+def pack(artifact):
+    """bytes for an artifact dict"""
+    months = list(artifact['months'])
+    items = artifact['items']
+    stores = []
+    for item in items.values():
+        for store in list(item['stores']) + list(item.get('per_unit', {}).get('stores', {})):
+            if store not in stores:
+                stores.append(store)
+    skus = list(items)
+    titles = [items[sku]['title'] for sku in skus]
+    has_units = any('per_unit' in item for item in items.values())
+
+    strings = months + stores + skus + titles
+    if has_units:
+        strings += [items[sku].get('per_unit', {}).get('unit', '') for sku in skus]
+    if any(SEPARATOR in s for s in strings):
+        raise ValueError("names and titles can't contain NUL characters")
+    block = SEPARATOR.join(strings).encode('utf-8')
+    block += b'\0' * (-len(block) % 4)
+
+    cents = _dense(skus, lambda sku: items[sku]['stores'], stores, months, 100)
+    dtype = np.dtype('<u2') if cents.max(initial=0) < 0xFFFF else np.dtype('<u4')
+    prices = np.where(cents < 0, np.iinfo(dtype).max, cents).astype(dtype).tobytes()
+    prices += b'\0' * (-len(prices) % 4)
+
+    unit_prices = b''
+    if has_units:
+        units = _dense(skus, lambda sku: items[sku].get('per_unit', {}).get('stores', {}), stores, months,
+                       UNIT_SCALE)
+        if units.max(initial=0) >= np.iinfo(UNIT_DTYPE).max:
+            raise ValueError("unit price too large for the pack")
+        unit_prices = np.where(units < 0, np.iinfo(UNIT_DTYPE).max, units).astype(UNIT_DTYPE).tobytes()
+
+    header = HEADER.pack(MAGIC, VERSION, dtype.itemsize, len(months), len(stores), len(skus), len(block),
+                         UNIT_DTYPE.itemsize if has_units else 0)
+    return header + block + prices + unit_prices
+
+
+def unpack(data):
+    """The artifact dict back from pack()'s bytes"""
+    magic, version, price_bytes, n_months, n_stores, n_items, block_len, unit_bytes = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not a version {VERSION} price pack")
+    offset = HEADER.size
+    # Trailing empty units would be eaten by the rstrip, so split the block as is
+    strings = data[offset:offset + block_len].decode('utf-8').split(SEPARATOR)
+    months = strings[:n_months]
+    stores = strings[n_months:n_months + n_stores]
+    skus = strings[n_months + n_stores:n_months + n_stores + n_items]
+    titles = strings[n_months + n_stores + n_items:n_months + n_stores + 2 * n_items]
+    units = strings[n_months + n_stores + 2 * n_items:n_months + n_stores + 3 * n_items]
+
+    count = n_items * n_stores * n_months
+    dtype = np.dtype('<u2') if price_bytes == 2 else np.dtype('<u4')
+    offset += block_len
+    prices = np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(n_items, n_stores, n_months)
+    offset += count * price_bytes + (-count * price_bytes) % 4
+    unit_prices = None
+    if unit_bytes:
+        unit_prices = np.frombuffer(data, dtype=UNIT_DTYPE, count=count,
+                                    offset=offset).reshape(n_items, n_stores, n_months)
+
+    items = {}
+    for i, sku in enumerate(skus):
+        items[sku] = {'title': titles[i],
+                      'stores': _series(prices[i], np.iinfo(dtype).max, stores, months, 100, 2)}
+        if unit_prices is not None and units[i]:
+            items[sku]['per_unit'] = {
+                'unit': units[i],
+                'stores': _series(unit_prices[i], np.iinfo(UNIT_DTYPE).max, stores, months, UNIT_SCALE, 4)}
+    return {'months': months, 'items': items}
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__, file=sys.stderr)
+        sys.exit(1)
+    path = sys.argv[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        artifact = json.load(f)
+    data = pack(artifact)
+    if unpack(data) != artifact:
+        print(f"{path} does not round-trip (prices with fractions of a cent, or unit prices "
+              f"with more than 4 decimals?)", file=sys.stderr)
+        sys.exit(1)
+    out = os.path.splitext(path)[0] + '.bin'
+    with open(out, 'wb') as f:
+        f.write(data)
+    size = os.path.getsize(path)
+    print(f"✓ {out}: {len(data):,} bytes ({size / len(data):.1f}x smaller than {size:,})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Publish the site with content-hashed, precompressed assets
+Copies the pages (*.html) into an output directory, and every local file
+they reference (data artifacts, data_loader.js, images, the font) under a
+name carrying a hash of its content, e.g.
+
+    price_data.json          -> price_data.3f9a1c0b2e.json
+    images/white logo.png    -> images/white logo.8d21e4a7c0.png
+
+References are rewritten in the pages and in data_loader.js; item shards
+are renamed inside data/manifest.json. Hashed files can be cached forever,
+since any change gives a new name, so repeat visitors only download what
+changed. Text assets also get .gz and (with `pip install brotli`) .br
+copies for hosts that serve precompressed files.
+
+A hashed file that already exists is left alone, so republishing
+unchanged data writes nothing but the pages that changed. The mapping is
+written to asset-manifest.json; --prune removes hashed files it no longer
+lists.
+
+Usage:
+    python3 publish_site.py                  # web/ -> web/dist/
+    python3 publish_site.py --out ../site --prune
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+from build_artifacts import write_if_changed
+
+try:
+    import brotli
+except ImportError:  # optional; gzip copies are still written
+    brotli = None
+
+OUT_DIR = "dist"
+MANIFEST = "asset-manifest.json"
+HASH_LENGTH = 10
+
+# Files referenced by these extensions are published under hashed names
+ASSET_EXTENSIONS = ('.json', '.bin', '.js', '.css', '.png', '.jpg', '.svg', '.otf', '.woff', '.woff2')
+# ...and these get .gz/.br copies (images are already compressed)
+COMPRESSIBLE = ('.html', '.json', '.bin', '.js', '.css', '.svg', '.otf')
+# Assets whose own references are rewritten before hashing
+REWRITTEN = ('.js', '.css')
+
+REFERENCE = re.compile(r"""(["'])([^"'\n<>(){}]+?\.(?:%s))\1""" % '|'.join(
+    re.escape(ext[1:]) for ext in ASSET_EXTENSIONS))
+HASHED = re.compile(r"\.[0-9a-f]{%d}\.[^./]+(\.gz|\.br)?$" % HASH_LENGTH)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(path, data):
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{content_hash(data)}{ext}"
+
+
+class SitePublisher:
+    """Publishes `src` into `out`, hashing each referenced asset once"""
+
+    def __init__(self, src='.', out=OUT_DIR):
+        self.src = src
+        self.out = out
+        self.assets = {}  # site path -> hashed site path
+        self.written = 0
+        self.kept = 0
+
+    def _exists(self, path):
+        return os.path.isfile(os.path.join(self.src, path))
+
+    def rewrite(self, text, base=''):
+        """`text` with references to local assets replaced by their hashed names
+
+        References are resolved against `base` (the site directory the
+        browser resolves them from); anything that isn't a local file, such
+        as a CDN URL or a name assembled at runtime, is left as it is.
+        """
+        def replace(match):
+            quote, ref = match.groups()
+            if '://' in ref or ref.startswith('//'):
+                return match.group(0)
+            path = posixpath.normpath(posixpath.join(base, ref))
+            if path.startswith('..') or not self._exists(path):
+                return match.group(0)
+            hashed = self.asset(path)
+            return quote + posixpath.relpath(hashed, base or '.') + quote
+        return REFERENCE.sub(replace, text)
+
+    def asset(self, path):
+        """Publish one asset (and what it references); returns its hashed site path"""
+        if path in self.assets:
+            return self.assets[path]
+        with open(os.path.join(self.src, path), 'rb') as f:
+            data = f.read()
+        if path.endswith(REWRITTEN):
+            # CSS resolves url()s against its own directory; scripts against the page
+            base = posixpath.dirname(path) if path.endswith('.css') else ''
+            data = self.rewrite(data.decode('utf-8'), base).encode('utf-8')
+        elif posixpath.basename(path) == 'manifest.json':
+            data = self._rename_shards(path, data)
+
+        hashed = hashed_name(path, data)
+        self.assets[path] = hashed
+        target = os.path.join(self.out, hashed)
+        if os.path.exists(target):
+            self.kept += 1
+        else:
+            self._write(target, data)
+        return hashed
+
+    def _rename_shards(self, path, data):
+        # data/manifest.json lists shard files the loader fetches next to it
+        manifest = json.loads(data)
+        if 'shards' not in manifest:
+            return data
+        base = posixpath.dirname(path)
+        manifest['shards'] = [posixpath.basename(self.asset(posixpath.join(base, name)))
+                              for name in manifest['shards']]
+        return json.dumps(manifest).encode('utf-8')
+
+    def _write(self, target, data):
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        write_if_changed(target, data)
+        self.written += 1
+        self._compressed(target, data)
+
+    def _compressed(self, target, data):
+        if not target.endswith(COMPRESSIBLE):
+            return
+        write_if_changed(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            write_if_changed(target + '.br', brotli.compress(data))
+
+    def page(self, name):
+        """Publish a page under its own name with rewritten references; True if it changed"""
+        with open(os.path.join(self.src, name), 'r', encoding='utf-8') as f:
+            data = self.rewrite(f.read()).encode('utf-8')
+        target = os.path.join(self.out, name)
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        if not write_if_changed(target, data):
+            self.kept += 1
+            return False
+        self.written += 1
+        self._compressed(target, data)
+        return True
+
+    def prune(self):
+        """Remove hashed files that the current assets don't use; returns how many"""
+        current = {os.path.normpath(os.path.join(self.out, hashed)) for hashed in self.assets.values()}
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.out):
+            for filename in filenames:
+                path = os.path.normpath(os.path.join(dirpath, filename))
+                if not HASHED.search(filename):
+                    continue
+                if re.sub(r'\.(gz|br)$', '', path) not in current:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+def publish(src='.', out=OUT_DIR, pages=None, prune=False):
+    """Publish the site; returns the asset mapping {site path: hashed site path}"""
+    publisher = SitePublisher(src, out)
+    pages = pages or sorted(name for name in os.listdir(src) if name.endswith('.html'))
+    for name in pages:
+        if publisher.page(name):
+            print(f"  ✓ {name} updated")
+    mapping = dict(sorted(publisher.assets.items()))
+    write_if_changed(os.path.join(out, MANIFEST), json.dumps(mapping, indent=2, ensure_ascii=False) + "\n")
+    print(f"✓ {len(mapping)} assets: {publisher.written} file(s) written, {publisher.kept} unchanged")
+    if brotli is None:
+        print("  brotli not installed; wrote .gz copies only (pip install brotli)")
+    if prune:
+        print(f"  ✓ Pruned {publisher.prune()} old hashed file(s)")
+    return mapping
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--src', default='.', help='site directory (default: current directory)')
+    parser.add_argument('--out', default=OUT_DIR, help=f'output directory (default: {OUT_DIR})')
+    parser.add_argument('--page', action='append', help='page to publish (repeatable; default: every *.html)')
+    parser.add_argument('--prune', action='store_true', help='remove hashed files no longer referenced')
+    args = parser.parse_args()
+
+    publish(args.src, args.out, args.page, args.prune)
+
+
+if __name__ == "__main__":
+    main()
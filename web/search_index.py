@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Prebuilt search index for the item dropdown
+Titles are normalized (lowercase, accents and apostrophes dropped, anything
+else that isn't a letter or digit becomes a space) and split into words.
+The index keeps the sorted vocabulary, each word's item list and a trigram
+map over the vocabulary, so a query word is resolved against a few
+thousand words instead of every title:
+
+    2 characters   words starting with it (binary search in the vocabulary)
+    3 or more      words containing it (trigram candidates, then checked)
+
+An item matches when every query word matches one of its words. Results
+are ranked: title starts with the query, then exact > prefix > infix word
+matches, then shorter titles. Each item carries its essential-item
+category from title_classifier.py, if any, and the latest price per store
+when the items have one (so the dropdown can show prices without loading
+any item shard).
+
+JSON layout (dropdown_index.json; lists of ids are delta-encoded):
+
+    {"version": 1, "skus": [...], "titles": [...], "categories": [...],
+     "tags": [category index or -1 per item], "words": [sorted vocabulary],
+     "postings": [item ids per word], "trigrams": {"pot": [word ids]},
+     "latest": [{"austin": 3.29, ...} per item]}    # optional
+
+data_loader.js reads the same file. Usage:
+    python3 search_index.py build dropdown_items.json -o dropdown_index.json
+    python3 search_index.py search "sweet pot"
+    python3 search_index.py search rice --index catalog_index.json --category pantry
+"""
+import argparse
+import bisect
+import json
+import re
+import sys
+import unicodedata
+
+from title_classifier import TitleClassifier
+
+INDEX_FILE = "dropdown_index.json"
+VERSION = 1
+
+NON_WORD = re.compile(r"[^a-z0-9]+")
+APOSTROPHES = re.compile(r"['’]")
+
+
+def normalize(text):
+    """Lowercase ASCII words of `text` joined by single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return NON_WORD.sub(' ', APOSTROPHES.sub('', text)).strip()
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def _deltas(ids):
+    out, previous = [], 0
+    for i in ids:
+        out.append(i - previous)
+        previous = i
+    return out
+
+
+class SearchIndex:
+    """Word/trigram index over item titles"""
+
+    def __init__(self, skus, titles, tags=None, categories=None, latest=None):
+        self.skus = list(skus)
+        self.titles = list(titles)
+        self.categories = list(categories or [])
+        self.tags = list(tags) if tags is not None else [-1] * len(self.skus)
+        self.latest = list(latest) if latest is not None else None
+        self.normalized = [normalize(title) for title in self.titles]
+
+        postings = {}
+        for i, title in enumerate(self.normalized):
+            for word in set(title.split()):
+                postings.setdefault(word, []).append(i)
+        self.words = sorted(postings)
+        self.postings = [postings[word] for word in self.words]
+        self.trigrams = {}
+        for w, word in enumerate(self.words):
+            for gram in trigrams(word):
+                self.trigrams.setdefault(gram, []).append(w)
+
+    @classmethod
+    def build(cls, items, classifier=None):
+        """Index [{'sku', 'title'}] items, tagging each with its essential category
+
+        Items' 'latest' prices, if they have them, are kept alongside.
+        """
+        classifier = classifier or TitleClassifier()
+        categories = list(classifier.groups.values())
+        tags = []
+        for item in items:
+            category = classifier.category(item['title'])
+            tags.append(categories.index(category) if category else -1)
+        latest = [item.get('latest', {}) for item in items] if any('latest' in item for item in items) else None
+        return cls([item['sku'] for item in items], [item['title'] for item in items], tags, categories, latest)
+
+    def to_json(self):
+        data = {
+            'version': VERSION,
+            'skus': self.skus,
+            'titles': self.titles,
+            'categories': self.categories,
+            'tags': self.tags,
+            'words': self.words,
+            'postings': [_deltas(ids) for ids in self.postings],
+            'trigrams': {gram: _deltas(ids) for gram, ids in sorted(self.trigrams.items())},
+        }
+        if self.latest is not None:
+            data['latest'] = self.latest
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text):
+        """Index from to_json() output; the word lists are rebuilt from the titles"""
+        data = json.loads(text)
+        if data.get('version') != VERSION:
+            raise ValueError(f"unsupported search index version {data.get('version')!r}")
+        return cls(data['skus'], data['titles'], data['tags'], data['categories'], data.get('latest'))
+
+    def _matching_words(self, part):
+        """[(word id, rank)] for one query word: 0 exact, 1 prefix, 2 infix"""
+        if len(part) < 3:
+            start = bisect.bisect_left(self.words, part)
+            end = bisect.bisect_left(self.words, part + '\uffff')
+            return [(w, 0 if self.words[w] == part else 1) for w in range(start, end)]
+        grams = sorted(trigrams(part), key=lambda g: len(self.trigrams.get(g, ())))
+        candidates = set(self.trigrams.get(grams[0], ()))
+        for gram in grams[1:]:
+            candidates.intersection_update(self.trigrams.get(gram, ()))
+        out = []
+        for w in candidates:
+            word = self.words[w]
+            if part in word:
+                out.append((w, 0 if word == part else 1 if word.startswith(part) else 2))
+        return out
+
+    def search(self, query, limit=10, category=None):
+        """[{'sku', 'title', 'category'}] best first"""
+        query = normalize(query)
+        parts = query.split()
+        if not parts:
+            return []
+        scores = None
+        for part in parts:
+            ranks = {}
+            for w, rank in self._matching_words(part):
+                for i in self.postings[w]:
+                    if rank < ranks.get(i, 3):
+                        ranks[i] = rank
+            if scores is None:
+                scores = ranks
+            else:
+                scores = {i: scores[i] + rank for i, rank in ranks.items() if i in scores}
+            if not scores:
+                return []
+
+        if category is not None:
+            wanted = self.categories.index(category) if category in self.categories else None
+            scores = {i: s for i, s in scores.items() if self.tags[i] == wanted}
+        ranked = sorted(scores, key=lambda i: (not self.normalized[i].startswith(query), scores[i],
+                                               len(self.titles[i]), self.titles[i]))
+        return [self.result(i) for i in ranked[:limit]]
+
+    def result(self, i):
+        tag = self.tags[i]
+        out = {'sku': self.skus[i], 'title': self.titles[i],
+               'category': self.categories[tag] if tag >= 0 else None}
+        if self.latest is not None:
+            out['latest'] = self.latest[i]
+        return out
+
+
+def load_items(path):
+    """[{'sku', 'title'}] from dropdown_items.json, or price_data.json's {sku: {'name': ...}}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return [{'sku': sku, 'title': item['name']} for sku, item in data.items()]
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='index dropdown_items.json or price_data.json')
+    build.add_argument('items')
+    build.add_argument('-o', '--out', default=INDEX_FILE, help=f'index file (default: {INDEX_FILE})')
+
+    search = sub.add_parser('search', help='query an index')
+    search.add_argument('query')
+    search.add_argument('--index', default=INDEX_FILE, help=f'index file (default: {INDEX_FILE})')
+    search.add_argument('--category', help='only items in this essential category')
+    search.add_argument('--limit', type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = SearchIndex.build(load_items(args.items))
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(index.to_json())
+        print(f"✓ {args.out}: {len(index.skus)} items, {len(index.words)} words, {len(index.trigrams)} trigrams")
+    else:
+        with open(args.index, 'r', encoding='utf-8') as f:
+            index = SearchIndex.from_json(f.read())
+        results = index.search(args.query, args.limit, args.category)
+        for item in results:
+            print(f"{item['sku']:>8}  {item['title']}" + (f"  [{item['category']}]" if item['category'] else ''))
+        if not results:
+            print("No matches", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
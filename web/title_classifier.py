@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Essential-item title classifier
+All keywords are compiled into one regex, so a title is scanned once instead
+of once per keyword. Titles are classified once per distinct title and mapped
+back onto the rows, which matters when millions of rows share a few
+thousand titles.
+
+Usage:
+    from title_classifier import TitleClassifier
+    df['category'] = TitleClassifier().categories(df['item_title'])
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# Define essential items by keywords (prioritize household staples)
+ESSENTIAL_KEYWORDS = {
+    'dairy_basics': [
+        'whole milk', '2% milk', 'skim milk', 'reduced fat milk', 'organic milk',
+        'butter', 'eggs', 'large eggs', 'cage free eggs', 'organic eggs'
+    ],
+    'cheese_basics': [
+        'cheddar cheese', 'mozzarella cheese', 'parmesan cheese', 'swiss cheese',
+        'cream cheese', 'string cheese'
+    ],
+    'bread': [
+        'whole wheat bread', 'white bread', 'sourdough', 'bagels', 'english muffins',
+        'tortillas', 'pita bread'
+    ],
+    'produce': [
+        'bananas', 'apples', 'oranges', 'strawberries', 'blueberries',
+        'carrots', 'broccoli', 'spinach', 'lettuce', 'tomatoes', 'potatoes',
+        'onions', 'garlic', 'avocados', 'lemons', 'limes'
+    ],
+    'meat': [
+        'chicken breast', 'ground beef', 'ground turkey', 'bacon', 'salmon',
+        'pork chops', 'turkey breast', 'sausage'
+    ],
+    'pantry': [
+        'olive oil', 'vegetable oil', 'flour', 'sugar', 'brown sugar',
+        'rice', 'pasta', 'spaghetti', 'penne', 'beans', 'canned tomatoes',
+        'tomato sauce', 'chicken broth', 'beef broth', 'peanut butter',
+        'jam', 'honey', 'oatmeal', 'cereal'
+    ],
+    'condiments': [
+        'ketchup', 'mustard', 'mayonnaise', 'hot sauce', 'soy sauce',
+        'salsa', 'ranch dressing', 'balsamic vinegar'
+    ],
+    'beverages': [
+        'orange juice', 'apple juice', 'coffee', 'tea'
+    ],
+    'frozen': [
+        'frozen vegetables', 'frozen fruit', 'ice cream', 'frozen pizza'
+    ]
+}
+
+# Titles containing any of these are never essentials
+EXCLUDE_TERMS = ['gift', 'card', 'candle', 'decoration', 'toy', 'pet', 'dog', 'cat']
+
+
+def _alternation(terms):
+    # Longest first so a keyword never loses to its own prefix
+    return '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+
+
+class TitleClassifier:
+    """Maps a product title to its essential category, or None
+
+    Matching is plain substring matching on the lowercased title, the same
+    as checking each keyword with `in`. When keywords from several
+    categories appear, the one that starts earliest in the title wins.
+    """
+
+    def __init__(self, keywords=ESSENTIAL_KEYWORDS, exclude=EXCLUDE_TERMS):
+        self.groups = {}
+        parts = []
+        for i, (category, terms) in enumerate(keywords.items()):
+            self.groups[f"c{i}"] = category
+            parts.append(f"(?P<c{i}>{_alternation(terms)})")
+        self.pattern = re.compile('|'.join(parts))
+        self.exclude = re.compile(_alternation(exclude)) if exclude else None
+        self.cache = {}
+
+    def category(self, title):
+        if not isinstance(title, str):
+            return None
+        title_lower = title.lower()
+        if self.exclude is not None and self.exclude.search(title_lower):
+            return None
+        match = self.pattern.search(title_lower)
+        if match is None:
+            return None
+        return self.groups[match.lastgroup]
+
+    def is_essential(self, title):
+        return self.category(title) is not None
+
+    def categories(self, titles):
+        """Category (or None) for every entry of a Series of titles
+
+        Each distinct title is classified once, and remembered across calls
+        so chunks of the same dump don't classify it again.
+        """
+        codes, uniques = pd.factorize(titles, use_na_sentinel=True)
+        labels = []
+        for title in uniques:
+            if title not in self.cache:
+                self.cache[title] = self.category(title)
+            labels.append(self.cache[title])
+        labels.append(None)  # code -1: missing title
+        return pd.Series(np.array(labels, dtype=object)[codes], index=titles.index, name='category', dtype=object)
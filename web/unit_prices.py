@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Unit-price normalization
+Turns sales_size / sales_uom_description into a quantity in one of three
+canonical units and divides the shelf price by it, so a smaller package at
+the same price shows up as a higher price per unit:
+
+    oz      weight: Oz, Wgt Oz, Lb, g, kg
+    fl oz   volume: Fl Oz, mL, L, Pint, Qt, Gal
+    each    count:  Each, Ct, Bag, Doz, ...
+
+Parsing works on the distinct (size, uom) pairs only - a few hundred even in
+a multi-million-row history - and the results are mapped back onto every row
+with one array take, so the per-row cost is a lookup and a division. Pairs
+that cannot be parsed get no unit and no unit price.
+
+Usage:
+    python3 unit_prices.py units traderjoes-dump-3.csv       # how each (size, uom) parses
+    python3 unit_prices.py annotate snapshot.csv -o snapshot_units.csv
+"""
+import argparse
+import re
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# uom (lowercase, dots dropped, spaces collapsed) -> (canonical unit, canonical units per uom)
+UNITS = {
+    'oz': ('oz', 1.0), 'wgt oz': ('oz', 1.0), 'net wt oz': ('oz', 1.0),
+    'lb': ('oz', 16.0), 'lbs': ('oz', 16.0),
+    'g': ('oz', 1 / 28.349523125), 'gram': ('oz', 1 / 28.349523125), 'grams': ('oz', 1 / 28.349523125),
+    'kg': ('oz', 1000 / 28.349523125),
+    'fl oz': ('fl oz', 1.0), 'floz': ('fl oz', 1.0),
+    'ml': ('fl oz', 1 / 29.5735295625), 'l': ('fl oz', 1000 / 29.5735295625),
+    'liter': ('fl oz', 1000 / 29.5735295625), 'litre': ('fl oz', 1000 / 29.5735295625),
+    'pint': ('fl oz', 16.0), 'pt': ('fl oz', 16.0), 'qt': ('fl oz', 32.0), 'quart': ('fl oz', 32.0),
+    'gal': ('fl oz', 128.0), 'gallon': ('fl oz', 128.0),
+    'each': ('each', 1.0), 'ea': ('each', 1.0), 'ct': ('each', 1.0), 'count': ('each', 1.0),
+    'pc': ('each', 1.0), 'pack': ('each', 1.0), 'bag': ('each', 1.0), 'bunch': ('each', 1.0),
+    'doz': ('each', 12.0), 'dozen': ('each', 12.0),
+}
+
+UNIT_PRICE_DECIMALS = 4
+
+SIZE = re.compile(r'^\s*(\d+(?:\.\d+)?)(?:\s*/\s*(\d+(?:\.\d+)?))?\s*(.*?)\s*$')
+
+
+def _uom_key(uom):
+    return ' '.join(uom.lower().replace('.', ' ').split())
+
+
+@lru_cache(maxsize=None)
+def parse_size(size, uom):
+    """(quantity in canonical units, canonical unit) for one pair, or (nan, None)
+
+    `size` is the raw cell text: "16", "1.5", "1/2", or a number with the
+    unit glued on ("12 oz") when `uom` is empty.
+    """
+    match = SIZE.match(size or '')
+    if not match:
+        return np.nan, None
+    number = float(match.group(1))
+    if match.group(2):
+        number /= float(match.group(2)) or np.nan
+    unit = UNITS.get(_uom_key(uom or match.group(3)))
+    if unit is None or not number > 0:
+        return np.nan, None
+    canonical, factor = unit
+    return number * factor, canonical
+
+
+def normalize(sizes, uoms):
+    """(quantity, unit) arrays for columns of raw size and uom text, parsing each distinct pair once"""
+    size_codes, size_values = pd.factorize(sizes.fillna('').astype(str))
+    uom_codes, uom_values = pd.factorize(uoms.fillna('').astype(str))
+    codes, pairs = pd.factorize(size_codes * len(uom_values) + uom_codes)
+    uniques = [(size_values[pair // len(uom_values)], uom_values[pair % len(uom_values)]) for pair in pairs]
+    parsed = [parse_size(size, uom) for size, uom in uniques]
+    quantity = np.array([q for q, _ in parsed], dtype='float64')
+    unit = np.array([u for _, u in parsed], dtype=object)
+    return quantity[codes], unit[codes]
+
+
+def unit_prices(frame):
+    """Copy of `frame` with unit_quantity, unit and unit_price columns
+
+    Needs retail_price (numeric), sales_size and sales_uom_description.
+    """
+    quantity, unit = normalize(frame['sales_size'], frame['sales_uom_description'])
+    out = frame.copy()
+    out['unit_quantity'] = quantity
+    out['unit'] = unit
+    out['unit_price'] = (out['retail_price'].to_numpy(dtype='float64') / quantity).round(UNIT_PRICE_DECIMALS)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    units = sub.add_parser('units', help='list the distinct (size, uom) pairs and how they parse')
+    units.add_argument('csv')
+
+    annotate = sub.add_parser('annotate', help='add unit_quantity, unit and unit_price columns')
+    annotate.add_argument('csv')
+    annotate.add_argument('-o', '--out', required=True)
+
+    args = parser.parse_args()
+    columns = ['sales_size', 'sales_uom_description']
+
+    if args.command == 'units':
+        pairs = pd.read_csv(args.csv, usecols=columns, dtype=str).value_counts(dropna=False)
+        unparsed = 0
+        for (size, uom), rows in pairs.items():
+            quantity, unit = parse_size('' if pd.isna(size) else size, '' if pd.isna(uom) else uom)
+            target = f"{quantity:g} {unit}" if unit else "?"
+            unparsed += 0 if unit else rows
+            print(f"{size!s:>8} {uom!s:<10} -> {target:<14} {rows:>9,} rows")
+        print(f"{len(pairs)} distinct pairs, {unparsed:,} rows without a unit", file=sys.stderr)
+    else:
+        first = True
+        rows = 0
+        for chunk in pd.read_csv(args.csv, dtype=str, chunksize=250_000):
+            chunk['retail_price'] = pd.to_numeric(chunk['retail_price'], errors='coerce')
+            unit_prices(chunk).to_csv(args.out, mode='w' if first else 'a', header=first, index=False)
+            first = False
+            rows += len(chunk)
+        print(f"✓ {args.out}: {rows:,} rows")
+
+
+if __name__ == "__main__":
+    main()